@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Benchmark first-hit segment queries with an AABB tree against a linear scan."""
+import argparse
+import time
+
+import numpy as np
+
+import shadows
+
+
+def make_obstacles(n, rng):
+    """Random rectangles with roughly constant density."""
+    size = 10 * np.sqrt(n)
+    xy = rng.uniform(0, size, size=(n, 2))
+    wh = rng.uniform(1, 5, size=(n, 2))
+    return [shadows.AARect(x, y, w, h) for (x, y), (w, h) in zip(xy, wh)], size
+
+
+def linear_first_hit(segment, obstacles):
+    best = None
+    for obstacle in obstacles:
+        Q = shadows.segment_poly_query(segment, obstacle)
+        if Q.intersect and (best is None or Q.time < best.time):
+            best = Q
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=50, help="Number of queries.")
+    parser.add_argument(
+        "--length", type=float, default=20, help="Length of the query segments."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{'obstacles':>10} {'linear (ms)':>12} {'bvh (ms)':>10} {'speedup':>8}")
+    for n in [10, 100, 1000]:
+        obstacles, size = make_obstacles(n, rng)
+        tree = shadows.AABBTree(obstacles)
+
+        starts = rng.uniform(0, size, size=(args.queries, 2))
+        angles = rng.uniform(-np.pi, np.pi, size=args.queries)
+        ends = starts + args.length * np.stack((np.cos(angles), np.sin(angles)), axis=1)
+        segments = [shadows.Segment(s, e) for s, e in zip(starts, ends)]
+
+        t0 = time.perf_counter()
+        linear = [linear_first_hit(segment, obstacles) for segment in segments]
+        t1 = time.perf_counter()
+        bvh = [tree.segment_query(segment) for segment in segments]
+        t2 = time.perf_counter()
+
+        # both methods must find the same first hit
+        for Q1, Q2 in zip(linear, bvh):
+            assert (Q1 is None) == (Q2 is None)
+            if Q1 is not None:
+                assert np.isclose(Q1.time, Q2.time)
+
+        linear_ms = 1000 * (t1 - t0) / args.queries
+        bvh_ms = 1000 * (t2 - t1) / args.queries
+        print(
+            f"{n:>10} {linear_ms:>12.3f} {bvh_ms:>10.3f} {linear_ms / bvh_ms:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
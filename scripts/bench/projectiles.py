@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Benchmark one tick of projectile collisions, looping over projectiles with
+pairwise queries against the vectorized ProjectilePool."""
+import argparse
+import time
+
+import numpy as np
+
+import shadows
+
+TIMESTEP = 1.0 / 60
+SHAPE = (50, 50)
+
+
+def make_level():
+    obstacles = [
+        shadows.Obstacle(20, 27, 10, 10),
+        shadows.Obstacle(8, 8, 5, 5),
+        shadows.Obstacle(0, 37, 13, 13),
+        shadows.Obstacle(37, 37, 5, 5),
+        shadows.Obstacle(20, 8, 5, 7),
+        shadows.Obstacle(20, 15, 22, 5),
+    ]
+    agents = [
+        shadows.Agent.player(position=[10, 25], radius=3),
+        shadows.Agent.enemy(position=[40, 25], radius=3),
+    ]
+    return shadows.ObstacleSet(obstacles), agents
+
+
+def loop_tick(positions, velocities, obstacles, agents):
+    """Collision checks as done per projectile before ProjectilePool."""
+    screen_rect = shadows.AARect(0, 0, SHAPE[0], SHAPE[1])
+    hits = 0
+    for p, v in zip(positions, velocities):
+        if not shadows.point_in_rect(p, screen_rect):
+            continue
+        segment = shadows.Segment(p, p + TIMESTEP * v)
+        for obstacle in obstacles:
+            shadows.segment_poly_intersect(segment, obstacle)
+        for agent in agents:
+            hits += shadows.segment_circle_query(segment, agent.circle()).intersect
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ticks", type=int, default=20, help="Ticks to average.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    obstacles, agents = make_level()
+
+    print(f"{'projectiles':>12} {'loop (ms)':>10} {'pool (ms)':>10} {'speedup':>8}")
+    for n in [10, 100, 1000]:
+        positions = rng.uniform(0, 50, size=(n, 2))
+        angles = rng.uniform(-np.pi, np.pi, size=n)
+        velocities = 100 * np.stack((np.cos(angles), np.sin(angles)), axis=1)
+
+        t0 = time.perf_counter()
+        for _ in range(args.ticks):
+            loop_tick(positions, velocities, obstacles, agents)
+        t_loop = (time.perf_counter() - t0) / args.ticks
+
+        t_pool = 0
+        for _ in range(args.ticks):
+            pool = shadows.ProjectilePool(capacity=n)
+            for p, v in zip(positions, velocities):
+                pool.spawn(p, v, -1)
+            t0 = time.perf_counter()
+            pool.collide(TIMESTEP, SHAPE, obstacles, agents)
+            pool.step(TIMESTEP)
+            t_pool += time.perf_counter() - t0
+        t_pool /= args.ticks
+
+        print(
+            f"{n:>12} {1000 * t_loop:>10.3f} {1000 * t_pool:>10.3f} "
+            f"{t_loop / t_pool:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Benchmark scalar 2D math against the equivalent NumPy implementations."""
+import argparse
+import timeit
+
+import numpy as np
+
+from shadows import vec2
+
+
+def np_unit(v):
+    norm = np.linalg.norm(v)
+    if np.isclose(norm, 0):
+        return np.zeros_like(v)
+    return v / norm
+
+
+def np_orth(v):
+    return np.array([v[1], -v[0]])
+
+
+def np_rotate(angle, v):
+    c = np.cos(angle)
+    s = np.sin(angle)
+    return np.array([[c, s], [-s, c]]) @ v
+
+
+def np_angle2pi(v, start=0):
+    a = np.arctan2(-v[1], v[0]) - start
+    if a < 0:
+        a = 2 * np.pi + a
+    return a
+
+
+def np_quad_formula(a, b, c):
+    d = np.sqrt(b**2 - 4 * a * c)
+    return (-b - d) / (2 * a), (-b + d) / (2 * a)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n", "--number", type=int, default=100_000, help="Calls per function."
+    )
+    args = parser.parse_args()
+
+    v = np.array([3.0, 4.0])
+    t = (3.0, 4.0)
+    cases = [
+        ("unit", lambda: np_unit(v), lambda: vec2.unit(t)),
+        ("orth", lambda: np_orth(v), lambda: vec2.orth(t)),
+        ("rotate", lambda: np_rotate(0.3, v), lambda: vec2.rotate(0.3, t)),
+        ("angle2pi", lambda: np_angle2pi(v, 0.1), lambda: vec2.angle2pi(t, 0.1)),
+        (
+            "quad_formula",
+            lambda: np_quad_formula(1.0, 4.0, 2.0),
+            lambda: vec2.quad_formula(1.0, 4.0, 2.0),
+        ),
+        ("norm", lambda: np.linalg.norm(v), lambda: vec2.norm(t)),
+    ]
+
+    print(f"{'function':>14} {'numpy (us)':>11} {'vec2 (us)':>10} {'speedup':>8}")
+    for name, f_np, f_vec2 in cases:
+        t_np = 1e6 * timeit.timeit(f_np, number=args.number) / args.number
+        t_vec2 = 1e6 * timeit.timeit(f_vec2, number=args.number) / args.number
+        print(f"{name:>14} {t_np:>11.3f} {t_vec2:>10.3f} {t_np / t_vec2:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Build and cache the visibility tables for the fixed game levels."""
+import argparse
+import time
+
+from shadows.visibility import CACHE_DIR, VisibilityTable
+from shadows.tag.env import make_obstacles as make_tag_obstacles
+from shadows.hunt.game import make_obstacles as make_hunt_obstacles
+
+SHAPE = (50, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cell-size", type=float, default=1, help="Grid cell size.")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Cache directory.")
+    parser.add_argument("--workers", type=int, help="Number of worker processes.")
+    args = parser.parse_args()
+
+    levels = {"tag": make_tag_obstacles(), "hunt": make_hunt_obstacles(SHAPE)}
+    for name, obstacles in levels.items():
+        t0 = time.time()
+        table = VisibilityTable.cached(
+            obstacles,
+            SHAPE,
+            cell_size=args.cell_size,
+            cache_dir=args.cache_dir,
+            n_workers=args.workers,
+        )
+        key = VisibilityTable.key(obstacles, SHAPE, args.cell_size)
+        print(f"{name}: {table.n_cells} cells in {time.time() - t0:.2f} s ({key})")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,21 +7,28 @@ import shadows
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--it-model", help="Path to the trained model for 'it' agent.")
     parser.add_argument(
-        "--not-it-model", help="Path to the trained model for 'not it' agent."
+        "--it-model",
+        help="Path to the trained model for 'it' agent, which may be exported to ONNX.",
+    )
+    parser.add_argument(
+        "--not-it-model",
+        help="Path to the trained model for 'not it' agent, which may be exported "
+        "to ONNX.",
     )
     parser.add_argument(
         "--algo", default="dqn", help="The algorithm used by the trained models."
     )
     args = parser.parse_args()
 
-    algo = shadows.ALGOS[args.algo.lower()]
-    it_model, not_it_model = None, None
-    if args.it_model is not None:
-        it_model = algo.load(args.it_model)
-    if args.not_it_model is not None:
-        not_it_model = algo.load(args.not_it_model)
+    def load(path):
+        # models exported to ONNX are run without PyTorch
+        if path is None or path.endswith(".onnx"):
+            return path
+        return shadows.ALGOS[args.algo.lower()].load(path)
+
+    it_model = load(args.it_model)
+    not_it_model = load(args.not_it_model)
 
     pygame.init()
     game = shadows.TagGame(display=True, it_model=it_model, not_it_model=not_it_model)
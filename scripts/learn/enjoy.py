@@ -29,9 +29,14 @@ def main():
 
     model_path = os.path.join(args.log_dir, env_name + ".zip")
 
-    # load the trained agent
-    env = make_vec_env(env_name, env_kwargs={"render_mode": "human"})
-    env = VecTransposeImage(env)
+    # load the trained agent, with the observations it was trained on
+    flat = info.get("flat_obs", False)
+    env_kwargs = {"render_mode": "human"}
+    if flat:
+        env_kwargs["flat_observations"] = True
+    env = make_vec_env(env_name, env_kwargs=env_kwargs)
+    if not flat:
+        env = VecTransposeImage(env)
     model = shadows.ALGOS[algo_name].load(model_path, env=env)
 
     # enjoy trained agent
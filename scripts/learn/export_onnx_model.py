@@ -1,6 +1,6 @@
 import argparse
-import inspect
 import os
+import time
 
 import numpy as np
 import onnx
@@ -9,18 +9,73 @@ import torch
 import gymnasium as gym
 import yaml
 
+from stable_baselines3.common.distributions import (
+    CategoricalDistribution,
+    DiagGaussianDistribution,
+    StateDependentNoiseDistribution,
+)
 from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.policies import ActorCriticPolicy, BasePolicy
 from stable_baselines3.common.vec_env import VecTransposeImage
 
 import shadows
 
-import IPython
+
+# observations for the report are sampled from these envs
+REPORT_ENVS = ["TagIt-v0", "TagNotIt-v0"]
+
+
+def deterministic_actions(policy, observation):
+    """Deterministic actions of an SB3 policy.
+
+    The mode of the action distribution is computed directly from the policy's
+    networks, so the distribution and its sampling are not part of the
+    exported graph. The actions are post-processed like ``policy.predict``
+    does, so they are within the bounds of the action space.
+    """
+    if hasattr(policy, "q_net"):
+        # DQN
+        return policy.q_net(observation).argmax(dim=1).reshape(-1)
+
+    if hasattr(policy, "actor"):
+        # SAC, which always squashes its actions
+        mean, _, _ = policy.actor.get_action_dist_params(observation)
+        actions = torch.tanh(mean)
+    elif isinstance(policy, ActorCriticPolicy):
+        features = BasePolicy.extract_features(
+            policy, observation, policy.pi_features_extractor
+        )
+        latent = policy.mlp_extractor.forward_actor(features)
+        mean = policy.action_net(latent)
+
+        if isinstance(policy.action_dist, CategoricalDistribution):
+            return mean.argmax(dim=1)
+        if isinstance(policy.action_dist, StateDependentNoiseDistribution):
+            actions = torch.tanh(mean) if policy.squash_output else mean
+        elif isinstance(policy.action_dist, DiagGaussianDistribution):
+            actions = mean
+        else:
+            raise ValueError("Unsupported action distribution.")
+    else:
+        raise ValueError(f"Unsupported policy {type(policy).__name__}.")
+
+    low = torch.tensor(policy.action_space.low)
+    high = torch.tensor(policy.action_space.high)
+    if policy.squash_output:
+        return low + 0.5 * (actions + 1.0) * (high - low)
+    return torch.minimum(torch.maximum(actions, low), high)
 
 
 class OnnxablePolicy(torch.nn.Module):
-    def __init__(self, policy):
+    def __init__(self, policy, deterministic=False):
         super().__init__()
         self.policy = policy
+        self.deterministic = deterministic
+
+    def _actions(self, observation):
+        if self.deterministic:
+            return deterministic_actions(self.policy, observation)
+        return self.policy._predict(observation, deterministic=False)
 
     def forward(self, agent_position, agent_angle, enemy_position, treasure_positions):
         observation = dict(
@@ -29,12 +84,151 @@ class OnnxablePolicy(torch.nn.Module):
             enemy_position=enemy_position,
             treasure_positions=treasure_positions,
         )
-        return self.policy._predict(observation, deterministic=False)
+        return self._actions(observation)
+
+
+class OnnxableFlatPolicy(OnnxablePolicy):
+    """Policy taking the flat observation as its only input."""
+
+    def forward(self, observation):
+        return self._actions(observation)
+
+
+def quantize(onnx_path, quantized_path):
+    """Quantize the weights of the model to int8.
+
+    Activations are quantized dynamically at inference time, so no
+    calibration data is needed.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    # shape inference and graph optimization (e.g. fusing) before quantizing
+    preprocessed_path = quantized_path + ".tmp"
+    quant_pre_process(onnx_path, preprocessed_path)
+    quantize_dynamic(preprocessed_path, quantized_path, weight_type=QuantType.QInt8)
+    os.remove(preprocessed_path)
+
+
+def sample_observations(n, flat, seed=0):
+    """Sample observations from the tag envs by taking random actions."""
+    observations = []
+    for i, env_id in enumerate(REPORT_ENVS):
+        env = gym.make(env_id, flat_observations=flat)
+        env.action_space.seed(seed + i)
+        obs, _ = env.reset(seed=seed + i)
+        while len(observations) < (i + 1) * n // len(REPORT_ENVS):
+            observations.append(obs)
+            obs, _, terminated, truncated, _ = env.step(env.action_space.sample())
+            if terminated or truncated:
+                obs, _ = env.reset()
+        env.close()
+    return observations
+
+
+def time_predictions(model, observations, deterministic):
+    """Predict the action for each observation, one at a time.
+
+    Returns
+    -------
+    : tuple
+        The actions and the latency of each prediction in milliseconds.
+    """
+    actions, latencies = [], []
+    for obs in observations:
+        t0 = time.perf_counter()
+        action, _ = model.predict(obs, deterministic=deterministic)
+        latencies.append(1000 * (time.perf_counter() - t0))
+        actions.append(action)
+    return np.array(actions), np.array(latencies)
+
+
+def make_report(model, onnx_paths, observations, deterministic, tolerance):
+    """Compare the ONNX models to the SB3 model on the observations."""
+    actions, latencies = time_predictions(model, observations, deterministic)
+    report = {
+        "sb3": {
+            "mean_latency_ms": float(np.mean(latencies)),
+            "p99_latency_ms": float(np.percentile(latencies, 99)),
+        }
+    }
+
+    for name, path in onnx_paths.items():
+        policy = shadows.OnnxPolicy(path)
+        onnx_actions, latencies = time_predictions(policy, observations, deterministic)
+        onnx_actions = onnx_actions.reshape(actions.shape)
+
+        if np.issubdtype(actions.dtype, np.integer):
+            agree = onnx_actions == actions
+            error = np.mean(~agree)
+        else:
+            abs_errors = np.abs(onnx_actions - actions).reshape(len(actions), -1)
+            agree = np.all(abs_errors <= tolerance, axis=1)
+            error = np.mean(abs_errors)
+
+        report[name] = {
+            "agreement": float(np.mean(agree)),
+            "mean_error": float(error),
+            "mean_latency_ms": float(np.mean(latencies)),
+            "p99_latency_ms": float(np.percentile(latencies, 99)),
+            "size_kb": os.path.getsize(path) / 1024,
+        }
+    return report
+
+
+def print_report(report, n_obs):
+    print(f"\nComparison with the SB3 model on {n_obs} observations:")
+    print(
+        f"{'model':<8} {'agreement':>10} {'mean error':>11} {'mean (ms)':>10} "
+        f"{'p99 (ms)':>9} {'size (kB)':>10}"
+    )
+    for name, row in report.items():
+        agreement = f"{row['agreement']:.2%}" if "agreement" in row else "-"
+        error = f"{row['mean_error']:.2e}" if "mean_error" in row else "-"
+        size = f"{row['size_kb']:.1f}" if "size_kb" in row else "-"
+        print(
+            f"{name:<8} {agreement:>10} {error:>11} {row['mean_latency_ms']:>10.3f} "
+            f"{row['p99_latency_ms']:>9.3f} {size:>10}"
+        )
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("log_dir", help="Path to the logs directory.")
+    parser.add_argument(
+        "--deterministic",
+        action="store_true",
+        help="Export the deterministic policy, without action sampling.",
+    )
+    parser.add_argument(
+        "--dynamic-batch",
+        action="store_true",
+        help="Allow batches of observations of any size as input.",
+    )
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        help="Also export a model with weights dynamically quantized to int8.",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Compare the actions and latency of the exported models to the SB3 "
+        f"model on observations sampled from {' and '.join(REPORT_ENVS)}.",
+    )
+    parser.add_argument(
+        "--n-obs",
+        type=int,
+        default=4000,
+        help="Number of observations to sample for the report.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.01,
+        help="Largest difference between continuous actions that are considered "
+        "to agree in the report.",
+    )
     args = parser.parse_args()
 
     info_path = os.path.join(args.log_dir, "info.yaml")
@@ -44,25 +238,45 @@ def main():
     algo_name = info["algo"].lower()
     algo = shadows.ALGOS[algo_name]
 
-    env = make_vec_env(env_name)
-    env = VecTransposeImage(env)
+    flat = info.get("flat_obs", False)
+    env_kwargs = dict(flat_observations=True) if flat else None
+
+    env = make_vec_env(env_name, env_kwargs=env_kwargs)
+    if not flat:
+        env = VecTransposeImage(env)
     obs = env.reset()
     model_path = os.path.join(args.log_dir, "best_model.zip")
     model = algo.load(model_path, env=env, device="cpu")
 
-    onnx_policy = OnnxablePolicy(model.policy)
+    if flat:
+        # a single input, laid out as documented by shadows.flat_index_map
+        onnx_policy = OnnxableFlatPolicy(model.policy, args.deterministic)
+        keys = ["observation"]
+        export_args = (torch.tensor(obs),)
+        obs = {"observation": obs}
+    else:
+        onnx_policy = OnnxablePolicy(model.policy, args.deterministic)
 
-    # key order needs to match forward
-    keys = ["agent_position", "agent_angle", "enemy_position", "treasure_positions"]
-    args = tuple(torch.tensor(obs[key]) for key in keys)
+        # key order needs to match forward
+        keys = ["agent_position", "agent_angle", "enemy_position", "treasure_positions"]
+        export_args = tuple(torch.tensor(obs[key]) for key in keys)
+
+    dynamic_shapes = None
+    if args.dynamic_batch:
+        batch = torch.export.Dim("batch")
+        dynamic_shapes = tuple({0: batch} for _ in keys)
+
+    # the validation of the distributions' arguments cannot be exported
+    torch.distributions.Distribution.set_default_validate_args(False)
 
     onnx_path = env_name + "_" + algo_name + ".onnx"
     torch.onnx.export(
         onnx_policy,
-        args=args,
+        args=export_args,
         f=onnx_path,
         opset_version=17,
         input_names=keys,
+        dynamic_shapes=dynamic_shapes,
         external_data=False,
         dynamo=True,
     )
@@ -76,7 +290,26 @@ def main():
     ort_sess = ort.InferenceSession(onnx_path)
     action = ort_sess.run(None, obs)
 
-    # IPython.embed()
+    onnx_paths = {"fp32": onnx_path}
+    if args.quantize:
+        quantized_path = onnx_path[: -len(".onnx")] + "_int8.onnx"
+        quantize(onnx_path, quantized_path)
+        onnx_paths["int8"] = quantized_path
+        print(f"exported quantized model to {quantized_path}")
+
+    if args.report:
+        if not args.deterministic:
+            print("Warning: actions of stochastic models are not expected to agree.")
+        observations = sample_observations(args.n_obs, flat)
+        report = make_report(
+            model, onnx_paths, observations, args.deterministic, args.tolerance
+        )
+        print_report(report, len(observations))
+
+        report_path = onnx_path[: -len(".onnx")] + "_report.yaml"
+        with open(report_path, "w") as f:
+            yaml.dump(report, stream=f, default_flow_style=False)
+        print(f"saved report to {report_path}")
 
 
 main()
@@ -12,13 +12,21 @@ import numpy as np
 from stable_baselines3 import DQN, PPO, SAC, TD3
 from stable_baselines3.common.env_util import make_vec_env
 from stable_baselines3.common.evaluation import evaluate_policy
-from stable_baselines3.common.callbacks import EvalCallback
-from stable_baselines3.common.vec_env import VecTransposeImage, VecFrameStack
+from stable_baselines3.common.callbacks import CallbackList, EvalCallback
+from stable_baselines3.common.vec_env import (
+    DummyVecEnv,
+    SubprocVecEnv,
+    VecTransposeImage,
+    VecFrameStack,
+    VecMonitor,
+)
 from stable_baselines3.common.noise import NormalActionNoise
+from stable_baselines3.common.preprocessing import is_image_space
 
 from sb3_contrib import QRDQN
 
 import shadows
+from shadows.tag.vec_env import TagVecEnv
 
 
 # TOTAL_TIMESTEPS = 5_000_000
@@ -30,6 +38,9 @@ N_EVAL_EPISODES = 5
 
 N_STACK = 1
 
+# classes of the vectorized environments that run the --n-envs environments
+VEC_ENVS = {"dummy": DummyVecEnv, "subproc": SubprocVecEnv, "shm": shadows.ShmVecEnv}
+
 
 def linear_schedule(initial_value):
     """Linear learning rate schedule."""
@@ -59,8 +70,90 @@ def make_log_dir(env_name, log_dir_root):
     return str(log_dir)
 
 
+def make_batched_env(env_name, n_envs, seed, env_kwargs):
+    """Make a batched version of a registered tag environment."""
+    kwargs = dict(gym.spec(env_name).kwargs)
+    kwargs.update(env_kwargs)
+    env = TagVecEnv(n_envs, **kwargs)
+    env.seed(seed)
+    return env
+
+
+def make_env(
+    env_name,
+    n_envs,
+    seed,
+    env_kwargs,
+    it_model=None,
+    batched=False,
+    monitor_dir=None,
+    vec_env_cls=DummyVecEnv,
+    vec_env_kwargs=None,
+):
+    """Make the vectorized environment for training or evaluation."""
+    if batched:
+        env = make_batched_env(
+            env_name, n_envs, seed, dict(env_kwargs, it_model=it_model)
+        )
+        filename = None if monitor_dir is None else os.path.join(monitor_dir, "0")
+        return VecMonitor(env, filename=filename)
+    if it_model is not None:
+        # the learned opponents of all of the envs are evaluated in one batch
+        return shadows.make_opponent_vec_env(
+            env_name,
+            n_envs,
+            it_model,
+            seed=seed,
+            vec_env_cls=vec_env_cls,
+            vec_env_kwargs=vec_env_kwargs,
+            env_kwargs=env_kwargs,
+            monitor_dir=monitor_dir,
+        )
+    return make_vec_env(
+        env_name,
+        seed=seed,
+        n_envs=n_envs,
+        monitor_dir=monitor_dir,
+        env_kwargs=env_kwargs,
+        vec_env_cls=vec_env_cls,
+        vec_env_kwargs=vec_env_kwargs,
+    )
+
+
+def split_cpus(n_envs, n_eval_envs):
+    """CPU cores for the workers of the training and evaluation environments.
+
+    The evaluation workers get the cores after those of the training workers,
+    so they do not overlap unless there are too few cores, in which case cores
+    are reused from the start.
+    """
+    cpus = sorted(os.sched_getaffinity(0))
+    train_cpus = [cpus[i % len(cpus)] for i in range(n_envs)]
+    eval_cpus = [cpus[(n_envs + i) % len(cpus)] for i in range(n_eval_envs)]
+    return train_cpus, eval_cpus
+
+
+def is_flat_space(space):
+    """True if the space is a flat vector ``Box`` rather than an image."""
+    return isinstance(space, gym.spaces.Box) and not is_image_space(space)
+
+
+def wrap_env(env):
+    """Wrap a vectorized environment for training or evaluation."""
+    # use VecTransposeImage because SB3 wants channel-first format; flat
+    # observations are not images and are passed through as they are
+    if not is_flat_space(env.observation_space):
+        env = VecTransposeImage(env)
+    return VecFrameStack(env, n_stack=N_STACK)
+
+
 def make_model(algo_name, env, seed, trained_agent=None):
-    kwargs = dict(policy="MultiInputPolicy", env=env, seed=seed, verbose=1)
+    # flat observations do not need the per-key handling of MultiInputPolicy
+    if is_flat_space(env.observation_space):
+        policy = "MlpPolicy"
+    else:
+        policy = "MultiInputPolicy"
+    kwargs = dict(policy=policy, env=env, seed=seed, verbose=1)
 
     algo_name = algo_name.lower()
     if algo_name == "dqn" or algo_name == "qrdqn":
@@ -138,26 +231,73 @@ def main():
         "-n", "--timesteps", type=int, required=True, help="Total number of timesteps."
     )
     parser.add_argument("--it-model", help="Path to the trained model for 'it' agent.")
+    parser.add_argument(
+        "--batched",
+        action="store_true",
+        help="Simulate the --n-envs tag environments in one batched TagVecEnv.",
+    )
+    parser.add_argument(
+        "--vec-env",
+        choices=VEC_ENVS.keys(),
+        default="dummy",
+        help="Run the --n-envs environments in this process (dummy), in worker "
+        "processes (subproc), or in worker processes pinned to cores that exchange "
+        "data through shared memory (shm).",
+    )
+    parser.add_argument(
+        "--n-eval-envs",
+        type=int,
+        default=N_EVAL_ENVS,
+        help="Number of parallel evaluation environments.",
+    )
+    parser.add_argument(
+        "--eval-vec-env",
+        choices=VEC_ENVS.keys(),
+        default="dummy",
+        help="Like --vec-env, but for the evaluation environments, which get their "
+        "own processes.",
+    )
+    parser.add_argument(
+        "--flat-obs",
+        action="store_true",
+        help="Use flat, normalized Box observations and an MlpPolicy.",
+    )
     args = parser.parse_args()
 
+    if args.batched and (args.vec_env != "dummy" or args.eval_vec_env != "dummy"):
+        parser.error("--batched environments are simulated in this process")
+
     log_dir = make_log_dir(args.env, args.log_dir)
 
+    # workers pinned to cores are given separate ones for training and evaluation
+    vec_env_kwargs, eval_vec_env_kwargs = None, None
+    if hasattr(os, "sched_getaffinity"):
+        train_cpus, eval_cpus = split_cpus(args.n_envs, args.n_eval_envs)
+        if args.vec_env == "shm":
+            vec_env_kwargs = dict(cpus=train_cpus)
+        if args.eval_vec_env == "shm":
+            eval_vec_env_kwargs = dict(cpus=eval_cpus)
+
     it_model, not_it_model = None, None
     if args.it_model is not None:
         it_model = SAC.load(args.it_model)
 
     # create environment
-    # use VecTransposeImage because SB3 wants channel-first format
-    env_kwargs = dict(it_model=it_model, not_it_model=None)
-    env = make_vec_env(
+    env_kwargs = dict(not_it_model=None)
+    if args.flat_obs:
+        env_kwargs["flat_observations"] = True
+    env = make_env(
         args.env,
-        seed=args.seed,
-        n_envs=args.n_envs,
+        args.n_envs,
+        args.seed,
+        env_kwargs,
+        it_model=it_model,
+        batched=args.batched,
         monitor_dir=log_dir,
-        env_kwargs=env_kwargs,
+        vec_env_cls=VEC_ENVS[args.vec_env],
+        vec_env_kwargs=vec_env_kwargs,
     )
-    env = VecTransposeImage(env)
-    env = VecFrameStack(env, n_stack=N_STACK)
+    env = wrap_env(env)
 
     # instantiate the agent
     model = make_model(
@@ -165,11 +305,17 @@ def main():
     )
 
     if EVAL:
-        eval_env = make_vec_env(
-            args.env, seed=args.seed, n_envs=N_EVAL_ENVS, env_kwargs=env_kwargs
+        eval_env = make_env(
+            args.env,
+            args.n_eval_envs,
+            args.seed,
+            env_kwargs,
+            it_model=it_model,
+            batched=args.batched,
+            vec_env_cls=VEC_ENVS[args.eval_vec_env],
+            vec_env_kwargs=eval_vec_env_kwargs,
         )
-        eval_env = VecTransposeImage(eval_env)
-        eval_env = VecFrameStack(eval_env, n_stack=N_STACK)
+        eval_env = wrap_env(eval_env)
         eval_callback = EvalCallback(
             eval_env,
             best_model_save_path=log_dir,
@@ -182,18 +328,30 @@ def main():
     else:
         eval_callback = None
 
+    # log the episode statistics reported by the environments
+    callbacks = [shadows.EpisodeStatsCallback()]
+    if eval_callback is not None:
+        callbacks.append(eval_callback)
+
     start = datetime.datetime.now()
 
     # train the agent
     try:
         model.learn(
-            total_timesteps=args.timesteps, progress_bar=True, callback=eval_callback
+            total_timesteps=args.timesteps,
+            progress_bar=True,
+            callback=CallbackList(callbacks),
         )
     except KeyboardInterrupt:
         print("goodbye")
 
     end = datetime.datetime.now()
 
+    # stop the workers and free their shared memory
+    env.close()
+    if eval_callback is not None:
+        eval_env.close()
+
     info_path = os.path.join(log_dir, "info.yaml")
     info = {
         "start": start,
@@ -203,6 +361,7 @@ def main():
         "seed": args.seed,
         "timesteps": args.timesteps,
         "n_stack": N_STACK,
+        "flat_obs": args.flat_obs,
     }
     with open(info_path, "w") as f:
         yaml.dump(info, stream=f)
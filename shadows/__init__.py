@@ -1,10 +1,37 @@
+import importlib
+
 from .math import *
 from .collision import *
 from .gui import Text, Color
-from .entity import Agent, Action, Projectile
-from .obstacle import Obstacle
+from .entity import Agent, Action, Projectile, ProjectilePool
+from .obstacle import Obstacle, ObstacleSet
+from .raster import Rasterizer
+from .visibility import VisibilityTable
+from .config import GameConfig
 from .tag import *
-from .shoot import ShootGame
-from .hunt import HuntGame
-from .dqn import DQN
-from .algo import ALGOS
+
+
+# The games import pygame, so they are only imported when first used. The
+# rest of the package, including the learning environments, can then be used
+# without loading pygame or initializing SDL. Likewise, the learning algorithms
+# and tools that need Stable Baselines3 are only imported when first used, so
+# that PyTorch is not loaded when running policies exported to ONNX.
+_LAZY = {
+    "TagGame": ".tag.game",
+    "ShootGame": ".shoot",
+    "HuntGame": ".hunt",
+    "DQN": ".dqn",
+    "ALGOS": ".algo",
+    "TagVecEnv": ".tag",
+    "EpisodeStatsCallback": ".tag",
+    "OpponentInference": ".tag",
+    "OpponentInferenceVecEnv": ".tag",
+    "make_opponent_vec_env": ".tag",
+    "ShmVecEnv": ".tag",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,10 @@
+import math
+import heapq
+from collections import OrderedDict
+
 import numpy as np
 
+from . import vec2
 from .math import unit, orth, quad_formula
 
 
@@ -7,6 +12,10 @@ from .math import unit, orth, quad_formula
 
 
 class CollisionQuery:
+    """Result of a collision query between two shapes."""
+
+    __slots__ = ("p1", "p2", "normal", "distance", "time", "intersect")
+
     def __init__(
         self, distance=None, time=None, normal=None, p1=None, p2=None, intersect=False
     ):
@@ -24,9 +33,13 @@ class CollisionQuery:
 class Polygon:
     """2D polygon."""
 
+    # maximum number of padded versions of each polygon to cache
+    PAD_CACHE_SIZE = 8
+
     def __init__(self, vertices, primitives=None):
         self.vertices = vertices
         self.primitives = primitives
+        self._padded = OrderedDict()
 
         self.edges = [
             Segment(self.vertices[i], self.vertices[i + 1])
@@ -40,6 +53,33 @@ class Polygon:
     def out_normals(self):
         return -self.in_normals
 
+    def pad(self, radius):
+        """Get the polygon padded by ``radius``.
+
+        The padded geometry is cached for the most recently used radii, so the
+        polygon should not be modified afterward.
+
+        Parameters
+        ----------
+        radius : float
+            The padding radius.
+
+        Returns
+        -------
+        : PaddedPoly
+            The padded polygon.
+        """
+        radius = float(radius)
+        padded = self._padded.get(radius)
+        if padded is None:
+            padded = PaddedPoly(self, radius)
+            self._padded[radius] = padded
+            if len(self._padded) > self.PAD_CACHE_SIZE:
+                self._padded.popitem(last=False)
+        else:
+            self._padded.move_to_end(radius)
+        return padded
+
 
 class AARect(Polygon):
     """Axis-aligned rectangle.
@@ -76,7 +116,7 @@ class Segment:
         self.v = self.end - self.start
         self.direction = unit(self.v)
         self.normal = orth(self.direction)
-        self.length = np.linalg.norm(self.v)
+        self.length = vec2.norm(self.v)
 
     def __repr__(self):
         return f"Segment(start={self.start}, end={self.end})"
@@ -109,6 +149,447 @@ class PaddedPoly:
         self.poly2 = Polygon(vertices)
 
 
+class PolygonSet:
+    """A set of convex polygons packed into contiguous arrays.
+
+    Polygons with fewer than the maximum number of vertices are padded by
+    repeating their first edge, which does not change the result of any
+    query.
+
+    Parameters
+    ----------
+    polys : iterable of Polygon
+        The polygons to pack.
+    """
+
+    def __init__(self, polys):
+        self.polys = list(polys)
+
+        n = max([len(poly.vertices) for poly in self.polys], default=1)
+        m = len(self.polys)
+
+        self.n_vertices = np.array(
+            [len(poly.vertices) for poly in self.polys], dtype=int
+        )
+        self.vertices = np.zeros((m, n, 2))
+        self.in_normals = np.zeros((m, n, 2))
+        for i, poly in enumerate(self.polys):
+            k = self.n_vertices[i]
+            self.vertices[i, :k] = poly.vertices
+            self.vertices[i, k:] = poly.vertices[0]
+            self.in_normals[i, :k] = poly.in_normals
+            self.in_normals[i, k:] = poly.in_normals[0]
+
+        # edge k goes from vertex k to vertex k + 1; padded edges are copies of
+        # the first edge
+        self.ends = np.roll(self.vertices, -1, axis=1)
+        for i, k in enumerate(self.n_vertices):
+            self.ends[i, k - 1] = self.vertices[i, 0]
+            self.ends[i, k:] = self.vertices[i, 1]
+        self.edges = self.ends - self.vertices
+        self._edge_sq_lengths = np.sum(self.edges**2, axis=-1)
+
+        # optional precomputed DistanceField for distance queries
+        self.distance_field = None
+
+        # FreeSpaceSamplers, keyed by arena shape and radius
+        self._free_space = {}
+
+    def __len__(self):
+        return len(self.polys)
+
+    def __iter__(self):
+        return iter(self.polys)
+
+    def __getitem__(self, idx):
+        return self.polys[idx]
+
+    @property
+    def out_normals(self):
+        return -self.in_normals
+
+    def contains(self, points, tol=1e-8):
+        """Check if each point is inside any polygon.
+
+        Parameters
+        ----------
+        points : array_like, shape (N, 2)
+            The 2D points.
+        tol : float
+            Tolerance for a point to be considered inside a polygon.
+
+        Returns
+        -------
+        : np.ndarray, shape (N,)
+            True for each point inside a polygon, False otherwise.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        deltas = points[:, None, None, :] - self.vertices
+        depths = np.sum(deltas * self.in_normals, axis=-1)
+        return np.any(np.all(depths >= -tol, axis=-1), axis=-1)
+
+    def use_distance_field(self, shape, resolution=0.5, exact_within=None):
+        """Precompute a ``DistanceField`` to answer distance queries.
+
+        The polygons must not move after this is called. See
+        ``DistanceField`` for the parameters.
+        """
+        self.distance_field = DistanceField(
+            self, shape, resolution=resolution, exact_within=exact_within
+        )
+        return self.distance_field
+
+    def free_space(self, shape, radius=0):
+        """Get a ``FreeSpaceSampler`` for the free space around the polygons.
+
+        The sampler is cached for each shape and radius, so the polygons
+        should not be modified afterward.
+        """
+        key = (tuple(shape), float(radius))
+        sampler = self._free_space.get(key, None)
+        if sampler is None:
+            sampler = FreeSpaceSampler(shape, self, radius)
+            self._free_space[key] = sampler
+        return sampler
+
+    def distances(self, points):
+        """Distance from each point to the closest polygon.
+
+        Parameters
+        ----------
+        points : array_like, shape (N, 2)
+            The 2D points.
+
+        Returns
+        -------
+        : np.ndarray, shape (N,)
+            The distances, which are zero for points inside a polygon.
+        """
+        if self.distance_field is not None:
+            return np.maximum(self.distance_field.query(points)[0], 0)
+        return point_polys_distance(points, self).min(axis=1, initial=np.inf)
+
+
+def _poly_aabbs(polys):
+    """Axis-aligned bounding boxes of polygons as an (N, 4) array with rows
+    [x_min, y_min, x_max, y_max]."""
+    aabbs = [
+        np.concatenate((np.min(poly.vertices, axis=0), np.max(poly.vertices, axis=0)))
+        for poly in polys
+    ]
+    return np.array(aabbs, dtype=float).reshape(-1, 4)
+
+
+class UniformGrid:
+    """Uniform grid broadphase for static polygons.
+
+    Each polygon is stored in every cell that its bounding box overlaps.
+    Queries return the polygons whose bounding boxes overlap the query region,
+    in the order they were given, so that only nearby polygons need to be
+    passed to the narrowphase queries.
+
+    Parameters
+    ----------
+    polys : iterable of Polygon
+        The polygons to store.
+    cell_size : float or pair of float
+        The width and height of each grid cell.
+    """
+
+    def __init__(self, polys, cell_size):
+        self.polys = list(polys)
+        self.cell_size = np.ones(2) * cell_size
+        self.aabbs = _poly_aabbs(self.polys)
+
+        self.cells = {}
+        for idx, aabb in enumerate(self.aabbs):
+            lo, hi = self._cell_range(aabb[:2], aabb[2:])
+            for i in range(lo[0], hi[0] + 1):
+                for j in range(lo[1], hi[1] + 1):
+                    self.cells.setdefault((i, j), []).append(idx)
+
+    def _cell_range(self, lo, hi):
+        lo = np.floor(lo / self.cell_size).astype(int)
+        hi = np.floor(hi / self.cell_size).astype(int)
+        return lo, hi
+
+    def query_aabb(self, lo, hi):
+        """Get the polygons with bounding boxes overlapping a box.
+
+        Parameters
+        ----------
+        lo : pair of float
+            The minimum corner of the box.
+        hi : pair of float
+            The maximum corner of the box.
+
+        Returns
+        -------
+        : list of Polygon
+            The candidate polygons.
+        """
+        return [self.polys[i] for i in self._query_aabb_indices(lo, hi)]
+
+    def _query_aabb_indices(self, lo, hi):
+        clo, chi = self._cell_range(lo, hi)
+        idx = set()
+        for i in range(clo[0], chi[0] + 1):
+            for j in range(clo[1], chi[1] + 1):
+                idx.update(self.cells.get((i, j), ()))
+        if not idx:
+            return np.zeros(0, dtype=int)
+
+        # cells are coarse, so filter by the actual bounding boxes
+        idx = np.array(sorted(idx))
+        aabbs = self.aabbs[idx]
+        mask = np.all(aabbs[:, :2] <= hi, axis=1) & np.all(aabbs[:, 2:] >= lo, axis=1)
+        return idx[mask]
+
+    def query_point(self, point, radius=0):
+        """Get the polygons that may be within ``radius`` of a point."""
+        point = np.asarray(point, dtype=float)
+        return self.query_aabb(point - radius, point + radius)
+
+    def query_segment(self, segment, radius=0):
+        """Get the polygons that may intersect a segment.
+
+        If ``radius`` is positive, then the query is for a circle with that
+        radius swept along the segment.
+        """
+        return [self.polys[i] for i in self.query_segment_indices(segment, radius)]
+
+    def query_segment_indices(self, segment, radius=0):
+        """Like ``query_segment``, but get the indices of the polygons."""
+        lo = np.minimum(segment.start, segment.end) - radius
+        hi = np.maximum(segment.start, segment.end) + radius
+        return self._query_aabb_indices(lo, hi)
+
+
+def _shape_aabbs(shapes):
+    """Bounding boxes of polygons or padded polygons."""
+    aabbs = np.zeros((len(shapes), 4))
+    for i, shape in enumerate(shapes):
+        if isinstance(shape, PaddedPoly):
+            aabbs[i] = _poly_aabbs([shape.poly])[0]
+            aabbs[i, :2] -= shape.radius
+            aabbs[i, 2:] += shape.radius
+        else:
+            aabbs[i] = _poly_aabbs([shape])[0]
+    return aabbs
+
+
+def _segment_aabb_entry_time(start, v, lo, hi):
+    """Time along segment ``start + t * v`` with ``t`` in [0, 1] at which it
+    enters the box [lo, hi], or None if it does not intersect the box."""
+    t0, t1 = 0.0, 1.0
+    for i in range(2):
+        if v[i] == 0:
+            if start[i] < lo[i] or start[i] > hi[i]:
+                return None
+            continue
+        ta = (lo[i] - start[i]) / v[i]
+        tb = (hi[i] - start[i]) / v[i]
+        if ta > tb:
+            ta, tb = tb, ta
+        t0 = max(t0, ta)
+        t1 = min(t1, tb)
+        if t0 > t1:
+            return None
+    return t0
+
+
+class AABBTree:
+    """Static bounding volume hierarchy of axis-aligned bounding boxes.
+
+    Shapes may be ``Polygon`` or ``PaddedPoly`` objects. The tree is built
+    once by recursively splitting the shapes at the median of their centroids
+    along the longest axis.
+
+    Parameters
+    ----------
+    shapes : iterable of Polygon or PaddedPoly
+        The shapes to store.
+    leaf_size : int
+        The maximum number of shapes in a leaf node.
+    """
+
+    def __init__(self, shapes, leaf_size=2):
+        self.shapes = list(shapes)
+        self.aabbs = _shape_aabbs(self.shapes)
+        self.leaf_size = leaf_size
+
+        # nodes are stored in flat lists; leaves have no children and refer to
+        # the range [start, start + count) of self.order
+        self.order = np.arange(len(self.shapes))
+        self.node_lo = []
+        self.node_hi = []
+        self.node_children = []
+        self.node_range = []
+        if len(self.shapes) > 0:
+            self._build(0, len(self.shapes))
+        self.node_lo = np.array(self.node_lo).reshape(-1, 2)
+        self.node_hi = np.array(self.node_hi).reshape(-1, 2)
+
+    def _build(self, start, end):
+        """Build the subtree over ``self.order[start:end]`` and return the
+        index of its root node."""
+        idx = self.order[start:end]
+        aabbs = self.aabbs[idx]
+        node = len(self.node_lo)
+        self.node_lo.append(aabbs[:, :2].min(axis=0))
+        self.node_hi.append(aabbs[:, 2:].max(axis=0))
+        self.node_children.append(None)
+        self.node_range.append((start, end))
+
+        if end - start <= self.leaf_size:
+            return node
+
+        # split at the median along the longest axis of the centroids
+        centroids = 0.5 * (aabbs[:, :2] + aabbs[:, 2:])
+        axis = np.argmax(np.ptp(centroids, axis=0))
+        self.order[start:end] = idx[np.argsort(centroids[:, axis], kind="stable")]
+        mid = (start + end) // 2
+
+        left = self._build(start, mid)
+        right = self._build(mid, end)
+        self.node_children[node] = (left, right)
+        return node
+
+    def _traverse(self, overlaps):
+        """Get the indices of shapes in leaves whose boxes satisfy
+        ``overlaps(lo, hi)``, in their original order."""
+        if len(self.shapes) == 0:
+            return []
+        idx = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if not overlaps(self.node_lo[node], self.node_hi[node]):
+                continue
+            children = self.node_children[node]
+            if children is None:
+                start, end = self.node_range[node]
+                for i in self.order[start:end]:
+                    aabb = self.aabbs[i]
+                    if overlaps(aabb[:2], aabb[2:]):
+                        idx.append(i)
+            else:
+                stack.extend(children)
+        return sorted(idx)
+
+    def query_aabb(self, lo, hi):
+        """Get the shapes with bounding boxes overlapping a box."""
+
+        def overlaps(nlo, nhi):
+            return np.all(nlo <= hi) and np.all(nhi >= lo)
+
+        return [self.shapes[i] for i in self._traverse(overlaps)]
+
+    def query_point(self, point, radius=0):
+        """Get the shapes that may be within ``radius`` of a point."""
+        point = np.asarray(point, dtype=float)
+        return self.query_aabb(point - radius, point + radius)
+
+    def query_segment(self, segment, radius=0):
+        """Get the shapes that may intersect a segment.
+
+        If ``radius`` is positive, then the query is for a circle with that
+        radius swept along the segment.
+        """
+        return [self.shapes[i] for i in self.query_segment_indices(segment, radius)]
+
+    def query_segment_indices(self, segment, radius=0):
+        """Like ``query_segment``, but get the indices of the shapes."""
+
+        def overlaps(nlo, nhi):
+            t = _segment_aabb_entry_time(
+                segment.start, segment.v, nlo - radius, nhi + radius
+            )
+            return t is not None
+
+        return np.array(self._traverse(overlaps), dtype=int)
+
+    def _narrowphase(self, segment, radius, shape):
+        if isinstance(shape, PaddedPoly):
+            if radius > 0:
+                raise ValueError("Swept circle queries require Polygon shapes.")
+            return segment_padded_poly_query(segment, shape)
+        if radius > 0:
+            return swept_circle_poly_query(segment, radius, shape)
+        return segment_poly_query(segment, shape)
+
+    def segment_query(self, segment, radius=0):
+        """Find the first shape hit by a segment.
+
+        Nodes are visited in order of the time at which the segment enters
+        their bounding boxes, so the traversal stops as soon as no remaining
+        node can be hit before the best hit found so far.
+
+        Parameters
+        ----------
+        segment : Segment
+            A line segment.
+        radius : float
+            If positive, the query is for a circle with this radius swept
+            along the segment.
+
+        Returns
+        -------
+        : CollisionQuery or None
+            The collision information with the first shape hit by the segment,
+            as returned by the corresponding pairwise query, or None if no
+            shape is hit.
+        """
+        if len(self.shapes) == 0:
+            return None
+
+        best = None
+        best_time = np.inf
+        heap = [(0.0, 0)]
+        while heap:
+            t, node = heapq.heappop(heap)
+            if t > best_time:
+                break
+
+            children = self.node_children[node]
+            if children is None:
+                start, end = self.node_range[node]
+                for i in self.order[start:end]:
+                    Q = self._narrowphase(segment, radius, self.shapes[i])
+                    if Q.intersect and Q.time < best_time:
+                        best = Q
+                        best_time = Q.time
+                continue
+
+            for child in children:
+                t = _segment_aabb_entry_time(
+                    segment.start,
+                    segment.v,
+                    self.node_lo[child] - radius,
+                    self.node_hi[child] + radius,
+                )
+                if t is not None and t <= best_time:
+                    heapq.heappush(heap, (t, child))
+        return best
+
+    def ray_query(self, point, direction, radius=0, max_distance=None):
+        """Find the first shape hit by a ray.
+
+        The ray is cast from ``point`` along ``direction`` for
+        ``max_distance``; by default it extends past the tree's bounding box.
+        The time of the returned query is relative to ``max_distance``.
+        """
+        point = np.asarray(point, dtype=float)
+        direction = unit(np.asarray(direction, dtype=float))
+        if max_distance is None:
+            if len(self.shapes) == 0:
+                return None
+            lo, hi = self.node_lo[0] - radius, self.node_hi[0] + radius
+            center = 0.5 * (lo + hi)
+            max_distance = np.linalg.norm(hi - lo) + np.linalg.norm(point - center)
+        segment = Segment(point, point + max_distance * direction)
+        return self.segment_query(segment, radius=radius)
+
 
 def line_rect_edge_intersection(p, v, rect):
     """Compute the intersection of a line with the edge of the screen.
@@ -165,12 +646,10 @@ def point_in_poly(point, poly, tol=1e-8):
     """
     # if poly is composed of primitive shapes, then those are used for checking
     if poly.primitives is not None:
-        return np.all([point_in_poly(point, prim, tol=tol) for prim in poly.primitves])
+        return np.all([point_in_poly(point, prim, tol=tol) for prim in poly.primitives])
 
-    for v, n in zip(poly.vertices, poly.in_normals):
-        if (point - v) @ n < -tol:
-            return False
-    return True
+    depths = np.sum((point - poly.vertices) * poly.in_normals, axis=1)
+    return bool(np.all(depths >= -tol))
 
 
 def point_in_rect(point, rect, tol=1e-8):
@@ -214,7 +693,7 @@ def point_circle_query(point, circle):
     : CollisionQuery
         The collision information between the two shapes.
     """
-    d = np.linalg.norm(point - circle.center) - circle.radius
+    d = vec2.norm(vec2.sub(point, circle.center)) - circle.radius
     n = unit(point - circle.center)
 
     # the point is inside the circle
@@ -225,6 +704,43 @@ def point_circle_query(point, circle):
     return CollisionQuery(distance=d, p1=point, p2=p2, normal=n, intersect=False)
 
 
+def _point_segment_closest(point, segment):
+    """Closest point on a segment to a point.
+
+    Returns a tuple ``(distance, closest_point)``.
+    """
+    v = segment.v
+    t = vec2.dot(vec2.sub(point, segment.start), v) / vec2.dot(v, v)
+    if t <= 0:
+        r = segment.start
+    elif t >= 1:
+        r = segment.end
+    else:
+        r = segment.start + t * v
+    return vec2.norm(vec2.sub(point, r)), r
+
+
+def point_segment_distance(point, segment):
+    """Distance between a point and a line segment.
+
+    This is faster than ``point_segment_query`` when only the distance is
+    needed.
+
+    Parameters
+    ----------
+    point : pair of float
+        A 2D point.
+    segment : Segment
+        A line segment.
+
+    Returns
+    -------
+    : float
+        The distance between the two shapes.
+    """
+    return _point_segment_closest(point, segment)[0]
+
+
 def point_segment_query(point, segment):
     """Collision query between a point and a line segment.
 
@@ -245,16 +761,16 @@ def point_segment_query(point, segment):
     t = -(q @ segment.v) / (segment.v @ segment.v)
     if t >= 0 and t <= 1:
         r = segment.start + t * segment.v
-        d = np.linalg.norm(point - r)
-        intersect = np.isclose(d, 0)
+        d = vec2.norm(vec2.sub(point, r))
+        intersect = d <= vec2.EPS
         # if intersect:
         #     print("point")
         #     import IPython
         #     IPython.embed()
         return CollisionQuery(distance=d, p1=point, p2=r, intersect=intersect)
 
-    d1 = np.linalg.norm(point - segment.start)
-    d2 = np.linalg.norm(point - segment.end)
+    d1 = vec2.norm(vec2.sub(point, segment.start))
+    d2 = vec2.norm(vec2.sub(point, segment.end))
     if d1 < d2:
         n = unit(point - segment.start)
         return CollisionQuery(distance=d1, normal=n, p1=point, p2=segment.start)
@@ -298,7 +814,7 @@ def point_poly_query(point, poly):
             v = poly.vertices[min_idx]
         else:
             v = poly.vertices[next_idx]
-        dist = np.linalg.norm(point - v)
+        dist = vec2.norm(vec2.sub(point, v))
         normal = unit(point - v)
         return CollisionQuery(
             distance=dist, p1=point, p2=v, normal=normal, intersect=False
@@ -310,6 +826,413 @@ def point_poly_query(point, poly):
     return Q
 
 
+def point_poly_distance(point, poly):
+    """Distance between a point and a polygon.
+
+    This is faster than ``point_poly_query`` when only the distance is
+    needed.
+
+    Parameters
+    ----------
+    point : pair of float
+        A 2D point.
+    poly : Polygon
+        A polygon.
+
+    Returns
+    -------
+    : float
+        The distance between the two shapes, which is zero if the point is
+        inside the polygon.
+    """
+    deltas = point - poly.vertices
+    if np.all(np.sum(deltas * poly.in_normals, axis=1) >= 0):
+        return 0.0
+
+    # distance to the closest edge
+    ends = np.roll(poly.vertices, -1, axis=0)
+    edges = ends - poly.vertices
+    t = np.clip(np.sum(deltas * edges, axis=1) / np.sum(edges**2, axis=1), 0, 1)
+    r = poly.vertices + t[:, None] * edges
+    return np.min(np.linalg.norm(point - r, axis=1))
+
+
+def point_polys_query(points, poly_set):
+    """Batched collision query between many points and many polygons.
+
+    This is the vectorized equivalent of calling ``point_poly_query`` for
+    every pair of point and polygon.
+
+    Parameters
+    ----------
+    points : array_like, shape (N, 2)
+        The 2D points.
+    poly_set : PolygonSet
+        The polygons.
+
+    Returns
+    -------
+    : tuple
+        A tuple ``(distances, normals, closest)``, where ``distances`` has
+        shape (N, M) and ``normals`` and ``closest`` have shape (N, M, 2), with
+        ``M`` the number of polygons. ``closest`` are the closest points on the
+        polygons; points inside a polygon have zero distance and are their own
+        closest point, with the normal of the closest edge.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    p = points[:, None, None, :]
+
+    # inward-facing depth values for each edge, shape (N, M, K)
+    deltas = p - poly_set.vertices
+    depths = np.sum(deltas * poly_set.in_normals, axis=-1)
+
+    # closest point on each edge
+    sq_lengths = poly_set._edge_sq_lengths
+    t = np.sum(deltas * poly_set.edges, axis=-1)
+    t = np.divide(t, sq_lengths, out=np.zeros_like(t), where=sq_lengths > 0)
+    t = np.clip(t, 0, 1)
+    r = poly_set.vertices + t[..., None] * poly_set.edges
+    edge_dists = np.linalg.norm(p - r, axis=-1)
+
+    # outside: the closest point is the closest over all edges
+    rows = np.arange(points.shape[0])[:, None]
+    cols = np.arange(len(poly_set))[None, :]
+    closest_idx = np.argmin(edge_dists, axis=-1)
+    distances = edge_dists[rows, cols, closest_idx]
+    closest = r[rows, cols, closest_idx]
+    delta = points[:, None, :] - closest
+    norms = np.linalg.norm(delta, axis=-1, keepdims=True)
+    normals = np.divide(delta, norms, out=np.zeros_like(delta), where=norms > 0)
+
+    # inside: all depths are non-negative
+    inside = np.all(depths >= 0, axis=-1)
+    if np.any(inside):
+        min_idx = np.argmin(depths, axis=-1)
+        inside_normals = -poly_set.in_normals[cols, min_idx]
+        distances[inside] = 0
+        normals[inside] = inside_normals[inside]
+        closest[inside] = np.broadcast_to(points[:, None, :], closest.shape)[inside]
+
+    return distances, normals, closest
+
+
+def point_polys_distance(points, poly_set):
+    """Batched distances between many points and many polygons.
+
+    This is faster than ``point_polys_query`` when only the distances are
+    needed.
+
+    Parameters
+    ----------
+    points : array_like, shape (N, 2)
+        The 2D points.
+    poly_set : PolygonSet
+        The polygons.
+
+    Returns
+    -------
+    : np.ndarray, shape (N, M)
+        The distance between each point and each polygon, which is zero for
+        points inside a polygon.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    p = points[:, None, None, :]
+
+    deltas = p - poly_set.vertices
+    inside = np.all(np.sum(deltas * poly_set.in_normals, axis=-1) >= 0, axis=-1)
+
+    sq_lengths = poly_set._edge_sq_lengths
+    t = np.sum(deltas * poly_set.edges, axis=-1)
+    t = np.divide(t, sq_lengths, out=np.zeros_like(t), where=sq_lengths > 0)
+    t = np.clip(t, 0, 1)
+    r = poly_set.vertices + t[..., None] * poly_set.edges
+    distances = np.min(np.linalg.norm(p - r, axis=-1), axis=-1)
+    distances[inside] = 0
+    return distances
+
+
+def point_polys_signed_distance(points, poly_set):
+    """Signed distance between many points and the closest of many polygons.
+
+    Parameters
+    ----------
+    points : array_like, shape (N, 2)
+        The 2D points.
+    poly_set : PolygonSet
+        The polygons.
+
+    Returns
+    -------
+    : tuple
+        A tuple ``(distances, normals)``, where ``distances`` has shape (N,)
+        and ``normals`` has shape (N, 2). Distances are negative for points
+        inside a polygon, in which case they are the penetration depth. The
+        normals point out of the closest polygon.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    n = points.shape[0]
+    if len(poly_set) == 0:
+        return np.full(n, np.inf), np.zeros((n, 2))
+
+    distances, normals, _ = point_polys_query(points, poly_set)
+    deltas = points[:, None, None, :] - poly_set.vertices
+    depths = np.min(np.sum(deltas * poly_set.in_normals, axis=-1), axis=-1)
+    signed = np.where(depths >= 0, -depths, distances)
+
+    idx = np.argmin(signed, axis=1)
+    rows = np.arange(n)
+    return signed[rows, idx], normals[rows, idx]
+
+
+class DistanceField:
+    """Signed distance field of static polygons sampled on a regular grid.
+
+    The signed distance and outward normal to the closest polygon are
+    precomputed at each grid node, so that queries are a bilinear lookup
+    rather than a test against every polygon. Interpolated distances are
+    within ``sqrt(2) * resolution`` of the true distances; if
+    ``exact_within`` is given, points that may be closer than that to a
+    polygon are instead queried exactly, so results near contact match the
+    exact queries.
+
+    Points outside of the grid are clamped to its boundary.
+
+    Parameters
+    ----------
+    poly_set : PolygonSet
+        The polygons.
+    shape : pair of float
+        The width and height of the region covered by the grid, starting at
+        the origin.
+    resolution : float
+        The spacing between grid nodes.
+    exact_within : float or None
+        Distance below which queries fall back to exact computation.
+    """
+
+    # number of grid nodes to compute at once when building the field
+    _CHUNK_SIZE = 1024
+
+    def __init__(self, poly_set, shape, resolution=0.5, exact_within=None):
+        self.poly_set = poly_set
+        self.shape = tuple(shape)
+        self.resolution = resolution
+        self.exact_within = exact_within
+
+        # upper bound on the interpolation error
+        self.slack = np.sqrt(2) * resolution
+
+        self.n_nodes = tuple(int(np.ceil(s / resolution)) + 1 for s in self.shape)
+        xs = resolution * np.arange(self.n_nodes[0])
+        ys = resolution * np.arange(self.n_nodes[1])
+        nodes = np.stack(np.meshgrid(xs, ys, indexing="ij"), axis=-1).reshape(-1, 2)
+
+        distances = np.zeros(nodes.shape[0])
+        normals = np.zeros_like(nodes)
+        for i in range(0, nodes.shape[0], self._CHUNK_SIZE):
+            j = i + self._CHUNK_SIZE
+            distances[i:j], normals[i:j] = point_polys_signed_distance(
+                nodes[i:j], poly_set
+            )
+
+        # the grid is indexed [x, y]
+        self.distances = distances.reshape(self.n_nodes)
+        self.normals = normals.reshape(self.n_nodes + (2,))
+
+        # nested lists are much faster than arrays to index one element at a
+        # time, which is what single-point queries do
+        self._distance_list = self.distances.tolist()
+        self._normal_list = self.normals.tolist()
+
+    def _cell(self, x, y):
+        """Cell index and interpolation weights for a single point."""
+        gx = min(max(x / self.resolution, 0.0), self.n_nodes[0] - 1.0)
+        gy = min(max(y / self.resolution, 0.0), self.n_nodes[1] - 1.0)
+        i = min(int(gx), self.n_nodes[0] - 2)
+        j = min(int(gy), self.n_nodes[1] - 2)
+        return i, j, gx - i, gy - j
+
+    def interpolate(self, points):
+        """Bilinear interpolation of the distances and normals at points.
+
+        This never falls back to exact computation; the distances are within
+        ``self.slack`` of the true distances.
+
+        Parameters
+        ----------
+        points : array_like, shape (N, 2)
+            The 2D points.
+
+        Returns
+        -------
+        : tuple
+            A tuple ``(distances, normals)`` with shapes (N,) and (N, 2).
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        n = np.array(self.n_nodes)
+        g = np.clip(points / self.resolution, 0, n - 1)
+        ij = np.minimum(g.astype(int), n - 2)
+        f = g - ij
+        i, j = ij[:, 0], ij[:, 1]
+        fx, fy = f[:, 0], f[:, 1]
+
+        w00 = (1 - fx) * (1 - fy)
+        w10 = fx * (1 - fy)
+        w01 = (1 - fx) * fy
+        w11 = fx * fy
+
+        D = self.distances
+        distances = (
+            w00 * D[i, j] + w10 * D[i + 1, j] + w01 * D[i, j + 1] + w11 * D[i + 1, j + 1]
+        )
+        N = self.normals
+        normals = (
+            w00[:, None] * N[i, j]
+            + w10[:, None] * N[i + 1, j]
+            + w01[:, None] * N[i, j + 1]
+            + w11[:, None] * N[i + 1, j + 1]
+        )
+        norms = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals = np.divide(normals, norms, out=np.zeros_like(normals), where=norms > 0)
+        return distances, normals
+
+    def query(self, points):
+        """Signed distance and outward normal at each point.
+
+        Parameters
+        ----------
+        points : array_like, shape (N, 2)
+            The 2D points.
+
+        Returns
+        -------
+        : tuple
+            A tuple ``(distances, normals)`` with shapes (N,) and (N, 2). See
+            ``point_polys_signed_distance``.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        distances, normals = self.interpolate(points)
+        if self.exact_within is not None:
+            near = distances < self.exact_within + self.slack
+            if np.any(near):
+                distances[near], normals[near] = point_polys_signed_distance(
+                    points[near], self.poly_set
+                )
+        return distances, normals
+
+    def distance(self, point):
+        """Interpolated signed distance at a single point.
+
+        This does not fall back to exact computation; the result is within
+        ``self.slack`` of the true distance. Use ``query`` for exact results
+        near contact.
+        """
+        i, j, fx, fy = self._cell(point[0], point[1])
+        D = self._distance_list
+        return (1 - fx) * ((1 - fy) * D[i][j] + fy * D[i][j + 1]) + fx * (
+            (1 - fy) * D[i + 1][j] + fy * D[i + 1][j + 1]
+        )
+
+    def near(self, point, distance):
+        """Check if a single point may be within ``distance`` of a polygon.
+
+        This is conservative: it is True for every point that is within
+        ``distance`` of a polygon, but may also be True for some points that
+        are slightly farther away.
+        """
+        return self.distance(point) < distance + self.slack
+
+
+class FreeSpaceSampler:
+    """Sample points uniformly from the free space around static polygons.
+
+    The polygons' bounding boxes are inflated by ``radius`` and the free
+    space is split into rectangles along the edges of the inflated boxes.
+    Sampling picks a rectangle weighted by its area and then a point
+    uniformly within it, so no samples are rejected.
+
+    This is exact for axis-aligned rectangles when ``radius`` is zero. With a
+    positive radius, the rounded corners of the inflated rectangles are
+    excluded, so the sampled region is slightly conservative.
+
+    Parameters
+    ----------
+    shape : pair of float
+        The width and height of the arena.
+    poly_set : PolygonSet
+        The polygons.
+    radius : float
+        Minimum distance of the samples from the polygons and from the edges
+        of the arena.
+    """
+
+    def __init__(self, shape, poly_set, radius=0):
+        self.radius = radius
+        lo = np.array([radius, radius], dtype=float)
+        hi = np.array(shape, dtype=float) - radius
+
+        aabbs = np.hstack(
+            (
+                poly_set.vertices.min(axis=1) - radius,
+                poly_set.vertices.max(axis=1) + radius,
+            )
+        ).reshape(-1, 4)
+
+        # split along every edge of the inflated boxes
+        xs = np.concatenate(([lo[0], hi[0]], aabbs[:, 0], aabbs[:, 2]))
+        ys = np.concatenate(([lo[1], hi[1]], aabbs[:, 1], aabbs[:, 3]))
+        xs = np.unique(np.clip(xs, lo[0], hi[0]))
+        ys = np.unique(np.clip(ys, lo[1], hi[1]))
+
+        x0, y0 = np.meshgrid(xs[:-1], ys[:-1], indexing="ij")
+        x1, y1 = np.meshgrid(xs[1:], ys[1:], indexing="ij")
+        rects = np.stack((x0, y0, x1, y1), axis=-1).reshape(-1, 4)
+
+        # each rectangle is either entirely inside a box or entirely free
+        centers = 0.5 * (rects[:, :2] + rects[:, 2:])
+        blocked = np.any(
+            np.all(centers[:, None, :] > aabbs[:, :2], axis=-1)
+            & np.all(centers[:, None, :] < aabbs[:, 2:], axis=-1),
+            axis=1,
+        )
+        self.rects = rects[~blocked]
+        if len(self.rects) == 0:
+            raise ValueError("There is no free space to sample from.")
+
+        self._lo = self.rects[:, :2]
+        self._extent = self.rects[:, 2:] - self.rects[:, :2]
+        self._cdf = np.cumsum(np.prod(self._extent, axis=1))
+
+    @property
+    def area(self):
+        """Total area of the free space."""
+        return self._cdf[-1]
+
+    def sample(self, rng, n=None):
+        """Sample points uniformly from the free space.
+
+        Parameters
+        ----------
+        rng : np.random.Generator
+            The random number generator.
+        n : int or None
+            The number of points to sample. If None, a single point is
+            returned.
+
+        Returns
+        -------
+        : np.ndarray, shape (2,) or (n, 2)
+            The sampled points.
+        """
+        size = 1 if n is None else n
+        idx = np.searchsorted(self._cdf, rng.random(size) * self.area, side="right")
+        idx = np.minimum(idx, len(self.rects) - 1)
+        points = self._lo[idx] + rng.random((size, 2)) * self._extent[idx]
+        if n is None:
+            return points[0]
+        return points
+
+
 def segment_circle_query(segment, circle):
     """Collision query between a segment and a circle.
 
@@ -325,19 +1248,19 @@ def segment_circle_query(segment, circle):
     : CollisionQuery
         The collision information between the two shapes.
     """
-    Qc = point_segment_query(circle.center, segment)
-    normal = unit(Qc.p2 - circle.center)
+    dist, closest = _point_segment_closest(circle.center, segment)
+    normal = unit(closest - circle.center)
 
     # segment and circle do not intersect
-    if Qc.distance >= circle.radius:
+    if dist >= circle.radius:
         p2 = circle.center + circle.radius * normal
-        d = Qc.distance - circle.radius
+        d = dist - circle.radius
         return CollisionQuery(
-            distance=d, p1=Qc.p2, p2=p2, normal=normal, intersect=False
+            distance=d, p1=closest, p2=p2, normal=normal, intersect=False
         )
 
     # segment and circle intersect
-    if np.linalg.norm(segment.start - circle.center) <= circle.radius:
+    if vec2.norm(vec2.sub(segment.start, circle.center)) <= circle.radius:
         # if the segment starts inside the circle, the time is 0
         t = 0
     else:
@@ -352,7 +1275,7 @@ def segment_circle_query(segment, circle):
         t = np.min(ts)
 
     return CollisionQuery(
-        distance=0, p1=Qc.p2, p2=Qc.p2, normal=normal, time=t, intersect=True
+        distance=0, p1=closest, p2=closest, normal=normal, time=t, intersect=True
     )
 
 
@@ -415,41 +1338,54 @@ def segment_segment_query(segment1, segment2):
 
     # if the lines are not parallel and/or do not intersect, then at least one
     # of the closest points must be an endpoint: check all four
-    min_dist_query = point_segment_query(segment1.start, segment2)
-    min_dist_query.time = 0
+    p1 = segment1.start
+    d, p2 = _point_segment_closest(p1, segment2)
+
+    dist, r = _point_segment_closest(segment1.end, segment2)
+    if dist < d:
+        d, p1, p2 = dist, segment1.end, r
 
-    Q = point_segment_query(segment1.end, segment2)
-    if Q.distance < min_dist_query.distance:
-        min_dist_query = Q
-        min_dist_query.time = 1
+    dist, r = _point_segment_closest(segment2.start, segment1)
+    if dist < d:
+        d, p1, p2 = dist, r, segment2.start
 
-    Q = point_segment_query(segment2.start, segment1)
-    if Q.distance < min_dist_query.distance:
-        Q.p1, Q.p2 = Q.p2, Q.p1
-        min_dist_query = Q
+    dist, r = _point_segment_closest(segment2.end, segment1)
+    if dist < d:
+        d, p1, p2 = dist, r, segment2.end
 
+    # the segments may only touch at an endpoint
+    if np.isclose(d, 0):
         # back out the intersection time
-        min_dist_query.time = (Q.p1 - segment1.start) @ segment1.direction / segment1.length
+        t = (p1 - segment1.start) @ segment1.direction / segment1.length
+        return CollisionQuery(distance=d, p1=p1, p2=p2, time=t, intersect=True)
 
-    Q = point_segment_query(segment2.end, segment1)
-    if Q.distance < min_dist_query.distance:
-        Q.p1, Q.p2 = Q.p2, Q.p1
-        min_dist_query = Q
-        min_dist_query.time = (Q.p1 - segment1.start) @ segment1.direction / segment1.length
+    normal = unit(p1 - p2)
+    return CollisionQuery(distance=d, p1=p1, p2=p2, normal=normal, intersect=False)
 
-    return min_dist_query
 
+def segment_poly_intersect(segment, poly):
+    """Check if a segment and a polygon intersect.
+
+    This is faster than ``segment_poly_query`` when only a boolean is needed.
 
-def _segment_poly_intersect(segment, poly):
-    """True if segment and rectangle are intersecting, False otherwise."""
+    Parameters
+    ----------
+    segment : Segment
+        A line segment.
+    poly : Polygon
+        A polygon.
+
+    Returns
+    -------
+    : bool
+        True if the shapes intersect, False otherwise.
+    """
     # look for separating axis
     normals = np.vstack((poly.out_normals, segment.normal))
-    for normal in normals:
-        s = [normal @ segment.start, normal @ segment.end]
-        r = poly.vertices @ normal
-        if np.max(s) < np.min(r) or np.min(s) > np.max(r):
-            return False
-    return True
+    s = normals @ np.array([segment.start, segment.end]).T
+    r = poly.vertices @ normals.T
+    separated = (s.max(axis=1) < r.min(axis=0)) | (s.min(axis=1) > r.max(axis=0))
+    return not np.any(separated)
 
 
 def segment_poly_query(segment, poly):
@@ -467,7 +1403,7 @@ def segment_poly_query(segment, poly):
     : CollisionQuery
         The collision information between the two shapes.
     """
-    if _segment_poly_intersect(segment, poly):
+    if segment_poly_intersect(segment, poly):
         # if the segment starts in the polygon, then we're done
         Q = point_poly_query(segment.start, poly)
         if Q.intersect:
@@ -497,6 +1433,620 @@ def segment_poly_query(segment, poly):
     return min_dist_query
 
 
+def segments_polys_intersect(starts, ends, poly_set):
+    """Batched intersection times between many segments and many polygons.
+
+    Each segment is clipped against each polygon using the Cyrus-Beck
+    algorithm.
+
+    Parameters
+    ----------
+    starts : array_like, shape (N, 2)
+        The start points of the segments.
+    ends : array_like, shape (N, 2)
+        The end points of the segments.
+    poly_set : PolygonSet
+        The polygons.
+
+    Returns
+    -------
+    : np.ndarray, shape (N, M)
+        The time in [0, 1] along each segment at which it first intersects
+        each polygon, or ``np.inf`` if they do not intersect.
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    return _clip_segments(starts, ends, poly_set.vertices, poly_set.in_normals)
+
+
+def segments_polys_intersect_candidates(starts, ends, poly_set, candidates):
+    """Batched intersection times between segments and candidate polygons.
+
+    This is like ``segments_polys_intersect``, but each segment is only tested
+    against its own candidate polygons, such as those found by a broadphase.
+
+    Parameters
+    ----------
+    starts : array_like, shape (N, 2)
+        The start points of the segments.
+    ends : array_like, shape (N, 2)
+        The end points of the segments.
+    poly_set : PolygonSet
+        The polygons.
+    candidates : list of array_like
+        The indices of the candidate polygons of each segment.
+
+    Returns
+    -------
+    : np.ndarray, shape (N, K)
+        The time in [0, 1] along each segment at which it first intersects
+        each of its candidates, or ``np.inf`` if they do not intersect. ``K``
+        is the largest number of candidates; segments with fewer candidates
+        are padded with ``np.inf``.
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    k = max([len(c) for c in candidates], default=0)
+    if k == 0:
+        return np.full((starts.shape[0], 0), np.inf)
+
+    # pad with the first polygon and mask out its results
+    idx = np.zeros((starts.shape[0], k), dtype=int)
+    valid = np.zeros((starts.shape[0], k), dtype=bool)
+    for i, c in enumerate(candidates):
+        idx[i, : len(c)] = c
+        valid[i, : len(c)] = True
+
+    times = _clip_segments(
+        starts, ends, poly_set.vertices[idx], poly_set.in_normals[idx]
+    )
+    return np.where(valid, times, np.inf)
+
+
+def _clip_segments(starts, ends, vertices, in_normals):
+    """Cyrus-Beck clipping of (N, 2) segments against polygons with vertices
+    and normals of shape (M, n, 2), or (N, M, n, 2) for per-segment polygons."""
+    p = starts[..., None, None, :]
+    v = (ends - starts)[..., None, None, :]
+
+    # the segment is inside edge k's half-plane when num + t * den >= 0
+    num = np.sum((p - vertices) * in_normals, axis=-1)
+    den = np.sum(v * in_normals, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = -num / den
+
+    entering = den > 0
+    leaving = den < 0
+    t_enter = np.max(np.where(entering, t, 0), axis=-1, initial=0)
+    t_exit = np.min(np.where(leaving, t, 1), axis=-1, initial=1)
+
+    # parallel to an edge and outside of it
+    outside = np.any((den == 0) & (num < 0), axis=-1)
+
+    hit = (t_enter <= t_exit) & ~outside
+    return np.where(hit, t_enter, np.inf)
+
+
+def segments_circles_intersect(starts, ends, centers, radii):
+    """Batched intersection times between many segments and many circles.
+
+    Parameters
+    ----------
+    starts : array_like, shape (N, 2)
+        The start points of the segments.
+    ends : array_like, shape (N, 2)
+        The end points of the segments.
+    centers : array_like, shape (M, 2)
+        The centers of the circles.
+    radii : array_like, shape (M,)
+        The radii of the circles.
+
+    Returns
+    -------
+    : np.ndarray, shape (N, M)
+        The time in [0, 1] along each segment at which it first intersects
+        each circle, or ``np.inf`` if they do not intersect. Segments that
+        start inside a circle intersect it at time zero.
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    radii = np.asarray(radii, dtype=float)
+
+    q = starts[:, None, :] - centers
+    v = (ends - starts)[:, None, :]
+
+    # coefficients of the quadratic |q + t * v|^2 = r^2
+    a = np.sum(v * v, axis=-1)
+    b = 2 * np.sum(q * v, axis=-1)
+    c = np.sum(q * q, axis=-1) - radii**2
+
+    # closest point on the segment to each center
+    s = np.divide(-0.5 * b, a, out=np.zeros_like(b), where=a > 0)
+    s = np.clip(s, 0, 1)
+    dists = np.linalg.norm(q + s[..., None] * v, axis=-1)
+    hit = dists < radii
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (-b - np.sqrt(np.maximum(b**2 - 4 * a * c, 0))) / (2 * a)
+    t = np.where(c <= 0, 0, t)
+    return np.where(hit, t, np.inf)
+
+
+def _cross(a, b):
+    """2D cross product, broadcasting over the leading dimensions."""
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def witness_vertices(points, poly_set, tol=1e-8):
+    """Batched witness vertices of each polygon as seen from each point.
+
+    The witness vertices are the extreme right and left vertices of a
+    polygon as seen from a point, so that all of the polygon lies between
+    the rays from the point through them. This is the batched version of
+    ``Obstacle._compute_witness_vertices``.
+
+    Parameters
+    ----------
+    points : array_like, shape (N, 2)
+        The viewpoints, which should lie outside of the polygons.
+    poly_set : PolygonSet
+        The polygons.
+    tol : float
+        Tolerance for the extreme vertex test.
+
+    Returns
+    -------
+    : tuple
+        The right and left witness vertices, each with shape (N, M, 2).
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    deltas = poly_set.vertices - points[:, None, None, :]
+
+    # dists[..., i, j] is the signed distance of vertex j from the ray to
+    # vertex i, scaled by the length of the ray
+    dists = (
+        deltas[..., :, None, 1] * deltas[..., None, :, 0]
+        - deltas[..., :, None, 0] * deltas[..., None, :, 1]
+    )
+
+    # padded vertices repeat the first vertex, so they are never picked
+    right_idx = np.argmax(np.all(dists >= -tol, axis=-1), axis=-1)
+    left_idx = np.argmax(np.all(dists <= tol, axis=-1), axis=-1)
+
+    vertices = np.broadcast_to(poly_set.vertices, deltas.shape)
+    right = np.take_along_axis(vertices, right_idx[..., None, None], axis=2)
+    left = np.take_along_axis(vertices, left_idx[..., None, None], axis=2)
+    return right[:, :, 0], left[:, :, 0]
+
+
+def occlusion_polygons(points, poly_set, rect):
+    """Batched polygons of the regions occluded by each polygon.
+
+    This is the batched version of ``Obstacle._compute_occlusion2``. Each
+    occlusion polygon has six vertices: the right witness vertex, its
+    extension to the edge of the screen, up to two corners of the screen,
+    the extension of the left witness vertex, and the left witness vertex.
+    Missing corners are filled by repeating the neighbouring vertex.
+
+    Parameters
+    ----------
+    points : array_like, shape (N, 2)
+        The viewpoints.
+    poly_set : PolygonSet
+        The polygons.
+    rect : AARect
+        The screen rectangle.
+
+    Returns
+    -------
+    : np.ndarray, shape (N, M, 6, 2)
+        The vertices of the occlusion polygon for each viewpoint and
+        polygon.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    right, left = witness_vertices(points, poly_set)
+
+    p = points[:, None, :]
+    corners = rect.vertices
+    deltas = corners - p[:, :, None, :]
+
+    def unit_rows(v):
+        norms = np.linalg.norm(v, axis=-1, keepdims=True)
+        return np.divide(v, norms, out=np.zeros_like(v), where=norms > vec2.EPS)
+
+    dir_right = unit_rows(right - p)
+    dir_left = unit_rows(left - p)
+    dists = np.max(np.sum(deltas * dir_right[..., None, :], axis=-1), axis=-1)
+    extra_right = p + dists[..., None] * dir_right
+    dists = np.max(np.sum(deltas * dir_left[..., None, :], axis=-1), axis=-1)
+    extra_left = p + dists[..., None] * dir_left
+
+    # inward-facing normals of the sides of the occluded region
+    normal_right = np.stack((dir_right[..., 1], -dir_right[..., 0]), axis=-1)
+    normal_left = np.stack((-dir_left[..., 1], dir_left[..., 0]), axis=-1)
+    dists_right = np.sum(deltas * normal_right[..., None, :], axis=-1)
+    dists_left = np.sum(deltas * normal_left[..., None, :], axis=-1)
+
+    # take the first two corners in the region, ordered by increasing
+    # distance from the right side
+    mask = (dists_right >= 0) & (dists_left >= 0)
+    n = np.sum(mask, axis=-1)
+    order = np.argsort(~mask, axis=-1, kind="stable")[..., :2]
+    dists_right = np.take_along_axis(dists_right, order, axis=-1)
+    swap = (n > 1) & (dists_right[..., 0] > dists_right[..., 1])
+    order = np.where(swap[..., None], order[..., ::-1], order)
+    first = corners[order[..., 0]]
+    second = corners[order[..., 1]]
+
+    second = np.where((n == 1)[..., None], first, second)
+    first = np.where((n == 0)[..., None], extra_right, first)
+    second = np.where((n == 0)[..., None], extra_right, second)
+
+    return np.stack((right, extra_right, first, second, extra_left, left), axis=-2)
+
+
+def points_polys_occluded(viewpoints, points, poly_set, chunk_size=2**22):
+    """Batched test of whether each point is occluded from each viewpoint.
+
+    A point is occluded by a polygon if it lies between the rays from the
+    viewpoint through the polygon's witness vertices, beyond the segment
+    joining them. Viewpoints inside a polygon are not occluded by it.
+
+    Parameters
+    ----------
+    viewpoints : array_like, shape (N, 2)
+        The viewpoints.
+    points : array_like, shape (P, 2)
+        The points to test.
+    poly_set : PolygonSet
+        The occluding polygons.
+    chunk_size : int
+        Viewpoints are processed in chunks so that the intermediate arrays
+        have roughly at most this many elements.
+
+    Returns
+    -------
+    : np.ndarray, shape (N, P)
+        True for each point that is occluded from each viewpoint, False
+        otherwise.
+    """
+    viewpoints = np.asarray(viewpoints, dtype=float).reshape(-1, 2)
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    right, left = witness_vertices(viewpoints, poly_set)
+
+    # each occluded region is the intersection of three half-planes
+    # a * x + b * y + c >= 0: the two sides of the wedge and the far side of
+    # the segment between the witness vertices
+    v = viewpoints[:, None, :]
+    r = right - v
+    l = left - v
+    e = left - right
+    s = np.sign(_cross(r, l))[..., None]
+    g = -np.sign(_cross(e, -r))[..., None]
+
+    def half_plane(n, p, sign):
+        # the half-plane n . (x - p) >= 0, flipped by sign
+        c = -np.sum(n * p, axis=-1, keepdims=True)
+        return sign * np.concatenate((n, c), axis=-1)
+
+    planes = np.stack(
+        (
+            half_plane(np.stack((-r[..., 1], r[..., 0]), axis=-1), v, s),
+            half_plane(np.stack((l[..., 1], -l[..., 0]), axis=-1), v, s),
+            half_plane(np.stack((-e[..., 1], e[..., 0]), axis=-1), right, g),
+        ),
+        axis=-2,
+    )
+
+    # the viewpoint is inside the polygon, so it occludes nothing
+    planes[(s == 0)[..., 0]] = [0, 0, -1]
+
+    n, m = planes.shape[:2]
+    planes = planes.reshape(n, 3 * m, 3)
+    points = np.hstack((points, np.ones((points.shape[0], 1))))
+
+    occluded = np.zeros((n, points.shape[0]), dtype=bool)
+    step = max(1, chunk_size // max(1, 3 * m * points.shape[0]))
+    for i in range(0, n, step):
+        values = (planes[i : i + step] @ points.T).reshape(-1, m, 3, points.shape[0])
+        occluded[i : i + step] = np.any(np.all(values >= 0, axis=2), axis=1)
+    return occluded
+
+
+class _ActiveEdges:
+    """Binary heap of the edges crossed by a ray turning about a viewpoint,
+    with the nearest edge along the ray on top.
+
+    Edges that do not cross each other keep their order along the ray while
+    they are both crossed by it, so the heap stays valid as the ray turns.
+    Edges are removed by index, so the heap only holds the edges crossed by
+    the current ray.
+    """
+
+    def __init__(self, viewpoint, starts, edges, end_angles):
+        self.viewpoint = viewpoint
+        self.starts = starts
+        self.edges = edges
+        self.end_angles = end_angles
+        self.angle = 0.0
+        self.heap = []
+        self.index = {}
+
+    def distance(self, i, angle):
+        """Distance along the ray at ``angle`` to the line through edge ``i``."""
+        (ax, ay), (ex, ey) = self.starts[i], self.edges[i]
+        dx, dy = math.cos(angle), math.sin(angle)
+        ax -= self.viewpoint[0]
+        ay -= self.viewpoint[1]
+        return (ax * ey - ay * ex) / (dx * ey - dy * ex)
+
+    def _less(self, i, j):
+        di = self.distance(i, self.angle)
+        dj = self.distance(j, self.angle)
+        if abs(di - dj) > 1e-9 * max(1.0, di, dj):
+            return di < dj
+
+        # the edges meet on the ray, so compare them further along the sweep
+        ri = (self.end_angles[i] - self.angle) % (2 * math.pi)
+        rj = (self.end_angles[j] - self.angle) % (2 * math.pi)
+        angle = self.angle + 0.5 * min(ri, rj)
+        di = self.distance(i, angle)
+        dj = self.distance(j, angle)
+        if abs(di - dj) > 1e-9 * max(1.0, di, dj):
+            return di < dj
+        return i < j
+
+    def _swap(self, a, b):
+        heap = self.heap
+        heap[a], heap[b] = heap[b], heap[a]
+        self.index[heap[a]] = a
+        self.index[heap[b]] = b
+
+    def _sift_up(self, k):
+        while k > 0:
+            parent = (k - 1) // 2
+            if not self._less(self.heap[k], self.heap[parent]):
+                break
+            self._swap(k, parent)
+            k = parent
+
+    def _sift_down(self, k):
+        n = len(self.heap)
+        while True:
+            child = 2 * k + 1
+            if child >= n:
+                break
+            if child + 1 < n and self._less(self.heap[child + 1], self.heap[child]):
+                child += 1
+            if not self._less(self.heap[child], self.heap[k]):
+                break
+            self._swap(k, child)
+            k = child
+
+    def push(self, i):
+        self.heap.append(i)
+        self.index[i] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def remove(self, i):
+        k = self.index.pop(i)
+        last = self.heap.pop()
+        if k < len(self.heap):
+            self.heap[k] = last
+            self.index[last] = k
+            self._sift_up(k)
+            self._sift_down(self.index[last])
+
+    def nearest(self, angle):
+        """Distance along the ray at ``angle`` to the nearest edge."""
+        if not self.heap:
+            return np.inf
+        return self.distance(self.heap[0], angle)
+
+
+class VisibilityPolygon:
+    """Region visible from a viewpoint among polygonal obstacles.
+
+    The polygon is computed by an angular sweep about the viewpoint. The edges
+    of the obstacles that face the viewpoint and the edges of the boundary
+    are sorted by the angles of their endpoints. As a ray turns through these
+    angles, the edges that it crosses are kept in a heap ordered by their
+    distance along the ray. The nearest edge just before and just after each
+    endpoint gives the vertices of the visible region. This takes
+    O(E log E) time for E edges. The obstacles should not overlap each other,
+    since edges that cross can change order between the endpoints.
+
+    Once built, ``can_see`` answers line-of-sight queries from the viewpoint
+    with a binary search over the angles of the vertices.
+
+    Parameters
+    ----------
+    viewpoint : array_like, shape (2,)
+        The viewpoint, which must be inside ``rect``.
+    poly_set : PolygonSet
+        The occluding polygons.
+    rect : AARect
+        The boundary of the visible region, typically the screen.
+
+    Attributes
+    ----------
+    vertices : np.ndarray, shape (K, 2)
+        The vertices of the visible region, in order of increasing angle.
+    angles : np.ndarray, shape (K,)
+        The angle of each vertex about the viewpoint, in [-pi, pi].
+    """
+
+    def __init__(self, viewpoint, poly_set, rect):
+        self.viewpoint = np.array(viewpoint, dtype=float)
+
+        # only the edges of the polygons that face the viewpoint can be seen;
+        # padded edges are skipped
+        real = np.arange(poly_set.vertices.shape[1]) < poly_set.n_vertices[:, None]
+        facing = (
+            np.sum((self.viewpoint - poly_set.vertices) * poly_set.in_normals, axis=-1)
+            < 0
+        )
+        mask = real & facing
+        starts = np.vstack((poly_set.vertices[mask], rect.vertices))
+        ends = np.vstack((poly_set.ends[mask], np.roll(rect.vertices, -1, axis=0)))
+
+        # orient the edges counter-clockwise about the viewpoint, and skip those
+        # that are seen edge-on
+        flip = _cross(starts - self.viewpoint, ends - self.viewpoint) < 0
+        starts[flip], ends[flip] = ends[flip], starts[flip].copy()
+
+        # the angles of shared endpoints must be equal for their events to be
+        # processed together, so they are all computed in the same way
+        start_angles = self._angles(starts)
+        start_angles[start_angles == np.pi] = -np.pi
+        end_angles = self._angles(ends)
+        spans = end_angles - start_angles
+        wraps = spans <= 0
+        spans[wraps] += 2 * np.pi
+        keep = spans > 1e-12
+        starts, ends = starts[keep], ends[keep]
+        start_angles, end_angles = start_angles[keep], end_angles[keep]
+        wraps = wraps[keep]
+
+        # the sweep starts at angle -pi, when the edges across it are active
+        active = _ActiveEdges(
+            tuple(self.viewpoint),
+            starts.tolist(),
+            (ends - starts).tolist(),
+            end_angles.tolist(),
+        )
+        active.angle = -np.pi
+        events = []
+        for i, (a0, a1) in enumerate(zip(start_angles.tolist(), end_angles.tolist())):
+            if wraps[i]:
+                active.push(i)
+            events.append((a1, 0, i))
+            events.append((a0, 1, i))
+        events.sort()
+
+        # removals are processed before additions at the same angle; rays
+        # exactly through an endpoint are blocked by the nearer of the edges
+        # before and after it
+        angles = [-np.pi]
+        dists = [active.nearest(-np.pi)]
+        ray_angles, ray_dists = [], []
+        k = 0
+        while k < len(events):
+            angle = events[k][0]
+            active.angle = angle
+            before = active.nearest(angle)
+            while k < len(events) and events[k][0] == angle:
+                _, add, i = events[k]
+                if add:
+                    active.push(i)
+                else:
+                    active.remove(i)
+                k += 1
+            after = active.nearest(angle)
+
+            angles.append(angle)
+            dists.append(before)
+            if abs(after - before) > 1e-9 * max(1.0, before):
+                angles.append(angle)
+                dists.append(after)
+            ray_angles.append(angle)
+            ray_dists.append(min(before, after))
+
+        self._ray_angles = np.array(ray_angles)
+        self._ray_dists = np.array(ray_dists)
+
+        self.angles = np.array(angles)
+        rays = np.stack((np.cos(self.angles), np.sin(self.angles)), axis=1)
+        self.vertices = self.viewpoint + np.array(dists)[:, None] * rays
+
+        # close the polygon for the binary search
+        self._angles = np.append(self.angles, self.angles[0] + 2 * np.pi)
+        self._vertices = np.vstack((self.vertices, self.vertices[:1]))
+
+    def _angles(self, points):
+        deltas = points - self.viewpoint
+        return np.arctan2(deltas[:, 1], deltas[:, 0])
+
+    def can_see(self, points, tol=1e-8):
+        """Check if each point is visible from the viewpoint.
+
+        Parameters
+        ----------
+        points : array_like, shape (N, 2)
+            The points to check.
+        tol : float
+            Tolerance for a point on the boundary to be considered visible.
+
+        Returns
+        -------
+        : np.ndarray, shape (N,)
+            True for each point in the visible region, False otherwise.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        deltas = points - self.viewpoint
+        angles = np.arctan2(deltas[:, 1], deltas[:, 0])
+        angles = np.where(angles < self._angles[0], angles + 2 * np.pi, angles)
+
+        idx = np.searchsorted(self._angles, angles, side="right") - 1
+        idx = np.clip(idx, 0, len(self.vertices) - 1)
+        a = self._vertices[idx]
+        b = self._vertices[idx + 1]
+
+        # the vertices are in counter-clockwise order, so the visible region
+        # is to the left of each boundary edge
+        edges = b - a
+        dists = _cross(edges, points - a)
+        visible = dists >= -tol * np.linalg.norm(edges, axis=1)
+
+        # points on a ray through an endpoint of an edge
+        k = np.searchsorted(self._ray_angles, angles)
+        k = np.clip(k, 0, max(len(self._ray_angles) - 1, 0))
+        if len(self._ray_angles) > 0:
+            on_ray = self._ray_angles[k] == angles
+            near = np.linalg.norm(deltas, axis=1) <= self._ray_dists[k] + tol
+            visible = np.where(on_ray, near, visible)
+        return visible
+
+    def can_see_circles(self, centers, radii, tol=1e-8):
+        """Check if any part of each circle is visible from the viewpoint.
+
+        A circle is visible if its center is in the visible region or it
+        reaches the boundary of the region.
+
+        Parameters
+        ----------
+        centers : array_like, shape (N, 2)
+            The centers of the circles.
+        radii : float or array_like, shape (N,)
+            The radii of the circles.
+        tol : float
+            Tolerance for a circle touching the boundary to be considered
+            visible.
+
+        Returns
+        -------
+        : np.ndarray, shape (N,)
+            True for each circle that is at least partly visible.
+        """
+        centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+
+        # distance from each center to each edge of the boundary, some of
+        # which have zero length
+        a = self._vertices[:-1]
+        edges = self._vertices[1:] - a
+        lengths_sq = np.sum(edges**2, axis=1)
+        deltas = centers[:, None, :] - a
+        t = np.sum(deltas * edges, axis=-1)
+        t = np.divide(t, lengths_sq, out=np.zeros_like(t), where=lengths_sq > 0)
+        t = np.clip(t, 0, 1)
+        dists = np.linalg.norm(deltas - t[..., None] * edges, axis=-1)
+
+        near = np.any(dists <= radii[:, None] + tol, axis=1)
+        return near | self.can_see(centers, tol=tol)
+
+
 def swept_circle_poly_query(segment, radius, poly):
     """Collision query between circle swept along a path and a polygon.
 
@@ -516,61 +2066,28 @@ def swept_circle_poly_query(segment, radius, poly):
     : CollisionQuery
         The collision information between the two shapes.
     """
+    # the padded geometry is cached on the polygon
+    return segment_padded_poly_query(segment, poly.pad(radius))
 
-    # check if the shapes do not intersect at all
-    Q = segment_poly_query(segment, poly)
-    if Q.distance > radius:
-        n = unit(Q.p2 - Q.p1)
-        p1 = Q.p1 + radius * n
-        d = Q.distance - radius
-        return CollisionQuery(distance=d, normal=-n, p1=p1, p2=Q.p2, intersect=False)
-
-    # build the padded rectangle
-    circles = [Circle(center=v, radius=radius) for v in poly.vertices]
-    edges = [
-        Segment(start=e.start + radius * n, end=e.end + radius * n)
-        for e, n in zip(poly.edges, poly.out_normals)
-    ]
 
-    # check if we are starting inside the shape
-    vertices = []
-    for edge in edges:
-        vertices.append(edge.start)
-        vertices.append(edge.end)
-    poly2 = Polygon(vertices)
-
-    Q = point_poly_query(segment.start, poly2)
-    if Q.intersect:
-        Q.time = 0
-        return Q
-
-    for circle in circles:
-        Q = point_circle_query(segment.start, circle)
-        if Q.intersect:
-            Q.time = 0
-            return Q
-
-    # find the minimum intersection time with all of the shapes
-    min_time_query = segment_circle_query(segment, circles[0])
-    for circle in circles:
-        Q = segment_circle_query(segment, circle)
-        if Q.intersect and (
-            min_time_query.time is None or Q.time < min_time_query.time
-        ):
-            min_time_query = Q
-
-    for i, edge in enumerate(edges):
-        Q = segment_segment_query(segment, edge)
-        if Q.intersect and (
-            min_time_query.time is None or Q.time < min_time_query.time
-        ):
-            Q.normal = poly.out_normals[i]
-            min_time_query = Q
+def segment_padded_poly_query(segment, padded):
+    """Collision query between a segment and a padded polygon.
 
-    return min_time_query
+    This is equivalent to ``swept_circle_poly_query`` with the padding radius
+    of the polygon.
 
+    Parameters
+    ----------
+    segment : Segment
+        A line segment representing the path of the circle's center.
+    padded : PaddedPoly
+        A padded polygon.
 
-def segment_padded_poly_query(segment, padded):
+    Returns
+    -------
+    : CollisionQuery
+        The collision information between the two shapes.
+    """
     # check if the shapes do not intersect at all
     Q = segment_poly_query(segment, padded.poly)
     if Q.distance > padded.radius:
@@ -0,0 +1,64 @@
+"""Configuration of the interactive games."""
+import dataclasses
+
+
+@dataclasses.dataclass(frozen=True)
+class GameConfig:
+    """Options shared by ``TagGame``, ``HuntGame`` and ``ShootGame``.
+
+    Each game module defines a ``DEFAULT_CONFIG`` that is used when no
+    configuration is passed to the game.
+
+    Parameters
+    ----------
+    use_ccd : bool
+        Use continuous collision detection. This can be turned off for more
+        efficiency.
+    use_bvh : bool
+        Use a bounding volume hierarchy rather than a uniform grid for
+        obstacle collision queries, in games that have a broadphase.
+    use_ai_policy : bool
+        Control the enemy with the AI policy.
+    n_treasures : int
+        Number of treasures to collect.
+    treasure_radius : float
+        Radius of each treasure.
+    occlude_treasures : bool
+        Hide the treasures behind the occlusions.
+    draw_occlusions : bool
+        Draw the regions occluded by obstacles from the player's viewpoint.
+    render_scale : int
+        Scale up rendering by this value.
+    use_distance_field : bool
+        Precompute a signed distance field of the obstacles for distance
+        queries.
+    distance_field_resolution : float
+        Spacing of the distance field samples.
+    exact_contact : bool
+        Fall back to exact obstacle queries near contact, rather than using
+        the interpolated distance field.
+    use_visibility_table : bool
+        Load the precomputed ``VisibilityTable`` of the level, building and
+        caching it on first use, for line of sight lookups. Only used by the
+        games with fixed levels, tag and hunt.
+    visibility_cell_size : float
+        Side length of the cells of the visibility table.
+    """
+
+    use_ccd: bool = True
+    use_bvh: bool = False
+    use_ai_policy: bool = True
+    n_treasures: int = 2
+    treasure_radius: float = 1
+    occlude_treasures: bool = True
+    draw_occlusions: bool = True
+    render_scale: int = 8
+    use_distance_field: bool = True
+    distance_field_resolution: float = 0.5
+    exact_contact: bool = True
+    use_visibility_table: bool = True
+    visibility_cell_size: float = 1
+
+    def replace(self, **changes):
+        """Copy of the configuration with some of the options changed."""
+        return dataclasses.replace(self, **changes)
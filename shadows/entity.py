@@ -1,9 +1,18 @@
+import math
+
 import numpy as np
-import pygame
 
+from . import vec2
 from .math import rotmat, orth, unit, wrap_to_pi, angle2pi
-from .collision import Circle, Segment, line_rect_edge_intersection
-from .gui import Color
+from .collision import (
+    Circle,
+    Segment,
+    line_rect_edge_intersection,
+    segments_circles_intersect,
+    segments_polys_intersect,
+    segments_polys_intersect_candidates,
+)
+from .gui import Color, pygame
 
 
 PLAYER_FORWARD_VEL = 75  # px per second
@@ -79,8 +88,8 @@ class Agent(Entity):
     def direction(self):
         """Unit vector in the direction the agent is facing."""
         # first column of the rotation matrix
-        c = np.cos(self.angle)
-        s = np.sin(self.angle)
+        c = math.cos(self.angle)
+        s = math.sin(self.angle)
         return np.array([c, -s])
 
     def draw(self, surface, scale=1, draw_direction=True, draw_outline=True):
@@ -134,7 +143,7 @@ class Agent(Entity):
         self.angle = wrap_to_pi(self.angle + dt * self.angvel)
         self.position = self.position + dt * self.velocity
 
-        self.last_vel_mag = np.linalg.norm(self.velocity)
+        self.last_vel_mag = vec2.norm(self.velocity)
 
         self.velocity = np.zeros(2)
         self.angvel = 0
@@ -150,7 +159,7 @@ class Agent(Entity):
             return None
 
         # if the target is inside the agent, do nothing
-        norm = np.linalg.norm(target - self.position)
+        norm = vec2.norm(vec2.sub(target, self.position))
         if norm > self.radius:
             direction = (target - self.position) / norm
             self.shot_cooldown = SHOT_COOLDOWN_TICKS
@@ -227,6 +236,152 @@ class Projectile(Entity):
         self.position += dt * self.velocity
 
 
+class ProjectilePool:
+    """Projectiles stored in preallocated arrays.
+
+    Free slots are tracked with a free-list, so spawning and despawning do not
+    allocate. The arrays are doubled in size if more projectiles are needed.
+
+    Parameters
+    ----------
+    capacity : int
+        The initial number of projectile slots.
+    """
+
+    def __init__(self, capacity=64):
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.agent_ids = np.full(capacity, -1, dtype=int)
+        self.active = np.zeros(capacity, dtype=bool)
+        self._free = list(range(capacity - 1, -1, -1))
+
+        self.color = Color.PROJECTILE
+        self.radius = PROJECTILE_RADIUS
+
+    def __len__(self):
+        return self.active.shape[0] - len(self._free)
+
+    @property
+    def capacity(self):
+        return self.active.shape[0]
+
+    def _grow(self):
+        n = self.capacity
+        m = max(1, 2 * n)
+        self.positions = np.resize(self.positions, (m, 2))
+        self.velocities = np.resize(self.velocities, (m, 2))
+        self.agent_ids = np.resize(self.agent_ids, m)
+        self.active = np.resize(self.active, m)
+        self.active[n:] = False
+        self._free.extend(range(m - 1, n - 1, -1))
+
+    def spawn(self, position, velocity, agent_id):
+        """Add a projectile and return its slot index."""
+        if not self._free:
+            self._grow()
+        idx = self._free.pop()
+        self.positions[idx] = position
+        self.velocities[idx] = velocity
+        self.agent_ids[idx] = agent_id
+        self.active[idx] = True
+        return idx
+
+    def add(self, projectile):
+        """Add a projectile from a ``Projectile`` object."""
+        return self.spawn(projectile.position, projectile.velocity, projectile.agent_id)
+
+    def despawn(self, indices):
+        """Remove the projectiles in the given slots."""
+        for idx in np.atleast_1d(indices):
+            if self.active[idx]:
+                self.active[idx] = False
+                self._free.append(int(idx))
+
+    def clear(self):
+        """Remove all projectiles."""
+        self.despawn(np.flatnonzero(self.active))
+
+    def collide(self, dt, shape, obstacles, agents, broadphase=None):
+        """Resolve collisions of all projectiles over the next timestep.
+
+        Projectiles that are off the screen or hit an obstacle or an agent are
+        despawned. A projectile hits the first thing along its path, and
+        cannot hit the agent that fired it.
+
+        Parameters
+        ----------
+        dt : float
+            The timestep.
+        shape : pair of float
+            The width and height of the screen.
+        obstacles : PolygonSet
+            The obstacles.
+        agents : list of Agent
+            The agents that can be hit.
+        broadphase : UniformGrid or AABBTree or None
+            Broadphase over the obstacles, in the same order. If given, each
+            projectile is only tested against the obstacles near its path;
+            otherwise it is tested against all of them.
+
+        Returns
+        -------
+        : list of tuple
+            ``(agent, velocity)`` for each agent hit by a projectile with the
+            given velocity.
+        """
+        idx = np.flatnonzero(self.active)
+        if idx.size == 0:
+            return []
+
+        starts = self.positions[idx]
+        velocities = self.velocities[idx]
+        ends = starts + dt * velocities
+
+        # projectiles that have left the screen
+        tol = 1e-8
+        offscreen = np.any((starts < -tol) | (starts > np.array(shape) + tol), axis=1)
+
+        # first time that each projectile hits an obstacle and an agent
+        if broadphase is None:
+            obs_times = segments_polys_intersect(starts, ends, obstacles)
+        else:
+            candidates = [
+                broadphase.query_segment_indices(Segment(start, end))
+                for start, end in zip(starts, ends)
+            ]
+            obs_times = segments_polys_intersect_candidates(
+                starts, ends, obstacles, candidates
+            )
+        obs_times = obs_times.min(axis=1, initial=np.inf)
+        centers = [agent.position for agent in agents]
+        radii = [agent.radius for agent in agents]
+        agent_times = segments_circles_intersect(starts, ends, centers, radii)
+        ids = np.array([agent.id for agent in agents])
+        agent_times[self.agent_ids[idx, None] == ids] = np.inf
+
+        hits = []
+        if agent_times.shape[1] > 0:
+            agent_idx = np.argmin(agent_times, axis=1)
+            first = agent_times[np.arange(idx.size), agent_idx]
+            hit = ~offscreen & np.isfinite(first) & (first <= obs_times)
+            for i in np.flatnonzero(hit):
+                hits.append((agents[agent_idx[i]], velocities[i]))
+        else:
+            hit = np.zeros(idx.size, dtype=bool)
+
+        self.despawn(idx[offscreen | hit | np.isfinite(obs_times)])
+        return hits
+
+    def step(self, dt):
+        """Move the projectiles forward in time."""
+        self.positions[self.active] += dt * self.velocities[self.active]
+
+    def draw(self, surface, scale=1):
+        r = scale * self.radius
+        for p in self.positions[self.active]:
+            pygame.draw.circle(surface, self.color, scale * p, r)
+
+
 class Action:
     """Action for one agent."""
 
@@ -1,3 +1,25 @@
+import importlib
+
+
+class _LazyModule:
+    """Module that is only imported when one of its attributes is first
+    accessed."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# pygame is only needed for drawing, so it is not imported until it is first
+# used. This keeps it out of the environments that never draw.
+pygame = _LazyModule("pygame")
+
+
 class Color:
     # BACKGROUND = (219, 200, 184)
     BACKGROUND = (255, 255, 255)
@@ -1,14 +1,19 @@
 import math
 import numpy as np
 
+from . import vec2
+
 ORTHMAT = np.array([[0, 1], [-1, 0]])
 
 def unit(v):
     """Normalize to a unit vector."""
-    norm = np.linalg.norm(v)
-    if np.isclose(norm, 0):
+    if len(v) == 2:
+        norm = math.hypot(v[0], v[1])
+    else:
+        norm = np.linalg.norm(v)
+    if norm <= vec2.EPS:
         return np.zeros_like(v)
-    return v / norm
+    return np.asarray(v) / norm
 
 
 def orth(v):
@@ -18,8 +23,8 @@ def orth(v):
 
 def rotmat(angle):
     """2D rotation matrix."""
-    c = np.cos(angle)
-    s = np.sin(angle)
+    c = math.cos(angle)
+    s = math.sin(angle)
     return np.array([[c, s], [-s, c]])
 
 
@@ -30,11 +35,7 @@ def wrap_to_pi(x):
 
 def angle2pi(v, start=0):
     """Compute angle of vector v w.r.t. the start in the interval [0, 2pi]."""
-    # negative for y is because we are in a left-handed frame
-    a = np.arctan2(-v[1], v[0]) - start
-    if a < 0:
-        a = 2 * np.pi + a
-    return a
+    return vec2.angle2pi(v, start=start)
 
 
 def quad_formula(a, b, c):
@@ -42,6 +43,4 @@ def quad_formula(a, b, c):
 
     The two solutions are returned.
     """
-    d = np.sqrt(b ** 2 - 4 * a * c)
-    return (-b - d) / (2 * a), (-b + d) / (2 * a)
-
+    return vec2.quad_formula(a, b, c)
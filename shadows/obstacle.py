@@ -1,9 +1,18 @@
+from collections import OrderedDict
+
 import numpy as np
-import pygame
 
 from .math import orth, unit, ORTHMAT
-from .collision import AARect, PaddedPoly, line_rect_edge_intersection
-from .gui import Color
+from .collision import (
+    AARect,
+    PolygonSet,
+    VisibilityPolygon,
+    line_rect_edge_intersection,
+    occlusion_polygons,
+    point_polys_query,
+)
+from .gui import Color, pygame
+from .visibility import VisibilityTable
 
 import time
 
@@ -12,10 +21,13 @@ class Obstacle(AARect):
     def __init__(self, x, y, w, h, agent_radius=None):
         super().__init__(x, y, w, h)
         self.color = Color.OBSTACLE
-        self.pygame_rect = pygame.Rect(x, y, w, h)
 
         if agent_radius is not None:
-            self.padded = PaddedPoly(self, agent_radius)
+            self.padded = self.pad(agent_radius)
+
+    @property
+    def pygame_rect(self):
+        return pygame.Rect(self.x, self.y, self.w, self.h)
 
     # def __init__(self, vertices, rects):
     #     self.color = Color.OBSTACLE
@@ -119,3 +131,190 @@ class Obstacle(AARect):
         pygame.draw.polygon(surface, Color.SHADOW, [scale * p for p in ps])
         # pygame.gfxdraw.aapolygon(surface, ps, Color.SHADOW)
         # pygame.gfxdraw.filled_polygon(surface, ps, Color.SHADOW)
+
+
+class ObstacleSet(PolygonSet):
+    """Static obstacles packed into contiguous arrays.
+
+    The vertices and normals of each obstacle become views into the packed
+    arrays, so the individual obstacles can still be iterated over and drawn.
+
+    Parameters
+    ----------
+    obstacles : iterable of Obstacle
+        The obstacles in the level.
+    """
+
+    # maximum number of visibility polygons to cache
+    VISIBILITY_CACHE_SIZE = 8
+
+    def __init__(self, obstacles):
+        super().__init__(obstacles)
+
+        # axis-aligned bounding boxes, with rows [x_min, y_min, x_max, y_max]
+        self.aabbs = np.hstack((self.vertices.min(axis=1), self.vertices.max(axis=1)))
+
+        for i, obstacle in enumerate(self.polys):
+            k = self.n_vertices[i]
+            obstacle.vertices = self.vertices[i, :k]
+            obstacle.in_normals = self.in_normals[i, :k]
+
+        # pre-rendered obstacle layers, keyed by surface size and scale
+        self._layers = {}
+
+        # visibility polygons of the most recent viewpoints, keyed by
+        # viewpoint and screen
+        self._visibility = OrderedDict()
+
+        # precomputed visibility between grid cells, see use_visibility_table
+        self.visibility_table = None
+
+    def point_query(self, points):
+        """Collision query between each point and each obstacle.
+
+        See ``point_polys_query``.
+        """
+        return point_polys_query(points, self)
+
+    def contact_normals(self, point, radius):
+        """Outward normals of the obstacles within ``radius`` of a point.
+
+        If a distance field is in use, it is first checked to see if the
+        point is near any obstacle at all. If the field has no
+        ``exact_within`` distance, its interpolated normal is returned rather
+        than computing the exact normal of each nearby obstacle.
+
+        Parameters
+        ----------
+        point : pair of float
+            The 2D point.
+        radius : float
+            The contact distance.
+
+        Returns
+        -------
+        : np.ndarray, shape (K, 2)
+            The normals of the obstacles in contact with the point.
+        """
+        field = self.distance_field
+        if field is not None:
+            if not field.near(point, radius):
+                return np.zeros((0, 2))
+            if field.exact_within is None:
+                dists, normals = field.query(point)
+                return normals[dists < radius]
+        dists, normals, _ = self.point_query(point)
+        return normals[0, dists[0] < radius]
+
+    def layer(self, size, scale=1):
+        """Surface with all of the obstacles drawn on it.
+
+        The obstacles are static, so the layer is only drawn once for each
+        surface size and scale. The background of the layer is transparent.
+
+        Parameters
+        ----------
+        size : pair of int
+            The size of the surface.
+        scale : float
+            Scale factor for drawing the obstacles.
+
+        Returns
+        -------
+        : pygame.Surface
+            The layer, which should not be modified.
+        """
+        key = (tuple(size), scale)
+        layer = self._layers.get(key, None)
+        if layer is None:
+            layer = pygame.Surface(key[0])
+            layer.fill(Color.BACKGROUND)
+            layer.set_colorkey(Color.BACKGROUND, pygame.RLEACCEL)
+            for obstacle in self.polys:
+                obstacle.draw(layer, scale=scale)
+            self._layers[key] = layer
+        return layer
+
+    def clear_layers(self):
+        """Clear the cached obstacle layers and visibility polygons.
+
+        This must be called if the obstacles are modified in place.
+        """
+        self._layers = {}
+        self._visibility.clear()
+
+    def draw(self, surface, scale=1):
+        """Draw all of the obstacles."""
+        surface.blit(self.layer(surface.get_size(), scale=scale), (0, 0))
+
+    def occlusions(self, viewpoint, screen_rect):
+        """Polygons of the regions occluded by the obstacles from the viewpoint.
+
+        See ``occlusion_polygons``.
+
+        Returns
+        -------
+        : np.ndarray, shape (M, 6, 2)
+            The occlusion polygon of each obstacle.
+        """
+        return occlusion_polygons(viewpoint, self, screen_rect)[0]
+
+    def visibility(self, viewpoint, screen_rect):
+        """Region visible from the viewpoint among the obstacles.
+
+        The ``VisibilityPolygon`` is cached for the most recently used
+        viewpoints, so repeated queries from the same viewpoints (e.g. of each
+        agent in a frame) do not recompute it.
+        """
+        rect = (screen_rect.x, screen_rect.y, screen_rect.w, screen_rect.h)
+        key = (tuple(np.asarray(viewpoint, dtype=float).tolist()), rect)
+        polygon = self._visibility.get(key)
+        if polygon is None:
+            polygon = VisibilityPolygon(viewpoint, self, screen_rect)
+            self._visibility[key] = polygon
+            if len(self._visibility) > self.VISIBILITY_CACHE_SIZE:
+                self._visibility.popitem(last=False)
+        else:
+            self._visibility.move_to_end(key)
+        return polygon
+
+    def use_visibility_table(self, shape, cell_size=1, cache_dir=None):
+        """Load a ``VisibilityTable`` of the obstacles for coarse line of sight
+        queries, building and caching it if needed.
+
+        The obstacles must not move after this is called. See
+        ``VisibilityTable.cached`` for the parameters.
+        """
+        self.visibility_table = VisibilityTable.cached(
+            self, shape, cell_size=cell_size, cache_dir=cache_dir
+        )
+        return self.visibility_table
+
+    def can_see(self, p, q, screen_rect):
+        """Check if there is a line of sight from point ``p`` to point ``q``.
+
+        ``q`` may also be an array of points, in which case an array of
+        booleans is returned.
+        """
+        visible = self.visibility(p, screen_rect).can_see(q)
+        if np.ndim(q) == 1:
+            return bool(visible[0])
+        return visible
+
+    def can_see_circles(self, viewpoint, centers, radii, screen_rect):
+        """Check if any part of each circle is visible from the viewpoint.
+
+        See ``VisibilityPolygon.can_see_circles``.
+        """
+        return self.visibility(viewpoint, screen_rect).can_see_circles(centers, radii)
+
+    def draw_occlusions(self, surface, viewpoint, screen_rect, scale=1):
+        """Draw the regions occluded by the obstacles from the viewpoint."""
+        for ps in self.occlusions(viewpoint, screen_rect):
+            # pygame's fill is affected by repeated vertices, so remove them
+            ps = ps[np.any(ps != np.roll(ps, 1, axis=0), axis=1)]
+
+            # degenerate when the viewpoint is inside the obstacle
+            if len(ps) < 3:
+                continue
+            pygame.draw.polygon(surface, Color.SHADOW, scale * ps)
@@ -0,0 +1,166 @@
+"""Headless rasterization of grayscale observation images with NumPy."""
+import functools
+
+import numpy as np
+
+from .collision import points_polys_occluded
+from .gui import Color
+
+
+# grayscale value of each color in observation images
+GRAY = {Color.ENEMY: 85, Color.PLAYER: 170, Color.OBSTACLE: 255}
+
+
+@functools.lru_cache(maxsize=None)
+def disc_stamp(radius):
+    """Boolean mask of the pixels in a filled disc.
+
+    This uses the same midpoint algorithm as ``pygame.draw.circle``, so the
+    discs are identical to those drawn by pygame.
+
+    Parameters
+    ----------
+    radius : int
+        The radius of the disc, in pixels.
+
+    Returns
+    -------
+    : np.ndarray, shape (2 * radius, 2 * radius)
+        The mask, indexed [x, y]. Index ``radius`` along each axis corresponds
+        to the pixel containing the center of the disc.
+    """
+    stamp = np.zeros((2 * radius, 2 * radius), dtype=bool)
+
+    def line(x1, y, x2):
+        stamp[radius + x1 : radius + x2 + 1, radius + y] = True
+
+    f = 1 - radius
+    ddf_x = 0
+    ddf_y = -2 * radius
+    x = 0
+    y = radius
+    while x < y:
+        if f >= 0:
+            y -= 1
+            ddf_y += 2
+            f += ddf_y
+        x += 1
+        ddf_x += 2
+        f += ddf_x + 1
+
+        if f >= 0:
+            line(-x, y - 1, x - 1)
+            line(-x, -y, x - 1)
+        line(-y, x - 1, y - 1)
+        line(-y, -x, y - 1)
+
+    stamp.setflags(write=False)
+    return stamp
+
+
+class Rasterizer:
+    """Draw grayscale observation images without pygame.
+
+    The obstacles are static, so their mask is computed once. Each image is
+    drawn into the same preallocated buffer.
+
+    Parameters
+    ----------
+    shape : pair of int
+        The width and height of the image.
+    obstacles : PolygonSet
+        The obstacles.
+    """
+
+    def __init__(self, shape, obstacles):
+        self.shape = tuple(int(s) for s in shape)
+        self.obstacles = obstacles
+
+        # pixel centers, indexed [x, y] like pygame.surfarray
+        xs = np.arange(self.shape[0]) + 0.5
+        ys = np.arange(self.shape[1]) + 0.5
+        self._centers = np.stack(np.meshgrid(xs, ys, indexing="ij"), axis=-1)
+
+        self.obstacle_mask = obstacles.contains(self._centers.reshape(-1, 2))
+        self.obstacle_mask = self.obstacle_mask.reshape(self.shape)
+
+        # only free pixels need to be tested for occlusion
+        self._n_pixels = self.shape[0] * self.shape[1]
+        self._free = np.flatnonzero(~self.obstacle_mask)
+        self._free_centers = self._centers.reshape(-1, 2)[self._free]
+
+        self.image = np.zeros(self.shape + (1,), dtype=np.uint8)
+
+    def shadow_mask(self, viewpoint):
+        """Mask of the pixels occluded by the obstacles from the viewpoint.
+
+        The shadows match those drawn by ``ObstacleSet.draw_occlusions``, up
+        to a one-pixel band along their edges where pygame's polygon fill
+        rule differs.
+        """
+        return self.shadow_masks(np.reshape(viewpoint, (1, 2)))[0]
+
+    def shadow_masks(self, viewpoints):
+        """Batched version of ``shadow_mask`` for many viewpoints.
+
+        Parameters
+        ----------
+        viewpoints : array_like, shape (N, 2)
+            The viewpoints.
+
+        Returns
+        -------
+        : np.ndarray, shape (N, W, H)
+            The mask of occluded pixels for each viewpoint.
+        """
+        viewpoints = np.asarray(viewpoints, dtype=float).reshape(-1, 2)
+        masks = np.zeros((len(viewpoints), self._n_pixels), dtype=bool)
+        if len(self.obstacles) > 0:
+            masks[:, self._free] = points_polys_occluded(
+                viewpoints, self._free_centers, self.obstacles
+            )
+        return masks.reshape((-1,) + self.shape)
+
+    def draw_disc(self, center, radius, value):
+        """Draw a filled disc into the image, like ``pygame.draw.circle``."""
+        radius = int(radius)
+        if radius < 1:
+            return
+        stamp = disc_stamp(radius)
+        x0 = int(center[0]) - radius
+        y0 = int(center[1]) - radius
+
+        # clip the stamp to the image
+        x1, y1 = max(x0, 0), max(y0, 0)
+        x2 = min(x0 + 2 * radius, self.shape[0])
+        y2 = min(y0 + 2 * radius, self.shape[1])
+        if x1 >= x2 or y1 >= y2:
+            return
+        window = self.image[x1:x2, y1:y2, 0]
+        window[stamp[x1 - x0 : x2 - x0, y1 - y0 : y2 - y0]] = value
+
+    def draw(self, discs, viewpoint=None):
+        """Draw an observation image.
+
+        Parameters
+        ----------
+        discs : iterable of tuple
+            ``(center, radius, value)`` for each disc to draw, in order.
+        viewpoint : pair of float or None
+            If given, the regions occluded by the obstacles from this point
+            are drawn in the obstacle color.
+
+        Returns
+        -------
+        : np.ndarray, shape (W, H, 1)
+            The image, which is overwritten by the next call.
+        """
+        self.image.fill(0)
+        for center, radius, value in discs:
+            self.draw_disc(center, radius, value)
+
+        gray = self.image[..., 0]
+        gray[self.obstacle_mask] = GRAY[Color.OBSTACLE]
+        if viewpoint is not None:
+            gray[self.shadow_mask(viewpoint)] = GRAY[Color.OBSTACLE]
+        return self.image
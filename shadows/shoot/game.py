@@ -4,11 +4,13 @@ import numpy as np
 import time
 
 from ..collision import *
+from .. import vec2
 from ..math import *
 from ..gui import Text, Color
-from ..entity import Agent, Action
-from ..obstacle import Obstacle
-from ..treasure import Treasure
+from ..entity import Agent, Action, ProjectilePool
+from ..obstacle import Obstacle, ObstacleSet
+from ..treasure import Treasure, draw_treasures
+from ..config import GameConfig
 
 
 FRAMERATE = 60
@@ -16,16 +18,10 @@ TIMESTEP = 1.0 / FRAMERATE
 
 TAG_COOLDOWN = 60  # ticks
 
-# for more efficiency we can turn off continuous collision detection
-USE_CCD = True
-USE_AI_POLICY = True
+DEFAULT_CONFIG = GameConfig()
 
-N_TREASURES = 2
-TREASURE_RADIUS = 1
-OCCLUDE_TREASURES = True
-DRAW_OCCLUSIONS = True
-
-RENDER_SCALE = 8
+# cell size of the broadphase grid for obstacle collisions
+GRID_CELL_SIZE = 10
 
 
 class ShootGame:
@@ -34,11 +30,15 @@ class ShootGame:
         shape=(50, 50),
         display=True,
         rng=None,
+        config=None,
     ):
+        if config is None:
+            config = DEFAULT_CONFIG
+        self.config = config
         self.rng = np.random.default_rng(rng)
 
         self.shape = shape
-        self.render_shape = tuple(int(RENDER_SCALE * s) for s in self.shape)
+        self.render_shape = tuple(int(self.config.render_scale * s) for s in self.shape)
 
         self.screen = pygame.Surface(self.shape)
         self.screen_rect = AARect(0, 0, self.shape[0], self.shape[1])
@@ -52,11 +52,11 @@ class ShootGame:
             # )
             # self.render_screen = pygame.Surface(self.render_shape)
 
-        self.font = pygame.font.SysFont(None, 3 * RENDER_SCALE)
+        self.font = pygame.font.SysFont(None, 3 * self.config.render_scale)
         self.clock = pygame.time.Clock()
         self.keys_down = set()
 
-        self.projectiles = {}
+        self.projectiles = ProjectilePool()
 
         # self.obstacles = []
         # self.obstacles = [
@@ -67,23 +67,38 @@ class ShootGame:
         #     Obstacle(37, 8, 5, 5),
         # ]
         # self.obstacles = [Obstacle(20, 20, 10, 10)]
-        self.obstacles = [
-            Obstacle(20, 27, 10, 10, agent_radius=3),
-            Obstacle(8, 8, 5, 5, agent_radius=3),
-            Obstacle(0, 37, 13, 13, agent_radius=3),
-            Obstacle(37, 37, 5, 5, agent_radius=3),
-            Obstacle(20, 8, 5, 7, agent_radius=3),
-            Obstacle(20, 15, 22, 5, agent_radius=3),
-        ]
+        self.obstacles = ObstacleSet(
+            [
+                Obstacle(20, 27, 10, 10, agent_radius=3),
+                Obstacle(8, 8, 5, 5, agent_radius=3),
+                Obstacle(0, 37, 13, 13, agent_radius=3),
+                Obstacle(37, 37, 5, 5, agent_radius=3),
+                Obstacle(20, 8, 5, 7, agent_radius=3),
+                Obstacle(20, 15, 22, 5, agent_radius=3),
+            ]
+        )
+        if self.config.use_bvh:
+            self.broadphase = AABBTree(self.obstacles)
+        else:
+            self.broadphase = UniformGrid(self.obstacles, cell_size=GRID_CELL_SIZE)
 
         # player and enemy agents
         self.player = Agent.player(position=[10, 25], radius=3, it=False)
         self.enemy = Agent.enemy(position=[40, 25], radius=3, it=False)
         self.agents = [self.player, self.enemy]
 
+        if self.config.use_distance_field:
+            radius = max(agent.radius for agent in self.agents)
+            self.obstacles.use_distance_field(
+                self.shape,
+                resolution=self.config.distance_field_resolution,
+                exact_within=radius if self.config.exact_contact else None,
+            )
+
         self.score = 0
         self.treasures = [
-            Treasure(center=[0, 0], radius=TREASURE_RADIUS) for _ in range(N_TREASURES)
+            Treasure(center=[0, 0], radius=self.config.treasure_radius)
+            for _ in range(self.config.n_treasures)
         ]
         for treasure in self.treasures:
             treasure.update_position(
@@ -115,8 +130,7 @@ class ShootGame:
     ):
         screen.fill(Color.BACKGROUND)
 
-        for projectile in self.projectiles.values():
-            projectile.draw(surface=screen, scale=scale)
+        self.projectiles.draw(surface=screen, scale=scale)
 
         for agent in self.agents:
             agent.draw(
@@ -134,24 +148,30 @@ class ShootGame:
         #     draw_outline=draw_outline,
         #     scale=scale,
         # )
-        if draw_treasure and OCCLUDE_TREASURES:
-            for treasure in self.treasures:
-                treasure.draw(surface=screen, scale=scale)
+        if draw_treasure and self.config.occlude_treasures:
+            # treasures entirely hidden from the viewpoint are skipped, and the
+            # occlusions are drawn over those that are partly hidden
+            draw_treasures(
+                screen,
+                self.treasures,
+                scale=scale,
+                viewpoint=viewpoint if draw_occlusion else None,
+                obstacles=self.obstacles,
+                screen_rect=self.screen_rect,
+            )
 
         # NOTE screen_rect is always the unscaled version
-        for obstacle in self.obstacles:
-            obstacle.draw(surface=screen, scale=scale)
-            if draw_occlusion:
-                obstacle.draw_occlusion(
-                    surface=screen,
-                    viewpoint=viewpoint,
-                    screen_rect=self.screen_rect,
-                    scale=scale,
-                )
-
-        if draw_treasure and not OCCLUDE_TREASURES:
-            for treasure in self.treasures:
-                treasure.draw(surface=screen, scale=scale)
+        self.obstacles.draw(surface=screen, scale=scale)
+        if draw_occlusion:
+            self.obstacles.draw_occlusions(
+                surface=screen,
+                viewpoint=viewpoint,
+                screen_rect=self.screen_rect,
+                scale=scale,
+            )
+
+        if draw_treasure and not self.config.occlude_treasures:
+            draw_treasures(screen, self.treasures, scale=scale)
 
         if draw_treasure:
             # TODO render on a background?
@@ -165,7 +185,7 @@ class ShootGame:
             viewpoint=self.enemy.position,
             scale=1,
             draw_outline=False,
-            draw_occlusion=DRAW_OCCLUSIONS,
+            draw_occlusion=self.config.draw_occlusions,
             draw_treasure=False,
         )
 
@@ -173,9 +193,9 @@ class ShootGame:
         self._draw(
             screen=self.render_screen,
             viewpoint=self.player.position,
-            scale=RENDER_SCALE,
+            scale=self.config.render_scale,
             draw_outline=True,
-            draw_occlusion=DRAW_OCCLUSIONS,
+            draw_occlusion=self.config.draw_occlusions,
         )
 
     def render_display(self):
@@ -191,7 +211,7 @@ class ShootGame:
                 action = actions[agent.id]
                 projectile = agent.command(action)
                 if projectile is not None:
-                    self.projectiles[projectile.id] = projectile
+                    self.projectiles.add(projectile)
 
         # agents cannot walk off the screen and into obstacles
         for agent in self.agents:
@@ -208,10 +228,11 @@ class ShootGame:
                 v[1] = max(0, v[1])
 
             # don't walk into an obstacle
-            if np.linalg.norm(v) > 0:
-                if USE_CCD:
+            if vec2.norm(v) > 0:
+                if self.config.use_ccd:
                     path = Segment(agent.position, agent.position + TIMESTEP * v)
-                    for obstacle in self.obstacles:
+                    nearby = self.broadphase.query_segment(path, radius=agent.radius)
+                    for obstacle in nearby:
                         Q = segment_padded_poly_query(path, obstacle.padded)
                         # Q = swept_circle_poly_query(path, agent.radius, obstacle)
 
@@ -221,10 +242,12 @@ class ShootGame:
                             v = Q.time * v + (1 - Q.time) * vtan
 
                 else:
-                    for obstacle in self.obstacles:
-                        Q = point_poly_query(agent.position, obstacle)
-                        if Q.distance < agent.radius and Q.normal @ v < 0:
-                            tan = orth(Q.normal)
+                    normals = self.obstacles.contact_normals(
+                        agent.position, agent.radius
+                    )
+                    for normal in normals:
+                        if normal @ v < 0:
+                            tan = orth(normal)
                             v = (tan @ v) * tan
 
             agent.velocity = v
@@ -235,7 +258,7 @@ class ShootGame:
                 continue
 
             for treasure in self.treasures:
-                d = np.linalg.norm(agent.position - treasure.center)
+                d = vec2.norm(vec2.sub(agent.position, treasure.center))
                 if d <= agent.radius + treasure.radius:
                     if agent is self.player:
                         self.score += 1
@@ -246,56 +269,16 @@ class ShootGame:
                         shape=self.shape, obstacles=self.obstacles, rng=self.rng
                     )
 
-        # process projectiles
-        projectiles_to_remove = set()
-        # agents_to_remove = set()
-        for idx, projectile in self.projectiles.items():
-            # projectile has left the screen
-            if not point_in_rect(projectile.position, self.screen_rect):
-                projectiles_to_remove.add(idx)
-                continue
-
-            # path of projectile's motion over the timestep
-            segment = projectile.path(TIMESTEP)
-
-            # check for collision with obstacle
-            obs_dist = np.inf
-            for obstacle in self.obstacles:
-                Q = segment_poly_query(segment, obstacle)
-                if Q.intersect:
-                    obs_dist = min(obs_dist, Q.distance)
-                    projectiles_to_remove.add(idx)
-
-            # check for collision with an agent
-            for agent in self.agents:
-
-                # agent cannot be hit by its own bullets
-                if agent.id == projectile.agent_id:
-                    continue
-
-                # check for collision with the bullet's path
-                # TODO segment_segment_dist might be better here
-                circle = agent.circle()
-                Q = segment_circle_query(segment, circle)
-                if Q.intersect:
-                    # if the projectile hit an obstacle first, then the agent
-                    # is fine
-                    if Q.distance > obs_dist:
-                        continue
-
-                    projectiles_to_remove.add(idx)
-
-                    agent.velocity += 100 * unit(projectile.velocity)
-                    agent.health -= 1
-                    # if agent.health <= 0:
-                    #     agents_to_remove.add(agent_id)
-
-        # remove projectiles that have hit something
-        for idx in projectiles_to_remove:
-            self.projectiles.pop(idx)
+        # process projectiles: a projectile stops at the first obstacle or
+        # agent that it hits
+        hits = self.projectiles.collide(
+            TIMESTEP, self.shape, self.obstacles, self.agents, self.broadphase
+        )
+        for agent, velocity in hits:
+            agent.velocity += 100 * unit(velocity)
+            agent.health -= 1
 
-        for projectile in self.projectiles.values():
-            projectile.step(TIMESTEP)
+        self.projectiles.step(TIMESTEP)
 
         for agent in self.agents:
             agent.step(TIMESTEP)
@@ -315,7 +298,7 @@ class ShootGame:
                 elif event.type == pygame.KEYUP:
                     self.keys_down.discard(event.key)
                 elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                    target = np.array(pygame.mouse.get_pos()) / RENDER_SCALE
+                    target = np.array(pygame.mouse.get_pos()) / self.config.render_scale
 
             # respond to events
             lindir = [0, 0]
@@ -330,7 +313,7 @@ class ShootGame:
 
             # TODO hardcoded indices here
             actions = {}
-            # if USE_AI_POLICY:
+            # if self.config.use_ai_policy:
             #     self.draw_enemy_screen()
             #     actions[1] = self.enemy_policy.compute()
             actions[0] = Action(
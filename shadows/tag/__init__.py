@@ -1,2 +1,26 @@
-from .game import TagGame, TagAIPolicy
-from .env import TagBaseEnv
+import importlib
+
+from .policy import TagAIPolicy
+from .env import TagBaseEnv, TagEnvConfig
+from .onnx_policy import OnnxPolicy, load_policy
+from .policy import flat_index_map, flatten_observation, unflatten_observation
+
+
+# The game needs pygame and the vectorized envs, callbacks and batched
+# inference need Stable Baselines3 (and so PyTorch), so they are only imported
+# when first used. Policies exported to ONNX can then be run without either.
+_LAZY = {
+    "TagGame": ".game",
+    "TagVecEnv": ".vec_env",
+    "EpisodeStatsCallback": ".callbacks",
+    "OpponentInference": ".inference",
+    "OpponentInferenceVecEnv": ".inference",
+    "make_opponent_vec_env": ".inference",
+    "ShmVecEnv": ".shm_vec_env",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
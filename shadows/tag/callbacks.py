@@ -0,0 +1,47 @@
+"""Training callbacks for the tag environments."""
+import collections
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+
+class EpisodeStatsCallback(BaseCallback):
+    """Log the episode statistics reported by the tag environments.
+
+    The ``episode_stats`` entries of the ``info`` dicts are collected as
+    episodes end, and their means over the last ``window_size`` episodes are
+    recorded with the model's logger under ``episode/`` at the end of each
+    rollout. The number of steps to tag is averaged over the tagged episodes
+    only.
+
+    Parameters
+    ----------
+    window_size : int
+        Number of recent episodes to average over.
+    verbose : int
+        Verbosity level.
+    """
+
+    def __init__(self, window_size=100, verbose=0):
+        super().__init__(verbose=verbose)
+        self.stats = collections.deque(maxlen=window_size)
+
+    def _on_step(self):
+        for info in self.locals.get("infos", []):
+            stats = info.get("episode_stats")
+            if stats is not None:
+                self.stats.append(stats)
+        return True
+
+    def _on_rollout_end(self):
+        if len(self.stats) == 0:
+            return
+
+        tagged = np.array([s["tagged"] for s in self.stats])
+        for key in ["treasures", "time_in_contact", "mean_speed"]:
+            value = np.mean([s[key] for s in self.stats])
+            self.logger.record(f"episode/{key}", value)
+        self.logger.record("episode/tag_rate", np.mean(tagged))
+        if np.any(tagged):
+            steps = np.array([s["steps"] for s in self.stats])
+            self.logger.record("episode/steps_to_tag", np.mean(steps[tagged]))
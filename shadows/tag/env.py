@@ -1,51 +1,158 @@
 """Learning environments."""
 
-import pygame
+import dataclasses
+
 import numpy as np
 import gymnasium as gym
 
 from ..entity import Agent, Action, PLAYER_FORWARD_VEL
-from ..gui import Color
-from ..obstacle import Obstacle
-from ..collision import point_in_rect, point_poly_query, AARect
+from ..gui import Color, pygame
+from ..obstacle import Obstacle, ObstacleSet
+from ..collision import AARect
+from .. import vec2
 from ..math import *
 from ..treasure import Treasure
+from ..raster import Rasterizer, GRAY
 from .policy import TagAIPolicy, ImageObserver, FullStateObserver
 
 
 FRAMERATE = 60
 TIMESTEP = 1.0 / FRAMERATE
 
-SHAPE = (50, 50)
-
-# use continuous linear and angular velocity as the actions
-USE_CONTINUOUS_ACTIONS = True
-
-# learn from observations of the screen pixels
-USE_IMAGE_OBSERVATIONS = False
-
-# draw the direction line onto the agents
-DRAW_DIRECTION = False
-
-# draw occlusions behind obstacles
-DRAW_OCCLUSIONS = False
-
-# number of treasures to collect
-N_TREASURES = 2
-TREASURE_RADIUS = 1
-
-# print extra information
-VERBOSE = True
-
-# render the grayscale observation directly, rather than a
-# nice-looking human version. RENDER_SCALE should be set to 1 if this
-# is True.
-RENDER_OBSERVATION = False
-
-# scale up rendering by this value
-RENDER_SCALE = 1
 
-FRAME_SKIP = 1
+@dataclasses.dataclass(frozen=True)
+class TagEnvConfig:
+    """Options of the tag learning environments.
+
+    A configuration can be passed to ``gym.make`` as the ``config`` keyword
+    argument, either as a ``TagEnvConfig`` or as a dict of its options, so
+    that different variants can run in the same process.
+
+    Parameters
+    ----------
+    shape : pair of int
+        The width and height of the arena.
+    continuous_actions : bool
+        Use continuous linear and angular velocity as the actions.
+    image_observations : bool
+        Learn from observations of the screen pixels.
+    rasterize : bool
+        Draw image observations directly with NumPy rather than with pygame.
+    draw_direction : bool
+        Draw the direction line onto the agents.
+    draw_occlusions : bool
+        Draw occlusions behind obstacles.
+    n_treasures : int
+        Number of treasures to collect.
+    treasure_radius : float
+        Radius of each treasure.
+    render_observation : bool
+        Render the grayscale observation directly, rather than a
+        nice-looking human version. ``render_scale`` should be one if this is
+        True.
+    render_scale : int
+        Scale up rendering by this value.
+    frame_skip : int
+        Number of simulation steps per environment step. The same action is
+        repeated for each of them. A learned enemy model is also evaluated
+        once per environment step and its action held for the frame skip,
+        whether it is called directly or through an ``OpponentClient``. The
+        default enemy policies are evaluated at every simulation step.
+    use_distance_field : bool
+        Precompute a signed distance field of the obstacles for distance
+        queries.
+    distance_field_resolution : float
+        Spacing of the distance field samples.
+    exact_contact : bool
+        Fall back to exact obstacle queries near contact, rather than using
+        the interpolated distance field.
+    """
+
+    shape: tuple = (50, 50)
+    continuous_actions: bool = True
+    image_observations: bool = False
+    rasterize: bool = True
+    draw_direction: bool = False
+    draw_occlusions: bool = False
+    n_treasures: int = 2
+    treasure_radius: float = 1
+    render_observation: bool = False
+    render_scale: int = 1
+    frame_skip: int = 1
+    use_distance_field: bool = True
+    distance_field_resolution: float = 0.5
+    exact_contact: bool = True
+
+    @classmethod
+    def make(cls, config=None):
+        """Make a configuration from ``None`` (the defaults), a dict of
+        options or an existing configuration."""
+        if config is None:
+            return cls()
+        if isinstance(config, dict):
+            return cls(**config)
+        return config
+
+    def replace(self, **changes):
+        """Copy of the configuration with some of the options changed."""
+        return dataclasses.replace(self, **changes)
+
+
+# configuration for high-throughput training, with several simulation
+# steps per action
+FAST_CONFIG = TagEnvConfig(frame_skip=4)
+
+
+def episode_stats(steps, tagged, treasures, contact_steps, distance):
+    """Statistics of an episode, reported in ``info["episode_stats"]`` at its
+    end.
+
+    Parameters
+    ----------
+    steps : int
+        Number of simulation steps in the episode.
+    tagged : bool
+        True if the episode ended with the player being tagged.
+    treasures : int
+        Number of treasures collected.
+    contact_steps : int
+        Number of simulation steps in which the player moved while in contact
+        with an obstacle. It is reported as ``time_in_contact``.
+    distance : float
+        Distance travelled by the player.
+
+    Returns
+    -------
+    : dict
+        The statistics. ``steps`` is the number of steps to tag when
+        ``tagged`` is True, and times and speeds are in simulated seconds.
+    """
+    duration = steps * TIMESTEP
+    return {
+        "steps": int(steps),
+        "tagged": bool(tagged),
+        "treasures": int(treasures),
+        "time_in_contact": contact_steps * TIMESTEP,
+        "mean_speed": distance / duration if duration > 0 else 0.0,
+    }
+
+
+def make_obstacles():
+    """Make the obstacles in the arena."""
+    # return ObstacleSet([])
+    # return ObstacleSet([Obstacle(20, 20, 10, 10)])
+    return ObstacleSet(
+        [
+            Obstacle(20, 27, 10, 10),
+            Obstacle(8, 8, 5, 5),
+            # Obstacle(8, 37, 5, 5),
+            Obstacle(0, 37, 13, 13),
+            Obstacle(37, 37, 5, 5),
+            # Obstacle(37, 8, 5, 5),
+            Obstacle(20, 8, 5, 7),
+            Obstacle(20, 15, 22, 5),
+        ]
+    )
 
 
 class TagBaseEnv(gym.Env):
@@ -64,11 +171,17 @@ class TagBaseEnv(gym.Env):
         not_it_model=None,
         n_stack=1,
         max_steps=1000,
+        flat_observations=False,
+        config=None,
+        opponent=None,
     ):
-        pygame.init()
+        config = TagEnvConfig.make(config)
+        if flat_observations and config.image_observations:
+            raise ValueError("Flat observations require full-state observations.")
 
-        self.shape = SHAPE
-        self.render_shape = tuple(int(RENDER_SCALE * s) for s in self.shape)
+        self.config = config
+        self.shape = tuple(config.shape)
+        self.render_shape = tuple(int(config.render_scale * s) for s in self.shape)
         self.render_mode = render_mode
         self.grayscale = grayscale
         self.sparse_reward = sparse_reward
@@ -77,17 +190,22 @@ class TagBaseEnv(gym.Env):
         self.max_steps = max_steps
         self._diag = np.linalg.norm(self.shape)
 
-        self.screen = pygame.Surface(self.shape)
+        # the screen is only drawn when observations are read from it, so
+        # pygame is not needed otherwise
+        self._draw_observations = config.image_observations and not config.rasterize
+        self.screen = None
+        if self._draw_observations:
+            self.screen = pygame.Surface(self.shape)
         self.screen_rect = AARect(0, 0, self.shape[0], self.shape[1])
 
+        # the screen for rendering is made on the first call to render,
+        # except for the window, which is opened right away
+        self.render_screen = None
+        self.render_screen_rect = AARect(
+            0, 0, self.render_shape[0], self.render_shape[1]
+        )
         if render_mode == "human":
-            # self.render_screen = pygame.display.set_mode(self.render_shape)
-            self.render_screen = pygame.display.set_mode(
-                self.render_shape, flags=pygame.SCALED
-            )
-            self.render_screen_rect = AARect(
-                0, 0, self.render_shape[0], self.render_shape[1]
-            )
+            self._make_render_screen()
 
         self.player = Agent.player(position=[10, 10], radius=3, it=player_it)
         self.enemy = Agent.enemy(position=[47, 47], radius=3, it=not player_it)
@@ -96,24 +214,22 @@ class TagBaseEnv(gym.Env):
         self.player.color = Color.ENEMY
         self.enemy.color = Color.PLAYER
 
-        # self.obstacles = []
-        # self.obstacles = [Obstacle(20, 20, 10, 10)]
-        self.obstacles = [
-            Obstacle(20, 27, 10, 10),
-            Obstacle(8, 8, 5, 5),
-            # Obstacle(8, 37, 5, 5),
-            Obstacle(0, 37, 13, 13),
-            Obstacle(37, 37, 5, 5),
-            # Obstacle(37, 8, 5, 5),
-            Obstacle(20, 8, 5, 7),
-            Obstacle(20, 15, 22, 5),
-        ]
+        self.obstacles = make_obstacles()
+
+        if config.use_distance_field:
+            radius = max(self.player.radius, self.enemy.radius)
+            self.obstacles.use_distance_field(
+                self.shape,
+                resolution=config.distance_field_resolution,
+                exact_within=radius if config.exact_contact else None,
+            )
 
         self.treasures = [
-            Treasure(center=[0, 0], radius=TREASURE_RADIUS) for _ in range(N_TREASURES)
+            Treasure(center=[0, 0], radius=config.treasure_radius)
+            for _ in range(config.n_treasures)
         ]
 
-        if USE_CONTINUOUS_ACTIONS:
+        if config.continuous_actions:
             self.action_space = gym.spaces.Box(
                 low=-np.ones(1, dtype=np.float32),
                 high=np.ones(1, dtype=np.float32),
@@ -123,24 +239,47 @@ class TagBaseEnv(gym.Env):
         else:
             self.action_space = gym.spaces.Discrete(3)
 
-        if USE_IMAGE_OBSERVATIONS:
-            self.observer = ImageObserver(self.screen, self.player, n_stack=n_stack)
+        self.rasterizer = None
+        if config.image_observations:
+            rasterize = None
+            if config.rasterize:
+                self.rasterizer = Rasterizer(self.shape, self.obstacles)
+                rasterize = self._rasterize
+            self.observer = ImageObserver(
+                self.screen, self.player, n_stack=n_stack, rasterize=rasterize
+            )
             self.observation_space = self.observer.space(
                 self.shape, grayscale=grayscale
             )
         else:
             self.observer = FullStateObserver(
-                self.player, self.enemy, treasures=self.treasures, n_stack=n_stack
+                self.player,
+                self.enemy,
+                treasures=self.treasures,
+                n_stack=n_stack,
+                flat=flat_observations,
+                shape=self.shape,
             )
             self.observation_space = self.observer.space(self.shape)
 
+        # the opponent client takes the place of the "it" model, with its
+        # actions computed in a batch with other envs
+        self.opponent = opponent
+        if opponent is not None:
+            it_model = opponent
+
+        # the enemy's models observe the game from its side, like in TagGame
+        # and TagVecEnv, rather than through the player's observer
+        self.enemy_observer = FullStateObserver(
+            self.enemy, self.player, treasures=self.treasures, views=True
+        )
         self.enemy_policy = TagAIPolicy(
             screen=self.screen,
             agent=self.enemy,
             player=self.player,
             obstacles=self.obstacles,
             shape=self.shape,
-            observer=self.observer,
+            observer=self.enemy_observer,
             it_model=it_model,
             not_it_model=None,
         )
@@ -148,18 +287,33 @@ class TagBaseEnv(gym.Env):
         # steps per episode
         self._steps = 0
 
+        # episode statistics, reported at the end of each episode
+        self._treasures = 0
+        self._contact_steps = 0
+        self._distance = 0.0
+
     def _get_info(self):
         return {
             "player_position": self.player.position,
             "enemy_position": self.enemy.position,
         }
 
+    def _make_render_screen(self):
+        """Make the screen that is drawn on by ``render``."""
+        if self.render_mode == "human":
+            pygame.init()
+            self.render_screen = pygame.display.set_mode(
+                self.render_shape, flags=pygame.SCALED
+            )
+        else:
+            self.render_screen = pygame.Surface(self.render_shape)
+
     def _get_rgb(self, screen):
         """Get RGB pixel values from the given screen."""
         return np.array(pygame.surfarray.pixels3d(screen), dtype=np.uint8)
 
     def _translate_action(self, action):
-        if USE_CONTINUOUS_ACTIONS:
+        if self.config.continuous_actions:
             return Action(
                 lindir=[1, 0],
                 angdir=action,
@@ -194,28 +348,28 @@ class TagBaseEnv(gym.Env):
         super().reset(seed=seed)
 
         self._steps = 0
+        self._treasures = 0
+        self._contact_steps = 0
+        self._distance = 0.0
 
         r = self.player.radius
 
+        # positions sampled from the free space never collide with obstacles
+        free_space = self.obstacles.free_space(self.shape)
+
         agents = [self.player, self.enemy]
         for agent_idx, agent in enumerate(agents):
             agent.angle = self.np_random.uniform(low=-np.pi, high=np.pi)
 
             # generate collision-free position for each agent
             while True:
-                agent.position = self.np_random.uniform(low=(0, 0), high=self.shape)
-
-                # avoid collision with obstacles
-                collision = False
-                for obstacle in self.obstacles:
-                    if point_in_rect(agent.position, obstacle):
-                        collision = True
-                        break
+                agent.position = free_space.sample(self.np_random)
 
                 # avoid collision with other agents
+                collision = False
                 if agent_idx > 0:
                     for other in agents[:agent_idx]:
-                        d = np.linalg.norm(agent.position - other.position)
+                        d = vec2.norm(vec2.sub(agent.position, other.position))
                         if d <= 2 * r:
                             collision = True
                             break
@@ -230,14 +384,21 @@ class TagBaseEnv(gym.Env):
                     shape=self.shape, obstacles=self.obstacles, rng=self.np_random
                 )
 
-        self._draw(self.screen, self.screen_rect)
+        if self._draw_observations:
+            self._draw(self.screen, self.screen_rect)
         obs = self.observer.get_observation()
         info = self._get_info()
+        self._write_opponent_observation()
         return obs, info
 
+    def _write_opponent_observation(self):
+        """Pass the opponent's observation to its batched inference."""
+        if self.opponent is not None and self.enemy.it:
+            self.opponent.write(self.enemy_policy.it_model_observation())
+
     def _potential(self):
         """Potential for current state."""
-        d = np.linalg.norm(self.player.position - self.enemy.position)
+        d = vec2.norm(vec2.sub(self.player.position, self.enemy.position))
         # potential for when player is it
         p = 1 - d / self._diag
 
@@ -249,17 +410,19 @@ class TagBaseEnv(gym.Env):
     def step(self, action):
         treasures_collected = 0
         p0 = self._potential()
-        for _ in range(FRAME_SKIP):
+        for i in range(self.config.frame_skip):
             self._steps += 1
 
+            # a learned enemy holds its action for the frame skip, like the
+            # player
             self.player.command(self._translate_action(action))
             if not self.stationary_enemy:
-                self.enemy.command(self.enemy_policy.compute())
+                self.enemy.command(self.enemy_policy.compute(hold=i > 0))
 
             agents = [self.player, self.enemy]
             for agent in agents:
                 v = agent.velocity
-                if np.linalg.norm(v) > 0:
+                if vec2.norm(v) > 0:
                     # don't leave the screen
                     if agent.position[0] >= self.shape[0] - agent.radius:
                         v[0] = min(0, v[0])
@@ -271,12 +434,17 @@ class TagBaseEnv(gym.Env):
                         v[1] = max(0, v[1])
 
                     # don't penetrate obstacles
-                    for obstacle in self.obstacles:
-                        Q = point_poly_query(agent.position, obstacle)
-                        if Q.distance < agent.radius and Q.normal @ v < 0:
-                            tan = orth(Q.normal)
+                    normals = self.obstacles.contact_normals(
+                        agent.position, agent.radius
+                    )
+                    for normal in normals:
+                        if normal @ v < 0:
+                            tan = orth(normal)
                             v = (tan @ v) * tan
 
+                    if agent is self.player and len(normals) > 0:
+                        self._contact_steps += 1
+
                 agent.velocity = v
 
             # check if player has collected a treasure
@@ -297,7 +465,7 @@ class TagBaseEnv(gym.Env):
                         continue
 
                     for treasure in self.treasures:
-                        d = np.linalg.norm(agent.position - treasure.center)
+                        d = vec2.norm(vec2.sub(agent.position, treasure.center))
                         if d <= agent.radius + treasure.radius:
                             treasures_collected += 1
                             treasure.update_position(
@@ -308,10 +476,11 @@ class TagBaseEnv(gym.Env):
 
             for agent in agents:
                 agent.step(TIMESTEP)
+            self._distance += TIMESTEP * self.player.last_vel_mag
 
             # round terminates when the player is caught
             r = self.player.radius + self.enemy.radius
-            d = np.linalg.norm(self.player.position - self.enemy.position)
+            d = vec2.norm(vec2.sub(self.player.position, self.enemy.position))
             terminated = bool(d < r)
 
             truncated = self._steps >= self.max_steps
@@ -328,6 +497,7 @@ class TagBaseEnv(gym.Env):
         if not self.player_it:
             reward = -reward
             reward += 0.5 * treasures_collected
+        self._treasures += treasures_collected
 
         # shape reward with potential function
         if not self.sparse_reward:
@@ -337,41 +507,58 @@ class TagBaseEnv(gym.Env):
         # encourage high velocities
         # reward += self.player.last_vel_mag / PLAYER_FORWARD_VEL / self.max_steps
 
-        if VERBOSE:
-            if terminated:
-                print("tagged!")
-                print(f"  steps = {self._steps}")
-            if treasures_collected > 0:
-                print(f"treasures = {treasures_collected}")
-
-        self._draw(self.screen, self.screen_rect)
+        if self._draw_observations:
+            self._draw(self.screen, self.screen_rect)
         obs = self.observer.get_observation()
         info = self._get_info()
+        self._write_opponent_observation()
+        if terminated or truncated:
+            info["episode_stats"] = episode_stats(
+                self._steps,
+                terminated,
+                self._treasures,
+                self._contact_steps,
+                self._distance,
+            )
         return obs, reward, terminated, truncated, info
 
+    def _rasterize(self):
+        """Draw the grayscale observation image without pygame."""
+        discs = [
+            (agent.position, agent.radius, GRAY[agent.color])
+            for agent in [self.player, self.enemy]
+        ]
+        viewpoint = self.player.position if self.config.draw_occlusions else None
+        return self.rasterizer.draw(discs, viewpoint=viewpoint)
+
     def _draw(self, screen, screen_rect, scale=1):
         """Draw the screen."""
         screen.fill(Color.BACKGROUND)
 
+        draw_direction = self.config.draw_direction
         self.player.draw(
-            screen, scale=scale, draw_direction=DRAW_DIRECTION, draw_outline=False
+            screen, scale=scale, draw_direction=draw_direction, draw_outline=False
         )
         self.enemy.draw(
-            screen, scale=scale, draw_direction=DRAW_DIRECTION, draw_outline=False
+            screen, scale=scale, draw_direction=draw_direction, draw_outline=False
         )
 
-        for obstacle in self.obstacles:
-            obstacle.draw(screen, scale=scale)
-            if DRAW_OCCLUSIONS:
-                obstacle.draw_occlusion(
-                    screen,
-                    viewpoint=self.player.position,
-                    screen_rect=screen_rect,
-                    scale=scale,
-                )
+        self.obstacles.draw(screen, scale=scale)
+        if self.config.draw_occlusions:
+            self.obstacles.draw_occlusions(
+                screen,
+                viewpoint=self.player.position,
+                screen_rect=screen_rect,
+                scale=scale,
+            )
 
     def render(self):
-        if USE_IMAGE_OBSERVATIONS and RENDER_OBSERVATION:
+        if self.render_mode is None:
+            return None
+        if self.render_screen is None:
+            self._make_render_screen()
+
+        if self.config.image_observations and self.config.render_observation:
             # 2D grayscale array
             obs = self.observer.get_observation()
             img = obs["image"].squeeze()
@@ -383,7 +570,11 @@ class TagBaseEnv(gym.Env):
             self.render_screen.blit(surf, dest=(0, 0))
         else:
             # draw the human-friendly version
-            self._draw(self.render_screen, self.render_screen_rect, scale=RENDER_SCALE)
+            self._draw(
+                self.render_screen,
+                self.render_screen_rect,
+                scale=self.config.render_scale,
+            )
 
         if self.render_mode == "human":
             pygame.display.flip()
@@ -402,3 +593,27 @@ gym.register(
     entry_point=TagBaseEnv,
     kwargs=dict(player_it=False, stationary_enemy=False, max_steps=1000),
 )
+
+# high-throughput variants for training, which cannot be rendered
+gym.register(
+    id="TagItFast-v0",
+    entry_point=TagBaseEnv,
+    kwargs=dict(
+        render_mode=None,
+        player_it=True,
+        stationary_enemy=True,
+        max_steps=500,
+        config=FAST_CONFIG,
+    ),
+)
+gym.register(
+    id="TagNotItFast-v0",
+    entry_point=TagBaseEnv,
+    kwargs=dict(
+        render_mode=None,
+        player_it=False,
+        stationary_enemy=False,
+        max_steps=1000,
+        config=FAST_CONFIG,
+    ),
+)
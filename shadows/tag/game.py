@@ -2,11 +2,13 @@ import pygame
 import numpy as np
 
 from ..collision import *
+from .. import vec2
 from ..math import *
 from ..gui import Text, Color
 from ..entity import Agent, Action
-from ..obstacle import Obstacle
-from ..treasure import Treasure
+from ..obstacle import Obstacle, ObstacleSet
+from ..treasure import Treasure, draw_treasures
+from ..config import GameConfig
 from .policy import TagAIPolicy, FullStateObserver
 
 
@@ -15,17 +17,10 @@ TIMESTEP = 1.0 / FRAMERATE
 
 TAG_COOLDOWN = 60  # ticks
 
-# for more efficiency we can turn off continuous collision detection
-USE_CCD = False
-USE_AI_POLICY = True
 ALLOW_TAG_SWITCH = True
 
-N_TREASURES = 2
-TREASURE_RADIUS = 1
-OCCLUDE_TREASURES = True
-DRAW_OCCLUSIONS = False
-
-RENDER_SCALE = 8
+# for more efficiency we turn off continuous collision detection
+DEFAULT_CONFIG = GameConfig(use_ccd=False, draw_occlusions=False)
 
 
 class TagGame:
@@ -36,11 +31,15 @@ class TagGame:
         it_model=None,
         not_it_model=None,
         rng=None,
+        config=None,
     ):
+        if config is None:
+            config = DEFAULT_CONFIG
+        self.config = config
         self.rng = np.random.default_rng(rng)
 
         self.shape = shape
-        self.render_shape = tuple(int(RENDER_SCALE * s) for s in self.shape)
+        self.render_shape = tuple(int(self.config.render_scale * s) for s in self.shape)
 
         self.screen = pygame.Surface(self.shape)
         self.screen_rect = AARect(0, 0, self.shape[0], self.shape[1])
@@ -54,7 +53,7 @@ class TagGame:
             # )
             # self.render_screen = pygame.Surface(self.render_shape)
 
-        self.font = pygame.font.SysFont(None, 3 * RENDER_SCALE)
+        self.font = pygame.font.SysFont(None, 3 * self.config.render_scale)
         self.clock = pygame.time.Clock()
         self.keys_down = set()
 
@@ -67,14 +66,16 @@ class TagGame:
         #     Obstacle(37, 8, 5, 5),
         # ]
         # self.obstacles = [Obstacle(20, 20, 10, 10)]
-        self.obstacles = [
-            Obstacle(20, 27, 10, 10),
-            Obstacle(8, 8, 5, 5),
-            Obstacle(0, 37, 13, 13),
-            Obstacle(37, 37, 5, 5),
-            Obstacle(20, 8, 5, 7),
-            Obstacle(20, 15, 22, 5),
-        ]
+        self.obstacles = ObstacleSet(
+            [
+                Obstacle(20, 27, 10, 10),
+                Obstacle(8, 8, 5, 5),
+                Obstacle(0, 37, 13, 13),
+                Obstacle(37, 37, 5, 5),
+                Obstacle(20, 8, 5, 7),
+                Obstacle(20, 15, 22, 5),
+            ]
+        )
 
         # player and enemy agents
         self.player = Agent.player(position=[10, 25], radius=3, it=False)
@@ -82,9 +83,23 @@ class TagGame:
         self.agents = [self.player, self.enemy]
         self.it_id = 1
 
+        if self.config.use_distance_field:
+            radius = max(agent.radius for agent in self.agents)
+            self.obstacles.use_distance_field(
+                self.shape,
+                resolution=self.config.distance_field_resolution,
+                exact_within=radius if self.config.exact_contact else None,
+            )
+
+        if self.config.use_visibility_table:
+            self.obstacles.use_visibility_table(
+                self.shape, cell_size=self.config.visibility_cell_size
+            )
+
         self.score = 0
         self.treasures = [
-            Treasure(center=[0, 0], radius=TREASURE_RADIUS) for _ in range(N_TREASURES)
+            Treasure(center=[0, 0], radius=self.config.treasure_radius)
+            for _ in range(self.config.n_treasures)
         ]
         for treasure in self.treasures:
             treasure.update_position(
@@ -93,8 +108,10 @@ class TagGame:
 
         self.tag_cooldown = 0
 
+        # observations are only passed to the policy, so views of the
+        # observer's buffers can be used
         self.observer = FullStateObserver(
-            agent=self.enemy, enemy=self.player, treasures=self.treasures
+            agent=self.enemy, enemy=self.player, treasures=self.treasures, views=True
         )
         self.enemy_policy = TagAIPolicy(
             screen=self.screen,
@@ -135,24 +152,30 @@ class TagGame:
         #     draw_outline=draw_outline,
         #     scale=scale,
         # )
-        if draw_treasure and OCCLUDE_TREASURES:
-            for treasure in self.treasures:
-                treasure.draw(surface=screen, scale=scale)
+        if draw_treasure and self.config.occlude_treasures:
+            # treasures entirely hidden from the viewpoint are skipped, and the
+            # occlusions are drawn over those that are partly hidden
+            draw_treasures(
+                screen,
+                self.treasures,
+                scale=scale,
+                viewpoint=viewpoint if draw_occlusion else None,
+                obstacles=self.obstacles,
+                screen_rect=self.screen_rect,
+            )
 
         # NOTE screen_rect is always the unscaled version
-        for obstacle in self.obstacles:
-            obstacle.draw(surface=screen, scale=scale)
-            if draw_occlusion:
-                obstacle.draw_occlusion(
-                    surface=screen,
-                    viewpoint=viewpoint,
-                    screen_rect=self.screen_rect,
-                    scale=scale,
-                )
-
-        if draw_treasure and not OCCLUDE_TREASURES:
-            for treasure in self.treasures:
-                treasure.draw(surface=screen, scale=scale)
+        self.obstacles.draw(surface=screen, scale=scale)
+        if draw_occlusion:
+            self.obstacles.draw_occlusions(
+                surface=screen,
+                viewpoint=viewpoint,
+                screen_rect=self.screen_rect,
+                scale=scale,
+            )
+
+        if draw_treasure and not self.config.occlude_treasures:
+            draw_treasures(screen, self.treasures, scale=scale)
 
         if draw_treasure:
             # TODO render on a background?
@@ -167,7 +190,7 @@ class TagGame:
             scale=1,
             draw_direction=False,
             draw_outline=False,
-            draw_occlusion=DRAW_OCCLUSIONS,
+            draw_occlusion=self.config.draw_occlusions,
             draw_treasure=False,
         )
 
@@ -175,10 +198,10 @@ class TagGame:
         self._draw(
             screen=self.render_screen,
             viewpoint=self.player.position,
-            scale=RENDER_SCALE,
+            scale=self.config.render_scale,
             draw_direction=True,
             draw_outline=True,
-            draw_occlusion=DRAW_OCCLUSIONS,
+            draw_occlusion=self.config.draw_occlusions,
         )
 
     def render_display(self):
@@ -209,8 +232,8 @@ class TagGame:
                 v[1] = max(0, v[1])
 
             # don't walk into an obstacle
-            if np.linalg.norm(v) > 0:
-                if USE_CCD:
+            if vec2.norm(v) > 0:
+                if self.config.use_ccd:
                     path = Segment(agent.position, agent.position + TIMESTEP * v)
                     for obstacle in self.obstacles:
                         Q = swept_circle_poly_query(path, agent.radius, obstacle)
@@ -220,10 +243,12 @@ class TagGame:
                             v = Q.time * v + (1 - Q.time) * vtan
 
                 else:
-                    for obstacle in self.obstacles:
-                        Q = point_poly_query(agent.position, obstacle)
-                        if Q.distance < agent.radius and Q.normal @ v < 0:
-                            tan = orth(Q.normal)
+                    normals = self.obstacles.contact_normals(
+                        agent.position, agent.radius
+                    )
+                    for normal in normals:
+                        if normal @ v < 0:
+                            tan = orth(normal)
                             v = (tan @ v) * tan
 
             agent.velocity = v
@@ -234,7 +259,7 @@ class TagGame:
                 continue
 
             for treasure in self.treasures:
-                d = np.linalg.norm(agent.position - treasure.center)
+                d = vec2.norm(vec2.sub(agent.position, treasure.center))
                 if d <= agent.radius + treasure.radius:
                     if agent is self.player:
                         self.score += 1
@@ -254,7 +279,7 @@ class TagGame:
 
                 # switch who is "it"
                 d = agent.radius + it_agent.radius
-                if np.linalg.norm(agent.position - it_agent.position) < d:
+                if vec2.norm(vec2.sub(agent.position, it_agent.position)) < d:
                     self.tag_cooldown = TAG_COOLDOWN
                     it_agent.it = False
                     agent.it = True
@@ -304,7 +329,7 @@ class TagGame:
 
             # TODO hardcoded indices here
             actions = {}
-            if USE_AI_POLICY:
+            if self.config.use_ai_policy:
                 self.draw_enemy_screen()
                 actions[1] = self.enemy_policy.compute()
             actions[0] = Action(
@@ -0,0 +1,236 @@
+"""Batched inference of learned opponent policies shared by many envs."""
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import gymnasium as gym
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv, VecEnvWrapper
+
+from .env import TagEnvConfig
+from .policy import FLAT_KEYS, convert_observation, flat_index_map
+
+
+class _SharedArray:
+    """NumPy array that is optionally backed by shared memory.
+
+    Shared arrays are pickled by the name of their memory block, so that other
+    processes attach to the same memory rather than receiving a copy.
+    """
+
+    def __init__(self, shape, dtype, shared=False):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._shm = None
+        if shared:
+            size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self.array = np.ndarray(self.shape, self.dtype, buffer=self._shm.buf)
+            self.array.fill(0)
+        else:
+            self.array = np.zeros(self.shape, dtype=self.dtype)
+
+    def __getstate__(self):
+        if self._shm is None:
+            raise TypeError("Only shared arrays can be passed to other processes.")
+        return (self._shm.name, self.shape, self.dtype)
+
+    def __setstate__(self, state):
+        name, self.shape, self.dtype = state
+        self._shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, self.dtype, buffer=self._shm.buf)
+
+    def close(self, unlink=False):
+        if self._shm is not None:
+            self.array = None
+            self._shm.close()
+            if unlink:
+                self._shm.unlink()
+            self._shm = None
+
+
+class OpponentClient:
+    """Handle used by one env to get its opponent's actions from an
+    ``OpponentInference``.
+
+    It is passed to ``TagBaseEnv`` as the ``opponent`` and takes the place of
+    the opponent's model: the env writes the opponent's observation at the
+    end of each reset and step, and ``predict`` returns the action that was
+    computed from it in the batch before the next step. The action is repeated
+    for every step of a frame skip.
+    """
+
+    # observations are written in the dict layout
+    observation_space = None
+
+    # actions are computed by the OpponentInference, so predict ignores its
+    # observation
+    precomputed = True
+
+    def __init__(self, observations, actions, index):
+        self._observations = observations
+        self._actions = actions
+        self.index = index
+
+    def write(self, obs):
+        """Write the opponent's dict observation."""
+        row = self._observations.array[self.index]
+        row[:] = np.concatenate([obs[key] for key in FLAT_KEYS if key in obs])
+
+    def predict(self, obs, deterministic=False):
+        return self._actions.array[self.index].copy(), None
+
+
+class OpponentInference:
+    """Evaluate a learned opponent policy for many envs with one batched
+    forward pass.
+
+    Each env writes its opponent's observation into a row of a buffer
+    through its ``OpponentClient``. Before the envs are stepped, ``predict``
+    evaluates the model on all rows at once and writes the actions back. If
+    ``shared`` is True, the buffers are in shared memory, so the clients can
+    be used by envs in other processes, such as the workers of a
+    ``SubprocVecEnv``.
+
+    Parameters
+    ----------
+    model :
+        The opponent's model, with an SB3-style ``predict`` method.
+    n_envs : int
+        The number of envs.
+    shape : pair of float
+        The width and height of the arena.
+    n_treasures : int
+        The number of treasures in each arena.
+    shared : bool
+        Put the buffers in shared memory.
+    deterministic : bool
+        Use deterministic actions.
+    """
+
+    def __init__(
+        self, model, n_envs, shape, n_treasures, shared=False, deterministic=False
+    ):
+        self.model = model
+        self.shape = shape
+        self.deterministic = deterministic
+        self._index_map = flat_index_map(n_treasures)
+
+        action_space = model.action_space
+        self._observations = _SharedArray(
+            (n_envs, 5 + 2 * n_treasures), np.float32, shared=shared
+        )
+        self._actions = _SharedArray(
+            (n_envs,) + action_space.shape, action_space.dtype, shared=shared
+        )
+
+    @property
+    def observations(self):
+        return self._observations.array
+
+    @property
+    def actions(self):
+        return self._actions.array
+
+    def client(self, index):
+        """The client for the env with the given index."""
+        return OpponentClient(self._observations, self._actions, index)
+
+    def predict(self):
+        """Compute the actions of all of the opponents."""
+        obs = {key: self.observations[:, s] for key, s in self._index_map.items()}
+        space = getattr(self.model, "observation_space", None)
+        obs = convert_observation(obs, space, self.shape)
+        actions, _ = self.model.predict(obs, deterministic=self.deterministic)
+        self.actions[:] = np.reshape(actions, self.actions.shape)
+
+    def close(self):
+        """Release the buffers."""
+        self._observations.close(unlink=True)
+        self._actions.close(unlink=True)
+
+
+class OpponentInferenceVecEnv(VecEnvWrapper):
+    """Run an ``OpponentInference`` before each step of a vectorized env.
+
+    The envs are stepped only after their opponents' actions are computed, so
+    the actions are read by the envs without any further communication.
+    """
+
+    def __init__(self, venv, inference):
+        super().__init__(venv)
+        self.inference = inference
+
+    def reset(self):
+        return self.venv.reset()
+
+    def step_async(self, actions):
+        self.inference.predict()
+        self.venv.step_async(actions)
+
+    def step_wait(self):
+        return self.venv.step_wait()
+
+    def close(self):
+        self.venv.close()
+        self.inference.close()
+
+
+def make_opponent_vec_env(
+    env_id,
+    n_envs,
+    model,
+    seed=None,
+    vec_env_cls=None,
+    vec_env_kwargs=None,
+    env_kwargs=None,
+    monitor_dir=None,
+):
+    """Make a vectorized tag env whose learned "it" opponents share one
+    ``OpponentInference``.
+
+    This is like SB3's ``make_vec_env``. The buffers are put in shared memory
+    unless the envs run in this process with a ``DummyVecEnv``.
+
+    Returns
+    -------
+    : OpponentInferenceVecEnv
+        The vectorized env, which runs the inference before each step.
+    """
+    if vec_env_cls is None:
+        vec_env_cls = DummyVecEnv
+    if vec_env_kwargs is None:
+        vec_env_kwargs = {}
+    if env_kwargs is None:
+        env_kwargs = {}
+
+    # only the shape of the arena and the number of treasures are needed
+    spec_kwargs = dict(gym.spec(env_id).kwargs)
+    spec_kwargs.update(env_kwargs)
+    config = TagEnvConfig.make(spec_kwargs.get("config", None))
+
+    inference = OpponentInference(
+        model,
+        n_envs,
+        tuple(config.shape),
+        config.n_treasures,
+        shared=vec_env_cls is not DummyVecEnv,
+    )
+
+    def make_env(rank):
+        client = inference.client(rank)
+
+        def _init():
+            env = gym.make(env_id, opponent=client, **env_kwargs)
+            path = None
+            if monitor_dir is not None:
+                path = os.path.join(monitor_dir, str(rank))
+            return Monitor(env, filename=path)
+
+        return _init
+
+    if monitor_dir is not None:
+        os.makedirs(monitor_dir, exist_ok=True)
+    venv = vec_env_cls([make_env(i) for i in range(n_envs)], **vec_env_kwargs)
+    venv.seed(seed)
+    return OpponentInferenceVecEnv(venv, inference)
@@ -0,0 +1,124 @@
+"""Inference of exported policies with ONNX Runtime."""
+import os
+
+import numpy as np
+import gymnasium as gym
+
+
+class OnnxPolicy:
+    """Policy exported to ONNX by ``scripts/learn/export_onnx_model.py``.
+
+    The model is run with ONNX Runtime on the CPU, so neither PyTorch nor
+    Stable Baselines3 are needed. It can be used in place of an SB3 model by
+    ``TagAIPolicy`` and the environments.
+
+    Models with a single ``observation`` input take flat observations (see
+    ``flat_index_map``) and models with one input per key take dict
+    observations, like ``FullStateObserver``. The ``observation_space``
+    reflects this, so that observations can be converted to the right layout
+    with ``convert_observation``.
+
+    Parameters
+    ----------
+    path : str
+        Path to the ``.onnx`` file.
+    action_bounds : pair of float or None
+        Continuous actions are clipped to these bounds, like SB3 does for
+        unsquashed policies. If ``None``, they are not clipped.
+    """
+
+    def __init__(self, path, action_bounds=(-1, 1)):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("onnxruntime is required to run ONNX policies.") from e
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            os.fspath(path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.action_bounds = action_bounds
+
+        inputs = self.session.get_inputs()
+        self.input_names = [i.name for i in inputs]
+        self._output_names = [self.session.get_outputs()[0].name]
+        self._sizes = {i.name: i.shape[-1] for i in inputs}
+
+        # the batch dimension is fixed to one unless it is symbolic
+        self.batched = not isinstance(inputs[0].shape[0], int)
+
+        # a single observation is copied into these preallocated buffers
+        self._buffers = {
+            name: np.zeros((1, size), dtype=np.float32)
+            for name, size in self._sizes.items()
+        }
+
+        if self.input_names == ["observation"]:
+            size = self._sizes["observation"]
+            self.observation_space = gym.spaces.Box(
+                low=-np.inf, high=np.inf, shape=(size,), dtype=np.float32
+            )
+        else:
+            self.observation_space = gym.spaces.Dict(
+                {
+                    name: gym.spaces.Box(
+                        low=-np.inf, high=np.inf, shape=(size,), dtype=np.float32
+                    )
+                    for name, size in self._sizes.items()
+                }
+            )
+
+    def _inputs(self, obs):
+        if isinstance(obs, dict):
+            return {name: obs[name] for name in self.input_names}
+        return {"observation": obs}
+
+    def _run(self, feeds):
+        actions = self.session.run(self._output_names, feeds)[0]
+        if self.action_bounds is not None and actions.dtype.kind == "f":
+            actions = np.clip(actions, *self.action_bounds)
+        return actions
+
+    def predict(self, obs, deterministic=False):
+        """Compute the action for an observation or a batch of observations.
+
+        ``deterministic`` is accepted for compatibility with SB3 models, but
+        whether actions are sampled is decided when the model is exported.
+
+        Returns
+        -------
+        : tuple
+            The action(s) and ``None``, like ``predict`` of SB3 models.
+        """
+        inputs = self._inputs(obs)
+        single = np.ndim(inputs[self.input_names[0]]) == 1
+
+        if single:
+            for name, value in inputs.items():
+                self._buffers[name][0] = value
+            return self._run(self._buffers)[0], None
+
+        feeds = {
+            name: np.asarray(value, dtype=np.float32) for name, value in inputs.items()
+        }
+        if self.batched:
+            return self._run(feeds), None
+
+        # the model only takes one observation at a time
+        n = len(feeds[self.input_names[0]])
+        actions = [
+            self._run({name: value[i : i + 1] for name, value in feeds.items()})[0]
+            for i in range(n)
+        ]
+        return np.stack(actions), None
+
+
+def load_policy(model):
+    """Load the model if it is a path to an ONNX file.
+
+    Other models are returned unchanged.
+    """
+    if isinstance(model, (str, os.PathLike)):
+        return OnnxPolicy(model)
+    return model
@@ -1,23 +1,57 @@
 import gymnasium as gym
-import pygame
 import numpy as np
-from collections import deque
 
 from ..math import *
 from ..entity import Action
-from ..gui import Color
+from ..gui import Color, pygame
+from ..raster import GRAY
+from .onnx_policy import load_policy
 
 
 class ImageObserver:
-    def __init__(self, screen, agent, n_stack=1):
+    """Observe grayscale images of the screen.
+
+    If ``rasterize`` is given, it is called to draw the grayscale image
+    directly (e.g. with a ``Rasterizer``) rather than reading the image back
+    from the pygame screen.
+
+    Observations are written into preallocated buffers. If ``views`` is True,
+    views of the buffers are returned, which are modified by later calls;
+    otherwise copies are returned.
+    """
+
+    def __init__(self, screen, agent, n_stack=1, rasterize=None, views=False):
         self.screen = screen
         self.agent = agent
+        self.rasterize = rasterize
+        self.views = views
 
         self.n_stack = n_stack
 
-        # initialize the stack of observations
+        self._frame = {
+            "position": np.zeros(2, dtype=np.float32),
+            "angle": np.zeros(1, dtype=np.float32),
+            "image": None,
+        }
+
+        # initialize the stack of observations, which is a circular buffer of
+        # frames with index of the next frame to overwrite
         obs = self._get_single_observation()
-        self._past_obs = deque([obs] * n_stack, maxlen=n_stack)
+        if views:
+            # each frame is written twice into a buffer of 2 * n_stack frames
+            # along the last axis, so the stack is always a window of it
+            self._stack = {
+                key: np.concatenate([value] * 2 * n_stack, axis=-1)
+                for key, value in obs.items()
+            }
+        else:
+            # copies are concatenated from separate contiguous frames, which
+            # is faster than copying a strided window
+            self._stack = {
+                key: [value.copy() for _ in range(n_stack)]
+                for key, value in obs.items()
+            }
+        self._stack_idx = 0
 
     def space(self, shape, grayscale=True):
         if grayscale:
@@ -44,8 +78,8 @@ class ImageObserver:
         """Get RGB pixel values from the given screen."""
         return np.array(pygame.surfarray.pixels3d(self.screen), dtype=np.uint8)
 
-    def _get_single_observation(self):
-        """Get a single observation."""
+    def _get_gray(self):
+        """Get grayscale pixel values from the screen."""
         rgb = self._get_rgb()
         shape = rgb.shape[:2] + (1,)
 
@@ -53,56 +87,191 @@ class ImageObserver:
         gray = np.zeros(shape, dtype=np.uint8)
 
         enemy_mask = np.all(rgb == Color.ENEMY, axis=-1)
-        gray[enemy_mask, 0] = 85
+        gray[enemy_mask, 0] = GRAY[Color.ENEMY]
 
         player_mask = np.all(rgb == Color.PLAYER, axis=-1)
-        gray[player_mask, 0] = 170
+        gray[player_mask, 0] = GRAY[Color.PLAYER]
 
         obs_mask = np.all(rgb == Color.OBSTACLE, axis=-1)
-        gray[obs_mask, 0] = 255
+        gray[obs_mask, 0] = GRAY[Color.OBSTACLE]
+        return gray
 
-        return {
-            "position": self.agent.position.astype(np.float32),
-            "angle": np.array([self.agent.angle], dtype=np.float32),
-            "image": gray,
-        }
+    def _get_single_observation(self):
+        """Get a single observation, in the preallocated frame buffers."""
+        frame = self._frame
+        if self.rasterize is not None:
+            image = self.rasterize()
+        else:
+            image = self._get_gray()
+        if frame["image"] is None:
+            frame["image"] = np.zeros_like(image)
+        frame["image"][:] = image
+        frame["position"][:] = self.agent.position
+        frame["angle"][0] = self.agent.angle
+        return frame
 
     def get_observation(self):
         """Get an observation for input to the model, which may be stacked."""
         obs = self._get_single_observation()
         if self.n_stack == 1:
-            return obs
+            if self.views:
+                return obs
+            return {key: value.copy() for key, value in obs.items()}
 
-        # add the new observation
-        self._past_obs.append(obs)
+        # overwrite the oldest frame with the new one
+        n = self.n_stack
+        i = self._stack_idx
+        self._stack_idx = (i + 1) % n
 
         stack = {}
-        for key in obs.keys():
-            stack[key] = np.concatenate([obs[key] for obs in self._past_obs], axis=-1)
+        for key, value in obs.items():
+            if self.views:
+                f = value.shape[-1]
+                buf = self._stack[key]
+                buf[..., i * f : (i + 1) * f] = value
+                buf[..., (i + n) * f : (i + n + 1) * f] = value
+                stack[key] = buf[..., (i + 1) * f : (i + n + 1) * f]
+            else:
+                frames = self._stack[key]
+                frames[i][:] = value
+                stack[key] = np.concatenate(frames[i + 1 :] + frames[: i + 1], axis=-1)
         return stack
 
-        # concatenate the queue to produce the stacked observation
-        # position = np.concatenate([obs["position"] for obs in self._past_obs])
-        # angle = np.concatenate([obs["angle"] for obs in self._past_obs])
-        # image = np.concatenate([obs["image"] for obs in self._past_obs], axis=-1)
-        # return {
-        #     "position": position,
-        #     "angle": angle,
-        #     "image": image,
-        # }
+
+# Layout of flat full-state observations. Positions are divided by the
+# width and height of the arena and the angle by pi, so every entry lies in
+# [0, 1] except for the angle, which lies in [-1, 1]:
+#
+#   [0:2]          agent position
+#   [2]            agent angle
+#   [3:5]          enemy position
+#   [5:5 + 2 * n]  positions of the n treasures
+FLAT_KEYS = ("agent_position", "agent_angle", "enemy_position", "treasure_positions")
+
+
+def flat_index_map(n_treasures):
+    """Slices of the flat observation holding each entry of the dict
+    observation.
+
+    The treasure positions are only included if there are treasures.
+    """
+    sizes = (2, 1, 2, 2 * n_treasures)
+    index_map = {}
+    start = 0
+    for key, size in zip(FLAT_KEYS, sizes):
+        if size > 0:
+            index_map[key] = slice(start, start + size)
+        start += size
+    return index_map
+
+
+def _flat_scale(shape, n_treasures):
+    """Scale dividing each entry of a flat observation."""
+    scale = np.concatenate([shape, [np.pi], shape, np.tile(shape, n_treasures)])
+    return scale.astype(np.float32)
+
+
+def flat_observation_space(shape, n_treasures):
+    """The ``Box`` space of flat observations."""
+    low = np.zeros(5 + 2 * n_treasures, dtype=np.float32)
+    low[flat_index_map(n_treasures)["agent_angle"]] = -1
+    high = np.ones_like(low)
+    return gym.spaces.Box(low=low, high=high, dtype=np.float32)
+
+
+def flatten_observation(obs, shape):
+    """Convert dict observations to the flat layout.
+
+    Parameters
+    ----------
+    obs : dict
+        The dict observation. The entries may have leading batch dimensions.
+    shape : pair of float
+        The width and height of the arena.
+
+    Returns
+    -------
+    : np.ndarray
+        The flat observation, of dtype float32.
+    """
+    parts = [np.asarray(obs[key], dtype=np.float32) for key in FLAT_KEYS if key in obs]
+    flat = np.concatenate(parts, axis=-1)
+    n_treasures = (flat.shape[-1] - 5) // 2
+    return flat / _flat_scale(shape, n_treasures)
+
+
+def unflatten_observation(obs, shape):
+    """Convert flat observations back to dict observations.
+
+    This is the inverse of ``flatten_observation``.
+    """
+    obs = np.asarray(obs, dtype=np.float32)
+    n_treasures = (obs.shape[-1] - 5) // 2
+    obs = obs * _flat_scale(shape, n_treasures)
+    return {key: obs[..., s] for key, s in flat_index_map(n_treasures).items()}
+
+
+def convert_observation(obs, space, shape):
+    """Convert a dict or flat observation to match an observation space.
+
+    This allows models trained with either layout to be used with either
+    kind of observer. If ``space`` is ``None``, the observation is returned
+    unchanged.
+    """
+    if isinstance(space, gym.spaces.Box) and isinstance(obs, dict):
+        return flatten_observation(obs, shape)
+    if isinstance(space, gym.spaces.Dict) and not isinstance(obs, dict):
+        return unflatten_observation(obs, shape)
+    return obs
 
 
 class FullStateObserver:
-    def __init__(self, agent, enemy, treasures=None, n_stack=1):
+    """Observe the full state of the game.
+
+    Observations are written into preallocated buffers. If ``views`` is True,
+    the buffers themselves are returned, which are overwritten by the next
+    call; otherwise copies are returned.
+
+    If ``flat`` is True, observations are normalized float32 arrays with the
+    layout documented by ``flat_index_map``, rather than dicts. The ``shape``
+    of the arena is then required to normalize the positions.
+    """
+
+    def __init__(
+        self,
+        agent,
+        enemy,
+        treasures=None,
+        n_stack=1,
+        views=False,
+        flat=False,
+        shape=None,
+    ):
         self.agent = agent
         self.enemy = enemy
         self.n_stack = n_stack
+        self.views = views
+        self.flat = flat
 
         if treasures is None:
             treasures = []
         self.treasures = treasures
 
+        # the dict entries are views of a single buffer in the flat layout
+        n = len(self.treasures)
+        self._raw = np.zeros(5 + 2 * n, dtype=np.float32)
+        self._obs = {key: self._raw[s] for key, s in flat_index_map(n).items()}
+
+        if flat:
+            if shape is None:
+                raise ValueError("The shape is required for flat observations.")
+            self._scale = _flat_scale(shape, n)
+            self._flat = np.zeros_like(self._raw)
+
     def space(self, shape):
+        if self.flat:
+            return flat_observation_space(shape, len(self.treasures))
+
         space = {
             "agent_position": gym.spaces.Box(
                 low=np.zeros(2, dtype=np.float32),
@@ -132,21 +301,33 @@ class FullStateObserver:
         return gym.spaces.Dict(space)
 
     def get_observation(self):
-        obs = {
-            "agent_position": self.agent.position.astype(np.float32),
-            "agent_angle": np.array([self.agent.angle], dtype=np.float32),
-            "enemy_position": self.enemy.position.astype(np.float32),
-            # "enemy_angle": np.array([self.enemy.angle], dtype=np.float32),
-        }
+        obs = self._obs
+        obs["agent_position"][:] = self.agent.position
+        obs["agent_angle"][0] = self.agent.angle
+        obs["enemy_position"][:] = self.enemy.position
         if len(self.treasures) > 0:
-            obs["treasure_positions"] = np.concatenate(
-                [t.center for t in self.treasures]
-            ).astype(np.float32)
-        return obs
+            positions = obs["treasure_positions"].reshape(-1, 2)
+            for i, treasure in enumerate(self.treasures):
+                positions[i] = treasure.center
+
+        if self.flat:
+            np.divide(self._raw, self._scale, out=self._flat)
+            if self.views:
+                return self._flat
+            return self._flat.copy()
+
+        if self.views:
+            return obs
+        return {key: value.copy() for key, value in obs.items()}
 
 
 class TagAIPolicy:
-    """Basic AI policy for the tag game."""
+    """Basic AI policy for the tag game.
+
+    The enemy is controlled by ``it_model`` or ``not_it_model`` when given.
+    These are SB3 models or paths to models exported to ONNX, which are run
+    with ``OnnxPolicy``.
+    """
 
     def __init__(
         self,
@@ -166,8 +347,11 @@ class TagAIPolicy:
         self.obstacles = obstacles
 
         self.observer = observer
-        self.it_model = it_model
-        self.not_it_model = not_it_model
+        self.it_model = load_policy(it_model)
+        self.not_it_model = load_policy(not_it_model)
+
+        # most recent learned model and its action, which can be held
+        self._held = None
 
     def _translate_action(self, action):
         # if action < 3:
@@ -220,20 +404,47 @@ class TagAIPolicy:
             frame=Action.LOCAL,
         )
 
-    def _learned_it_policy(self):
+    def _model_observation(self, model, obs):
+        """Convert the observation to the layout the model was trained on."""
+        space = getattr(model, "observation_space", None)
+        return convert_observation(obs, space, self.shape)
+
+    def it_model_observation(self):
+        """The dict observation passed to the "it" model."""
         obs = self.observer.get_observation()
+        if not isinstance(obs, dict):
+            obs = unflatten_observation(obs, self.shape)
 
-        # it model ignores treasures entirely
+        # it model ignores treasures entirely; the observation may be a view
+        # of the observer's buffers, so it is not modified in place
         if "treasure_positions" in obs:
-            obs["treasure_positions"].fill(0)
+            obs = dict(obs)
+            obs["treasure_positions"] = np.zeros_like(obs["treasure_positions"])
+        return obs
 
-        action, _ = self.it_model.predict(obs, deterministic=False)
+    def _predict(self, model, get_observation, hold):
+        """Action of a learned model, which is the previous one if ``hold`` is
+        True and the model has not changed."""
+        if hold and self._held is not None and self._held[0] is model:
+            return self._held[1]
+
+        # the actions of an OpponentClient are computed from the observations
+        # that the env writes to it, so no observation is built here
+        obs = None
+        if not getattr(model, "precomputed", False):
+            obs = self._model_observation(model, get_observation())
+        action, _ = model.predict(obs, deterministic=False)
+        self._held = (model, action)
+        return action
+
+    def _learned_it_policy(self, hold=False):
+        action = self._predict(self.it_model, self.it_model_observation, hold)
         return self._translate_action(action)
 
-    def _it_policy(self):
+    def _it_policy(self, hold=False):
         if self.it_model is None:
             return self._default_it_policy()
-        return self._learned_it_policy()
+        return self._learned_it_policy(hold)
 
     def _default_not_it_policy(self):
         """Policy for agents that are not "it"."""
@@ -269,18 +480,22 @@ class TagAIPolicy:
             frame=Action.LOCAL,
         )
 
-    def _learned_not_it_policy(self):
-        obs = self.observer.get_observation()
-        action, _ = self.not_it_model.predict(obs, deterministic=False)
+    def _learned_not_it_policy(self, hold=False):
+        action = self._predict(self.not_it_model, self.observer.get_observation, hold)
         return self._translate_action(action)
 
-    def _not_it_policy(self):
+    def _not_it_policy(self, hold=False):
         if self.not_it_model is None:
             return self._default_not_it_policy()
-        return self._learned_not_it_policy()
+        return self._learned_not_it_policy(hold)
+
+    def compute(self, hold=False):
+        """Evaluate the policy at the current state.
 
-    def compute(self):
-        """Evaluate the policy at the current state."""
+        If ``hold`` is True, a learned model repeats its previous action rather
+        than being evaluated again, e.g. for the steps of a frame skip. The
+        default policies are always evaluated.
+        """
         if self.agent.it:
-            return self._it_policy()
-        return self._not_it_policy()
+            return self._it_policy(hold)
+        return self._not_it_policy(hold)
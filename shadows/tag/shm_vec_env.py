@@ -0,0 +1,161 @@
+"""Multiprocess vectorized env that exchanges data through shared memory."""
+import functools
+import multiprocessing as mp
+import os
+
+import numpy as np
+import gymnasium as gym
+from stable_baselines3.common.vec_env import SubprocVecEnv
+from stable_baselines3.common.vec_env.util import dict_to_obs, obs_space_info
+
+from .inference import _SharedArray
+
+
+class _SharedMemoryEnv(gym.Wrapper):
+    """Env that reads its actions from and writes its observations to rows of
+    shared arrays, once they are attached.
+
+    Only terminal observations are returned, so that SB3's worker can put them
+    in the ``info`` dict. Other observations are replaced by ``None`` so they
+    are not sent through the pipe.
+    """
+
+    def __init__(self, env):
+        super().__init__(env)
+        self.index = None
+        self.buffers = {}
+        self.actions = None
+
+    def attach(self, index, buffers, actions):
+        """Attach to the row ``index`` of the shared arrays."""
+        self.index = index
+        self.buffers = buffers
+        self.actions = actions
+
+    def _write(self, obs):
+        for key, buffer in self.buffers.items():
+            buffer.array[self.index] = obs if key is None else obs[key]
+
+    def step(self, action):
+        action = self.actions.array[self.index].copy()
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self._write(obs)
+        return (
+            obs if terminated or truncated else None,
+            reward,
+            terminated,
+            truncated,
+            info,
+        )
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self._write(obs)
+        return None, info
+
+    def close(self):
+        super().close()
+        for buffer in list(self.buffers.values()) + [self.actions]:
+            if buffer is not None:
+                buffer.close()
+
+
+def _make_env(env_fn, cpu):
+    """Make the env in its worker process, which is first pinned to ``cpu``."""
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    return _SharedMemoryEnv(env_fn())
+
+
+class ShmVecEnv(SubprocVecEnv):
+    """Multiprocess vectorized env like ``SubprocVecEnv``, but with the
+    actions and observations in shared memory.
+
+    Each env runs in its own worker process, which is SB3's ``SubprocVecEnv``
+    worker. The envs are wrapped so that they read their actions from and
+    write their observations to preallocated shared-memory arrays, so only the
+    commands, rewards, dones and ``info`` dicts are pickled and sent through
+    the pipes. Observations must be a ``Box``, ``Discrete`` or a ``Dict`` of
+    these.
+
+    Parameters
+    ----------
+    env_fns : list
+        Functions that create the envs.
+    start_method : str or None
+        Method used to start the workers. Defaults to "forkserver" if it is
+        available and "spawn" otherwise, like ``SubprocVecEnv``.
+    pin_workers : bool
+        Pin each worker to its own CPU core. Only supported on Linux.
+    cpus : list of int or None
+        The cores that the workers are pinned to in turn. Defaults to the cores
+        available to this process. Other vectorized envs, such as those for
+        evaluation, can be given different cores so that their workers do not
+        compete.
+    """
+
+    def __init__(self, env_fns, start_method=None, pin_workers=True, cpus=None):
+        n_envs = len(env_fns)
+        if start_method is None:
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+
+        worker_cpus = [None] * n_envs
+        if pin_workers and hasattr(os, "sched_getaffinity"):
+            if cpus is None:
+                cpus = sorted(os.sched_getaffinity(0))
+            worker_cpus = [cpus[i % len(cpus)] for i in range(n_envs)]
+        env_fns = [
+            functools.partial(_make_env, env_fn, cpu)
+            for env_fn, cpu in zip(env_fns, worker_cpus)
+        ]
+        super().__init__(env_fns, start_method=start_method)
+
+        # the buffers are allocated once the spaces are known and then
+        # attached to by the workers
+        keys, shapes, dtypes = obs_space_info(self.observation_space)
+        self._buffers = {
+            key: _SharedArray((n_envs,) + shapes[key], dtypes[key], shared=True)
+            for key in keys
+        }
+        self._actions = _SharedArray(
+            (n_envs,) + self.action_space.shape, self.action_space.dtype, shared=True
+        )
+        for i in range(n_envs):
+            self.env_method("attach", i, self._buffers, self._actions, indices=i)
+
+    def _observations(self):
+        obs = {key: buffer.array.copy() for key, buffer in self._buffers.items()}
+        return dict_to_obs(self.observation_space, obs)
+
+    def step_async(self, actions):
+        self._actions.array[:] = np.reshape(actions, self._actions.shape)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        _, rewards, dones, infos, self.reset_infos = zip(*results)
+        # rewards are float32, like those of DummyVecEnv
+        rewards = np.array(rewards, dtype=np.float32)
+        return self._observations(), rewards, np.array(dones), infos
+
+    def reset(self):
+        for i, remote in enumerate(self.remotes):
+            remote.send(("reset", (self._seeds[i], self._options[i])))
+        results = [remote.recv() for remote in self.remotes]
+        _, self.reset_infos = zip(*results)
+        # seeds and options are only used once
+        self._reset_seeds()
+        self._reset_options()
+        return self._observations()
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        for buffer in self._buffers.values():
+            buffer.close(unlink=True)
+        self._actions.close(unlink=True)
@@ -0,0 +1,506 @@
+"""Batched learning environment."""
+
+import numpy as np
+import gymnasium as gym
+from stable_baselines3.common.vec_env import VecEnv
+
+from ..entity import PLAYER_FORWARD_VEL, PLAYER_IT_VEL, PLAYER_ANGVEL
+from ..collision import point_polys_query
+from .env import TIMESTEP, TagEnvConfig, episode_stats, make_obstacles
+from .policy import convert_observation, flat_observation_space, flatten_observation
+from .onnx_policy import load_policy
+
+
+AGENT_RADIUS = 3
+
+# agent indices
+PLAYER = 0
+ENEMY = 1
+
+
+def _directions(angles):
+    """Unit vectors in the directions of the angles."""
+    return np.stack((np.cos(angles), -np.sin(angles)), axis=-1)
+
+
+def _angle2pi(v, start):
+    """Batched version of ``angle2pi``."""
+    a = np.arctan2(-v[..., 1], v[..., 0]) - start
+    return np.where(a < 0, 2 * np.pi + a, a)
+
+
+def _wrap_to_pi(x):
+    """Batched version of ``wrap_to_pi``."""
+    return x - 2 * np.pi * np.round(x / (2 * np.pi))
+
+
+class TagVecEnv(VecEnv):
+    """Vectorized version of ``TagBaseEnv`` that steps many arenas at once.
+
+    The state of all of the arenas is stored in arrays and updated with
+    batched NumPy operations, rather than looping over one environment object
+    per arena. Only full-state observations are supported and the
+    environments cannot be rendered, so the options of ``TagEnvConfig`` for
+    images and rendering are ignored.
+
+    Parameters
+    ----------
+    n_envs : int
+        The number of arenas.
+    sparse_reward : bool
+        Only reward tagging, without potential-based reward shaping.
+    player_it : bool
+        True if the learning agent is "it", False otherwise.
+    stationary_enemy : bool
+        True if the enemy does not move.
+    it_model :
+        Model for the enemy when it is "it", or the path to a model exported to
+        ONNX. If ``None``, a simple default policy is used.
+    not_it_model :
+        Model for the enemy when it is not "it", or the path to a model
+        exported to ONNX. If ``None``, a simple default policy is used.
+    max_steps : int
+        Maximum number of steps per episode.
+    flat_observations : bool
+        Return flat, normalized ``Box`` observations (see ``flat_index_map``)
+        rather than dicts.
+    config : TagEnvConfig or dict or None
+        The configuration of the environment. Defaults to ``TagEnvConfig()``.
+    render_mode : None
+        Accepted for compatibility with the registered environments; the
+        arenas cannot be rendered.
+    """
+
+    def __init__(
+        self,
+        n_envs,
+        sparse_reward=False,
+        player_it=True,
+        stationary_enemy=False,
+        it_model=None,
+        not_it_model=None,
+        max_steps=1000,
+        flat_observations=False,
+        config=None,
+        render_mode=None,
+    ):
+        config = TagEnvConfig.make(config)
+        if config.image_observations:
+            raise ValueError("Only full-state observations are supported.")
+        if render_mode is not None:
+            raise ValueError("The batched environments cannot be rendered.")
+
+        self.config = config
+        self.shape = tuple(config.shape)
+        self.flat_observations = flat_observations
+        self.sparse_reward = sparse_reward
+        self.player_it = player_it
+        self.stationary_enemy = stationary_enemy
+        self.it_model = load_policy(it_model)
+        self.not_it_model = load_policy(not_it_model)
+        self.max_steps = max_steps
+        self.render_mode = None
+        self._diag = np.linalg.norm(self.shape)
+
+        self.rng = np.random.default_rng()
+
+        # indexed by agent
+        self.radii = np.full(2, AGENT_RADIUS, dtype=float)
+        self.it = np.array([player_it, not player_it])
+        self.forward_vels = np.where(self.it, PLAYER_IT_VEL, PLAYER_FORWARD_VEL)
+
+        # the distance field is used to find the agents that are near an
+        # obstacle, like in TagBaseEnv
+        self.obstacles = make_obstacles()
+        if config.use_distance_field:
+            self.obstacles.use_distance_field(
+                self.shape,
+                resolution=config.distance_field_resolution,
+                exact_within=AGENT_RADIUS if config.exact_contact else None,
+            )
+
+        # indexed by arena then agent
+        self.positions = np.zeros((n_envs, 2, 2))
+        self.angles = np.zeros((n_envs, 2))
+        self.treasures = np.zeros((n_envs, config.n_treasures, 2))
+        self.steps = np.zeros(n_envs, dtype=int)
+
+        # episode statistics of each arena, see ``episode_stats``
+        self._ep_treasures = np.zeros(n_envs, dtype=int)
+        self._ep_contact_steps = np.zeros(n_envs, dtype=int)
+        self._ep_distance = np.zeros(n_envs)
+
+        # agents that moved while in contact with an obstacle in the last
+        # simulation step
+        self._contact = np.zeros((n_envs, 2), dtype=bool)
+
+        if config.continuous_actions:
+            action_space = gym.spaces.Box(
+                low=-np.ones(1, dtype=np.float32),
+                high=np.ones(1, dtype=np.float32),
+                shape=(1,),
+                dtype=np.float32,
+            )
+        else:
+            action_space = gym.spaces.Discrete(3)
+
+        if flat_observations:
+            observation_space = flat_observation_space(self.shape, config.n_treasures)
+        else:
+            observation_space = self._dict_space()
+
+        self._actions = None
+        super().__init__(n_envs, observation_space, action_space)
+
+    def _dict_space(self):
+        """The space of dict observations, like ``FullStateObserver.space``."""
+        position_space = gym.spaces.Box(
+            low=np.zeros(2, dtype=np.float32),
+            high=np.array(self.shape, dtype=np.float32),
+            shape=(2,),
+            dtype=np.float32,
+        )
+        space = {
+            "agent_position": position_space,
+            "agent_angle": gym.spaces.Box(low=-np.pi, high=np.pi, dtype=np.float32),
+            "enemy_position": position_space,
+        }
+        n = self.config.n_treasures
+        if n > 0:
+            space["treasure_positions"] = gym.spaces.Box(
+                low=np.zeros(2 * n, dtype=np.float32),
+                high=np.tile(self.shape, n).astype(np.float32),
+                shape=(2 * n,),
+                dtype=np.float32,
+            )
+        return gym.spaces.Dict(space)
+
+    def _reset_arenas(self, idx):
+        """Reset the arenas with the given indices."""
+        n = len(idx)
+        if n == 0:
+            return
+        self.steps[idx] = 0
+        self._ep_treasures[idx] = 0
+        self._ep_contact_steps[idx] = 0
+        self._ep_distance[idx] = 0
+        self.angles[idx] = self.rng.uniform(low=-np.pi, high=np.pi, size=(n, 2))
+
+        # agents are placed outside of the obstacles and apart from each other
+        free_space = self.obstacles.free_space(self.shape)
+        player = free_space.sample(self.rng, n)
+        enemy = free_space.sample(self.rng, n)
+        d = 2 * self.radii[PLAYER]
+        bad = np.linalg.norm(enemy - player, axis=1) <= d
+        while np.any(bad):
+            enemy[bad] = free_space.sample(self.rng, bad.sum())
+            bad[bad] = np.linalg.norm(enemy[bad] - player[bad], axis=1) <= d
+        self.positions[idx, PLAYER] = player
+        self.positions[idx, ENEMY] = enemy
+
+        if not self.player_it:
+            radius = self.config.treasure_radius
+            free_space = self.obstacles.free_space(self.shape, radius)
+            for i in range(self.config.n_treasures):
+                self.treasures[idx, i] = free_space.sample(self.rng, n)
+
+    def _observation(self, agent, enemy, zero_treasures=False):
+        obs = {
+            "agent_position": self.positions[:, agent].astype(np.float32),
+            "agent_angle": self.angles[:, agent, None].astype(np.float32),
+            "enemy_position": self.positions[:, enemy].astype(np.float32),
+        }
+        if self.config.n_treasures > 0:
+            treasures = self.treasures.reshape(self.num_envs, -1).astype(np.float32)
+            if zero_treasures:
+                treasures[:] = 0
+            obs["treasure_positions"] = treasures
+        return obs
+
+    def _get_obs(self):
+        obs = self._observation(PLAYER, ENEMY)
+        if self.flat_observations:
+            return flatten_observation(obs, self.shape)
+        return obs
+
+    def _predict(self, model, obs):
+        """Predict actions with a model, in its observation layout."""
+        space = getattr(model, "observation_space", None)
+        obs = convert_observation(obs, space, self.shape)
+        actions, _ = model.predict(obs, deterministic=False)
+        return actions
+
+    def _potential(self):
+        """Potential for the current state of each arena."""
+        d = np.linalg.norm(self.positions[:, PLAYER] - self.positions[:, ENEMY], axis=1)
+        p = 1 - d / self._diag
+        if not self.player_it:
+            p = -p
+        return p
+
+    def _translate_actions(self, actions):
+        """Translate the learning agent's actions into linear and angular
+        directions."""
+        if self.config.continuous_actions:
+            angdir = np.asarray(actions, dtype=float).reshape(self.num_envs)
+            return np.ones(self.num_envs), angdir
+        actions = np.asarray(actions).reshape(self.num_envs)
+        lindir = (actions < 3).astype(float)
+        angdir = 1.0 - actions % 3
+        return lindir, angdir
+
+    def _default_it_policy(self):
+        r = self.positions[:, PLAYER] - self.positions[:, ENEMY]
+        a = _angle2pi(r, start=self.angles[:, ENEMY])
+        return np.sign(np.pi - a)
+
+    def _default_not_it_policy(self):
+        r = self.positions[:, PLAYER] - self.positions[:, ENEMY]
+        d = _directions(self.angles[:, ENEMY])
+
+        # when already facing away from the player, take whichever direction
+        # orthogonal to the center point moves us farther away from it
+        p = self.positions[:, ENEMY] - 0.5 * np.array(self.shape)
+        v = np.stack((p[:, 1], -p[:, 0]), axis=1)
+        v[np.sum(v * r, axis=1) > 0] *= -1
+        a_away = _angle2pi(v, start=self.angles[:, ENEMY])
+
+        # otherwise steer away from the player
+        a_toward = _angle2pi(r, start=self.angles[:, ENEMY])
+
+        facing_away = np.sum(d * r, axis=1) < 0
+        return np.where(
+            facing_away, np.sign(np.pi - a_away), np.sign(a_toward - np.pi)
+        )
+
+    def _model_angdir(self):
+        """Angular direction of the enemy in each arena from its learned
+        model, or None if it has none."""
+        if self.it[ENEMY]:
+            if self.it_model is None:
+                return None
+            # it model ignores treasures entirely
+            obs = self._observation(ENEMY, PLAYER, zero_treasures=True)
+            actions = self._predict(self.it_model, obs)
+        else:
+            if self.not_it_model is None:
+                return None
+            obs = self._observation(ENEMY, PLAYER)
+            actions = self._predict(self.not_it_model, obs)
+        return np.asarray(actions, dtype=float).reshape(self.num_envs)
+
+    def _enemy_angdir(self, model_angdir=None):
+        """Angular direction of the enemy in each arena."""
+        if model_angdir is not None:
+            return model_angdir
+        if self.it[ENEMY]:
+            return self._default_it_policy()
+        return self._default_not_it_policy()
+
+    def _limit_velocities(self, velocities):
+        """Stop agents from leaving the screen or penetrating obstacles."""
+        v = velocities
+        x = self.positions
+        r = self.radii[None, :]
+        moving = np.any(v != 0, axis=-1)
+
+        # don't leave the screen
+        for i in range(2):
+            hi = moving & (x[..., i] >= self.shape[i] - r)
+            lo = moving & ~hi & (x[..., i] <= r)
+            v[..., i] = np.where(hi, np.minimum(0, v[..., i]), v[..., i])
+            v[..., i] = np.where(lo, np.maximum(0, v[..., i]), v[..., i])
+
+        # don't penetrate obstacles: slide along each one in contact, and
+        # record the agents in contact for the episode statistics. Like
+        # ObstacleSet.contact_normals, the distance field filters out the
+        # agents far from the obstacles and gives the contact normals unless
+        # it falls back to exact queries.
+        field = self.obstacles.distance_field
+        points = x.reshape(-1, 2)
+        v = v.reshape(-1, 2)
+        radii = np.tile(self.radii, self.num_envs)
+        near = moving.ravel()
+        if field is not None:
+            near &= field.interpolate(points)[0] < radii + field.slack
+        near = np.flatnonzero(near)
+        self._contact[:] = False
+        if near.size == 0:
+            return v.reshape(velocities.shape)
+
+        if field is not None and field.exact_within is None:
+            dists, normals = field.interpolate(points[near])
+            dists, normals = dists[:, None], normals[:, None, :]
+        else:
+            dists, normals, _ = point_polys_query(points[near], self.obstacles)
+        contact = dists < radii[near, None]
+        self._contact.reshape(-1)[near] = np.any(contact, axis=1)
+        vn = v[near]
+        for j in np.flatnonzero(np.any(contact, axis=0)):
+            n = normals[:, j]
+            mask = contact[:, j] & (np.sum(n * vn, axis=-1) < 0)
+            tan = np.stack((n[:, 1], -n[:, 0]), axis=-1)
+            slide = np.sum(tan * vn, axis=-1, keepdims=True) * tan
+            vn = np.where(mask[:, None], slide, vn)
+        v[near] = vn
+        return v.reshape(velocities.shape)
+
+    def _collect_treasures(self, active):
+        """Number of treasures collected in each of the active arenas."""
+        collected = np.zeros(self.num_envs, dtype=int)
+        if self.player_it:
+            return collected
+        radius = self.config.treasure_radius
+        for agent in np.flatnonzero(~self.it):
+            for i in range(self.config.n_treasures):
+                d = np.linalg.norm(self.positions[:, agent] - self.treasures[:, i], axis=1)
+                hit = active & (d <= self.radii[agent] + radius)
+                if np.any(hit):
+                    collected += hit
+                    free_space = self.obstacles.free_space(self.shape, radius)
+                    self.treasures[hit, i] = free_space.sample(self.rng, hit.sum())
+        return collected
+
+    def reset(self):
+        if self._seeds[0] is not None:
+            self.rng = np.random.default_rng(self._seeds[0])
+        self._reset_seeds()
+        self._reset_options()
+        self.treasures[:] = 0
+        self._reset_arenas(np.arange(self.num_envs))
+        return self._get_obs()
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def _simulate(self, lindir, angdir, active, model_angdir=None):
+        """Advance the active arenas by one simulation step.
+
+        ``model_angdir`` is the action of the enemy's learned model, if it has
+        one, which is held for the frame skip.
+
+        Returns
+        -------
+        : np.ndarray
+            The number of treasures collected in each arena.
+        """
+        lindirs = np.stack((lindir, np.ones(self.num_envs)), axis=1)
+        angdirs = np.stack((angdir, np.zeros(self.num_envs)), axis=1)
+        if self.stationary_enemy:
+            lindirs[:, ENEMY] = 0
+        else:
+            angdirs[:, ENEMY] = self._enemy_angdir(model_angdir)
+
+        # arenas whose episodes ended earlier in the frame skip stay put
+        lindirs[~active] = 0
+        angdirs[~active] = 0
+
+        velocities = (self.forward_vels * lindirs)[..., None] * _directions(self.angles)
+        velocities = self._limit_velocities(velocities)
+
+        treasures_collected = self._collect_treasures(active)
+
+        self.angles = _wrap_to_pi(self.angles + TIMESTEP * PLAYER_ANGVEL * angdirs)
+        self.positions += TIMESTEP * velocities
+
+        self._ep_treasures += treasures_collected
+        self._ep_contact_steps += active & self._contact[:, PLAYER]
+        speeds = np.linalg.norm(velocities[:, PLAYER], axis=1)
+        self._ep_distance += TIMESTEP * speeds
+        return treasures_collected
+
+    def step_wait(self):
+        p0 = self._potential()
+        lindir, angdir = self._translate_actions(self._actions)
+        model_angdir = None if self.stationary_enemy else self._model_angdir()
+
+        # the action, and that of a learned enemy, is repeated for each step of
+        # the frame skip, until the episode ends
+        treasures_collected = np.zeros(self.num_envs, dtype=int)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        active = np.ones(self.num_envs, dtype=bool)
+        r = self.radii[PLAYER] + self.radii[ENEMY]
+        for _ in range(self.config.frame_skip):
+            self.steps += active
+            treasures_collected += self._simulate(lindir, angdir, active, model_angdir)
+
+            # round terminates when the player is caught
+            d = np.linalg.norm(
+                self.positions[:, PLAYER] - self.positions[:, ENEMY], axis=1
+            )
+            terminated |= active & (d < r)
+            truncated |= active & (self.steps >= self.max_steps)
+            active &= ~(terminated | truncated)
+            if not np.any(active):
+                break
+        p1 = self._potential()
+
+        # when it, there is a positive reward for catching the enemy
+        rewards = terminated.astype(float)
+
+        # when not it, there is a negative reward for being caught
+        if not self.player_it:
+            rewards = -rewards + 0.5 * treasures_collected
+
+        # shape reward with potential function
+        if not self.sparse_reward:
+            rewards += p1 - p0
+
+        positions = self.positions.copy()
+        infos = [
+            {"player_position": p[PLAYER], "enemy_position": p[ENEMY]}
+            for p in positions
+        ]
+
+        dones = terminated | truncated
+        idx = np.flatnonzero(dones)
+        if idx.size > 0:
+            obs = self._get_obs()
+            for i in idx:
+                infos[i]["episode_stats"] = episode_stats(
+                    self.steps[i],
+                    terminated[i],
+                    self._ep_treasures[i],
+                    self._ep_contact_steps[i],
+                    self._ep_distance[i],
+                )
+                if self.flat_observations:
+                    infos[i]["terminal_observation"] = obs[i]
+                else:
+                    infos[i]["terminal_observation"] = {
+                        k: v[i] for k, v in obs.items()
+                    }
+                infos[i]["TimeLimit.truncated"] = bool(
+                    truncated[i] and not terminated[i]
+                )
+            self._reset_arenas(idx)
+
+        return self._get_obs(), rewards.astype(np.float32), dones, infos
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def _all_indices(self, indices):
+        """Get the indices, which must select every arena since the attributes
+        and methods are shared by the whole batch."""
+        indices = list(self._get_indices(indices))
+        if sorted(set(indices)) != list(range(self.num_envs)):
+            raise ValueError("The arenas share attributes and cannot be selected.")
+        return indices
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._all_indices(indices)
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        # the method acts on the whole batch, so it is only called once
+        indices = self._all_indices(indices)
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result for _ in indices]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
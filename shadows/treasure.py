@@ -1,7 +1,7 @@
 import numpy as np
-import pygame
 
-from .collision import Circle, point_poly_query
+from .collision import Circle, PolygonSet
+from .gui import pygame
 
 
 class Treasure(Circle):
@@ -18,16 +18,43 @@ class Treasure(Circle):
 
     def update_position(self, shape, obstacles, rng):
         """Update the treasure's position to a collision-free point in
-        a screen with dimensions `shape`."""
-        r = self.radius * np.ones(2)
-        while True:
-            p = rng.uniform(low=r, high=np.array(shape) - r)
-            collision = False
-            for obstacle in obstacles:
-                Q = point_poly_query(p, obstacle)
-                if Q.distance < self.radius:
-                    collision = True
-                    break
-            if not collision:
-                break
-        self.center = p
+        a screen with dimensions `shape`.
+
+        ``obstacles`` may be a list of polygons, but passing a ``PolygonSet``
+        avoids packing the obstacles and building the free space sampler on
+        every call."""
+        if not isinstance(obstacles, PolygonSet):
+            obstacles = PolygonSet(obstacles)
+        self.center = obstacles.free_space(shape, self.radius).sample(rng)
+
+
+def draw_treasures(
+    surface, treasures, scale=1, viewpoint=None, obstacles=None, screen_rect=None
+):
+    """Draw the treasures.
+
+    If a ``viewpoint`` is given, the treasures that are entirely hidden from it
+    by the ``obstacles`` are skipped. Those that are only partly hidden are
+    drawn, so the occlusions should be drawn over them.
+
+    If the obstacles have a ``visibility_table``, the treasures in cells that
+    can be seen from the viewpoint's cell are drawn with a bit lookup. The
+    table is coarse, but any hidden part of these treasures is drawn over by
+    the occlusions. The others are only skipped if they are entirely hidden.
+    """
+    if len(treasures) == 0:
+        return
+    if viewpoint is not None:
+        centers = np.array([treasure.center for treasure in treasures])
+        radii = np.array([treasure.radius for treasure in treasures])
+
+        visible = np.zeros(len(treasures), dtype=bool)
+        if obstacles.visibility_table is not None:
+            visible = obstacles.visibility_table.can_see(viewpoint, centers)
+        if not np.all(visible):
+            visible[~visible] = obstacles.can_see_circles(
+                viewpoint, centers[~visible], radii[~visible], screen_rect
+            )
+        treasures = [t for t, v in zip(treasures, visible) if v]
+    for treasure in treasures:
+        treasure.draw(surface=surface, scale=scale)
@@ -0,0 +1,80 @@
+"""Scalar 2D vector math.
+
+Vectors are pairs of floats and all arithmetic uses the ``math`` module, which
+avoids NumPy's per-call overhead when operating on single 2D vectors in
+per-entity code. NumPy should still be used for batched operations.
+"""
+import math
+
+# norms at or below this value are treated as zero, like np.isclose(norm, 0)
+EPS = 1e-8
+
+
+def add(a, b):
+    """Sum of two vectors."""
+    return (a[0] + b[0], a[1] + b[1])
+
+
+def sub(a, b):
+    """Difference ``a - b`` of two vectors."""
+    return (a[0] - b[0], a[1] - b[1])
+
+
+def scale(s, a):
+    """Multiply a vector by a scalar."""
+    return (s * a[0], s * a[1])
+
+
+def dot(a, b):
+    """Dot product of two vectors."""
+    return a[0] * b[0] + a[1] * b[1]
+
+
+def cross(a, b):
+    """Scalar cross product of two vectors."""
+    return a[0] * b[1] - a[1] * b[0]
+
+
+def norm(a):
+    """Euclidean norm of a vector."""
+    return math.hypot(a[0], a[1])
+
+
+def unit(a):
+    """Normalize to a unit vector."""
+    n = math.hypot(a[0], a[1])
+    if n <= EPS:
+        return (0.0, 0.0)
+    return (a[0] / n, a[1] / n)
+
+
+def orth(a):
+    """Generate a 2D orthogonal to a."""
+    return (a[1], -a[0])
+
+
+def rotate(angle, a):
+    """Rotate a vector by an angle, like ``rotmat(angle) @ a``."""
+    c = math.cos(angle)
+    s = math.sin(angle)
+    return (c * a[0] + s * a[1], c * a[1] - s * a[0])
+
+
+def angle2pi(v, start=0):
+    """Compute angle of vector v w.r.t. the start in the interval [0, 2pi]."""
+    # negative for y is because we are in a left-handed frame
+    a = math.atan2(-v[1], v[0]) - start
+    if a < 0:
+        a = 2 * math.pi + a
+    return a
+
+
+def quad_formula(a, b, c):
+    """Evaluate the quadratic formula for coefficients a, b, c.
+
+    The two solutions are returned. They are NaN if there are no real
+    solutions.
+    """
+    disc = b**2 - 4 * a * c
+    d = math.sqrt(disc) if disc >= 0 else math.nan
+    return (-b - d) / (2 * a), (-b + d) / (2 * a)
@@ -0,0 +1,196 @@
+"""Precomputed visibility between the cells of a grid over a static arena."""
+import concurrent.futures
+import functools
+import hashlib
+import os
+
+import numpy as np
+
+from .collision import AARect, Polygon, PolygonSet, VisibilityPolygon
+
+
+# default directory for cached tables
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "shadows", "visibility")
+
+# increment when the way tables are built changes, to invalidate old caches
+VERSION = 2
+
+# number of cells handled by each task when building in parallel
+_CHUNK_SIZE = 64
+
+
+def _grid_shape(shape, cell_size):
+    return tuple(int(np.ceil(s / cell_size)) for s in shape)
+
+
+def _cell_centers(shape, cell_size):
+    """Centers of the grid cells, flattened with index ``i * ny + j``."""
+    nx, ny = _grid_shape(shape, cell_size)
+    xs = (np.arange(nx) + 0.5) * cell_size
+    ys = (np.arange(ny) + 0.5) * cell_size
+    return np.stack(np.meshgrid(xs, ys, indexing="ij"), axis=-1).reshape(-1, 2)
+
+
+def _build_rows(vertices, n_vertices, shape, cell_size, cells):
+    """Packed visibility rows for the given cells.
+
+    The polygons are passed as arrays, so that this can run in a worker
+    process.
+    """
+    poly_set = PolygonSet([Polygon(v[:k]) for v, k in zip(vertices, n_vertices)])
+    rect = AARect(0, 0, shape[0], shape[1])
+    centers = _cell_centers(shape, cell_size)
+    blocked = poly_set.contains(centers)
+
+    rows = np.zeros((len(cells), len(centers)), dtype=bool)
+    for i, cell in enumerate(cells):
+        if blocked[cell]:
+            continue
+        polygon = VisibilityPolygon(centers[cell], poly_set, rect)
+        rows[i] = polygon.can_see(centers) & ~blocked
+    return np.packbits(rows, axis=1)
+
+
+class VisibilityTable:
+    """Precomputed line of sight between the cells of a grid over an arena.
+
+    Row ``i`` of the table is a bitset of the cells that are visible from the
+    center of cell ``i``. Cells are indexed ``ix * ny + iy``. Cells with
+    centers inside an obstacle see nothing and cannot be seen. The table is
+    stored as a packed ``.npy`` file so it can be memory-mapped.
+
+    Parameters
+    ----------
+    bits : np.ndarray, shape (C, ceil(C / 8))
+        The packed visibility bitsets, as produced by ``np.packbits``.
+    shape : pair of float
+        The width and height of the arena.
+    cell_size : float
+        The side length of each grid cell.
+    """
+
+    def __init__(self, bits, shape, cell_size=1):
+        self.shape = tuple(shape)
+        self.cell_size = cell_size
+        self.grid_shape = _grid_shape(shape, cell_size)
+        self.n_cells = self.grid_shape[0] * self.grid_shape[1]
+
+        if bits.shape != (self.n_cells, (self.n_cells + 7) // 8):
+            raise ValueError(f"Table of shape {bits.shape} does not match the grid.")
+        self.bits = bits
+
+    @staticmethod
+    def key(obstacles, shape, cell_size=1):
+        """Hash of the obstacle layout and grid, used to name cached tables."""
+        h = hashlib.sha1()
+        h.update(np.array([VERSION, cell_size, *shape], dtype=float).tobytes())
+        h.update(np.ascontiguousarray(obstacles.n_vertices, dtype=np.int64).tobytes())
+        h.update(np.ascontiguousarray(obstacles.vertices, dtype=float).tobytes())
+        return h.hexdigest()
+
+    @classmethod
+    def build(cls, obstacles, shape, cell_size=1, n_workers=None):
+        """Build the table.
+
+        Parameters
+        ----------
+        obstacles : PolygonSet
+            The obstacles.
+        shape : pair of float
+            The width and height of the arena.
+        cell_size : float
+            The side length of each grid cell.
+        n_workers : int or None
+            Number of worker processes. Defaults to the number of CPUs. If
+            one, the table is built in this process.
+
+        Returns
+        -------
+        : VisibilityTable
+            The table.
+        """
+        grid_shape = _grid_shape(shape, cell_size)
+        n_cells = grid_shape[0] * grid_shape[1]
+        chunks = [
+            np.arange(i, min(i + _CHUNK_SIZE, n_cells))
+            for i in range(0, n_cells, _CHUNK_SIZE)
+        ]
+        build_rows = functools.partial(
+            _build_rows, obstacles.vertices, obstacles.n_vertices, shape, cell_size
+        )
+
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        if n_workers == 1 or len(chunks) == 1:
+            rows = [build_rows(chunk) for chunk in chunks]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(n_workers) as executor:
+                rows = list(executor.map(build_rows, chunks))
+        return cls(np.vstack(rows), shape, cell_size)
+
+    @classmethod
+    def load(cls, path, shape, cell_size=1, mmap_mode="r"):
+        """Load a table saved with ``save``, memory-mapped by default."""
+        return cls(np.load(path, mmap_mode=mmap_mode), shape, cell_size)
+
+    def save(self, path):
+        """Save the table to a ``.npy`` file.
+
+        The file is written to a temporary path and then moved into place, so
+        concurrent readers never see a partial table.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(self.bits))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def cached(cls, obstacles, shape, cell_size=1, cache_dir=None, n_workers=None):
+        """Load the table from the cache, building and caching it if needed.
+
+        Tables are cached in ``cache_dir`` (``CACHE_DIR`` by default), named by
+        ``key``, so a change to the obstacles or grid builds a new table.
+        """
+        if cache_dir is None:
+            cache_dir = CACHE_DIR
+        path = os.path.join(cache_dir, cls.key(obstacles, shape, cell_size) + ".npy")
+        if not os.path.exists(path):
+            os.makedirs(cache_dir, exist_ok=True)
+            table = cls.build(obstacles, shape, cell_size, n_workers=n_workers)
+            table.save(path)
+        return cls.load(path, shape, cell_size)
+
+    def cells(self, points):
+        """Index of the cell containing each point.
+
+        Points outside of the arena are assigned to the nearest cell.
+        """
+        points = np.asarray(points, dtype=float)
+        idx = np.floor(points / self.cell_size).astype(int)
+        ix = np.clip(idx[..., 0], 0, self.grid_shape[0] - 1)
+        iy = np.clip(idx[..., 1], 0, self.grid_shape[1] - 1)
+        return ix * self.grid_shape[1] + iy
+
+    def can_see(self, p, q):
+        """Check if the cell containing ``p`` can see the cell containing ``q``.
+
+        ``p`` and ``q`` may be arrays of points, which are broadcast together.
+        """
+        i = self.cells(p)
+        j = self.cells(q)
+        byte = self.bits[i, j >> 3]
+        visible = ((byte >> (7 - (j & 7))) & 1) == 1
+        if np.ndim(visible) == 0:
+            return bool(visible)
+        return visible
+
+    def visible(self, point):
+        """Mask of the cells visible from the cell containing the point.
+
+        Returns
+        -------
+        : np.ndarray, shape (nx, ny)
+            True for each visible cell.
+        """
+        row = np.unpackbits(self.bits[self.cells(point)], count=self.n_cells)
+        return row.reshape(self.grid_shape).astype(bool)
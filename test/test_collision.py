@@ -60,6 +60,61 @@ def test_point_poly_query():
     assert np.allclose(Q.normal, shadows.unit([1, 1]))
 
 
+def test_point_polys_query():
+    rects = [shadows.AARect(0, 0, 100, 100), shadows.AARect(200, 0, 50, 50)]
+    poly_set = shadows.PolygonSet(rects)
+    points = np.array([[10, 50], [110, 50], [110, 110], [225, 25]])
+
+    distances, normals, closest = shadows.point_polys_query(points, poly_set)
+    assert distances.shape == (4, 2)
+    assert normals.shape == (4, 2, 2)
+    assert closest.shape == (4, 2, 2)
+
+    # agrees with the single-polygon query
+    for i, point in enumerate(points):
+        for j, rect in enumerate(rects):
+            Q = shadows.point_poly_query(point, rect)
+            assert np.isclose(distances[i, j], Q.distance)
+            assert np.allclose(normals[i, j], Q.normal)
+            assert np.allclose(closest[i, j], Q.p2)
+
+    # polygons with different numbers of vertices
+    tri = shadows.Polygon(np.array([[0.0, 0], [0, 10], [10, 0]]))
+    poly_set = shadows.PolygonSet([tri, rects[0]])
+    distances, normals, _ = shadows.point_polys_query([[10, 10], [-1, 5]], poly_set)
+    assert np.isclose(distances[0, 0], np.sqrt(50))
+    assert np.allclose(normals[0, 0], shadows.unit([1, 1]))
+    assert np.isclose(distances[1, 0], 1)
+    assert np.allclose(normals[1, 0], [-1, 0])
+
+
+def test_distance_and_intersect_queries():
+    rect = shadows.AARect(0, 0, 100, 100)
+    segment = shadows.Segment((0, 0), (100, 0))
+
+    assert np.isclose(shadows.point_segment_distance((50, 10), segment), 10)
+    assert np.isclose(shadows.point_segment_distance((110, 0), segment), 10)
+
+    assert np.isclose(shadows.point_poly_distance((10, 50), rect), 0)
+    assert np.isclose(shadows.point_poly_distance((110, 110), rect), np.sqrt(200))
+
+    assert shadows.segment_poly_intersect(shadows.Segment((-50, 50), (50, 50)), rect)
+    assert not shadows.segment_poly_intersect(
+        shadows.Segment((-50, 110), (50, 110)), rect
+    )
+
+    # agree with the full queries
+    poly_set = shadows.PolygonSet([rect])
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-50, 150, size=(20, 2))
+    distances = shadows.point_polys_distance(points, poly_set)
+    for point, distance in zip(points, distances[:, 0]):
+        Q = shadows.point_poly_query(point, rect)
+        assert np.isclose(shadows.point_poly_distance(point, rect), Q.distance)
+        assert np.isclose(distance, Q.distance)
+        assert shadows.point_in_poly(point, rect) == Q.intersect
+
+
 def test_segment_circle_query():
     circle = shadows.Circle(center=(0, 0), radius=10)
 
@@ -233,3 +288,232 @@ def test_swept_circle_poly_query():
     assert not Q.intersect
     assert np.isclose(Q.distance, np.sqrt(2 * 15**2) - radius)
     assert np.allclose(Q.normal, shadows.unit([1, 1]))
+
+
+def test_uniform_grid():
+    rects = [
+        shadows.AARect(0, 0, 10, 10),
+        shadows.AARect(30, 0, 10, 30),
+        shadows.AARect(0, 40, 50, 10),
+    ]
+    grid = shadows.UniformGrid(rects, cell_size=10)
+
+    assert grid.query_point((5, 5)) == [rects[0]]
+    assert grid.query_point((20, 20)) == []
+    assert grid.query_point((20, 20), radius=10) == [rects[0], rects[1]]
+
+    segment = shadows.Segment((15, 35), (45, 35))
+    assert grid.query_segment(segment) == []
+    assert grid.query_segment(segment, radius=5) == [rects[1], rects[2]]
+
+    # candidates include every intersecting polygon
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        start, end = rng.uniform(-10, 60, size=(2, 2))
+        segment = shadows.Segment(start, end)
+        candidates = grid.query_segment(segment)
+        for rect in rects:
+            if shadows.segment_poly_query(segment, rect).intersect:
+                assert rect in candidates
+
+
+def test_aabb_tree():
+    rects = [shadows.AARect(10 * i, 0, 5, 5) for i in range(10)]
+    tree = shadows.AABBTree(rects)
+
+    assert tree.query_point((12, 2)) == [rects[1]]
+    assert tree.query_point((8, 2), radius=3) == [rects[0], rects[1]]
+
+    # first hit along a segment passing through all of the rectangles
+    segment = shadows.Segment((100, 2), (-10, 2))
+    Q = tree.segment_query(segment)
+    assert Q.intersect
+    assert np.isclose(Q.time, 5 / 110)
+    assert np.allclose(Q.normal, [1, 0])
+
+    # miss
+    segment = shadows.Segment((0, 10), (100, 10))
+    assert tree.segment_query(segment) is None
+    assert tree.query_segment(segment) == []
+
+    # swept circle hits
+    Q = tree.segment_query(segment, radius=6)
+    assert Q.intersect
+    assert np.isclose(Q.time, 0)
+
+    Q = tree.ray_query((-10, 2), (1, 0))
+    assert Q.intersect
+    assert np.allclose(Q.p1, [0, 2])
+
+
+def test_distance_field():
+    rects = [shadows.AARect(10, 10, 10, 10), shadows.AARect(30, 5, 5, 30)]
+    poly_set = shadows.PolygonSet(rects)
+
+    distances, normals = shadows.point_polys_signed_distance(
+        [[12, 15], [25, 15], [15, 5]], poly_set
+    )
+    assert np.allclose(distances, [-2, 5, 5])
+    assert np.allclose(normals, [[-1, 0], [1, 0], [0, -1]])
+
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 50, size=(200, 2))
+    exact, _ = shadows.point_polys_signed_distance(points, poly_set)
+
+    # interpolated distances are within the slack of the exact ones
+    field = shadows.DistanceField(poly_set, (50, 50), resolution=0.5)
+    distances, _ = field.query(points)
+    assert np.all(np.abs(distances - exact) <= field.slack)
+    for point, d in zip(points, distances):
+        assert np.isclose(field.distance(point), d)
+        if d < 3:
+            assert field.near(point, 3)
+
+    # near contact the distances are exact
+    field = shadows.DistanceField(poly_set, (50, 50), resolution=2, exact_within=3)
+    distances, _ = field.query(points)
+    near = exact < 3
+    assert np.allclose(distances[near], exact[near])
+    assert np.all(distances[~near] >= 3 - field.slack)
+
+    # distance queries on the set use the field
+    poly_set.use_distance_field((50, 50), exact_within=3)
+    assert np.allclose(poly_set.distances(points)[near], np.maximum(exact[near], 0))
+
+
+def test_polygon_pad():
+    rect = shadows.AARect(0, 0, 10, 10)
+
+    # padded geometry is cached per radius
+    padded = rect.pad(2)
+    assert rect.pad(2) is padded
+    assert rect.pad(3) is not padded
+    assert padded.radius == 2
+
+    for r in range(rect.PAD_CACHE_SIZE):
+        rect.pad(10 + r)
+    assert len(rect._padded) == rect.PAD_CACHE_SIZE
+    assert rect.pad(2) is not padded
+
+    # swept query uses the padded geometry
+    segment = shadows.Segment((-5, 5), (5, 5))
+    Q1 = shadows.swept_circle_poly_query(segment, 2, rect)
+    Q2 = shadows.segment_padded_poly_query(segment, rect.pad(2))
+    assert Q1.intersect and Q2.intersect
+    assert np.isclose(Q1.time, 0.3)
+    assert np.isclose(Q1.time, Q2.time)
+
+
+def test_segments_intersect():
+    rects = [shadows.AARect(10, 10, 10, 10), shadows.AARect(30, 5, 5, 30)]
+    poly_set = shadows.PolygonSet(rects)
+    circles = [shadows.Circle((40, 40), 3), shadows.Circle((5, 30), 2)]
+    centers = [c.center for c in circles]
+    radii = [c.radius for c in circles]
+
+    rng = np.random.default_rng(0)
+    starts = rng.uniform(0, 50, size=(200, 2))
+    ends = starts + rng.uniform(-10, 10, size=(200, 2))
+
+    poly_times = shadows.segments_polys_intersect(starts, ends, poly_set)
+    circle_times = shadows.segments_circles_intersect(starts, ends, centers, radii)
+    assert poly_times.shape == (200, 2)
+    assert circle_times.shape == (200, 2)
+
+    # agrees with the pairwise queries
+    for i in range(200):
+        segment = shadows.Segment(starts[i], ends[i])
+        for j, rect in enumerate(rects):
+            Q = shadows.segment_poly_query(segment, rect)
+            assert Q.intersect == np.isfinite(poly_times[i, j])
+            if Q.intersect:
+                assert np.isclose(Q.time, poly_times[i, j])
+        for j, circle in enumerate(circles):
+            Q = shadows.segment_circle_query(segment, circle)
+            assert Q.intersect == np.isfinite(circle_times[i, j])
+            if Q.intersect:
+                assert np.isclose(Q.time, circle_times[i, j])
+
+
+def test_occlusion():
+    obstacles = [shadows.Obstacle(10, 10, 10, 10), shadows.Obstacle(30, 5, 5, 30)]
+    obstacle_set = shadows.ObstacleSet(obstacles)
+    screen_rect = shadows.AARect(0, 0, 50, 50)
+
+    rng = np.random.default_rng(0)
+    viewpoints = rng.uniform(0, 50, size=(50, 2))
+    viewpoints = viewpoints[~obstacle_set.contains(viewpoints)]
+    points = rng.uniform(0, 50, size=(100, 2))
+    points = points[~obstacle_set.contains(points)]
+
+    # agrees with the per-obstacle computation
+    polys = shadows.occlusion_polygons(viewpoints, obstacle_set, screen_rect)
+    assert polys.shape == (len(viewpoints), 2, 6, 2)
+    for i, viewpoint in enumerate(viewpoints):
+        for j, obstacle in enumerate(obstacles):
+            expected = obstacle._compute_occlusion2(viewpoint, screen_rect)
+            actual = polys[i, j]
+            actual = actual[np.any(actual != np.roll(actual, 1, axis=0), axis=1)]
+            assert np.allclose(actual, expected)
+
+    # a point is occluded if the segment from the viewpoint to it is blocked
+    occluded = shadows.points_polys_occluded(viewpoints, points, obstacle_set)
+    for i, viewpoint in enumerate(viewpoints):
+        starts = np.tile(viewpoint, (len(points), 1))
+        times = shadows.segments_polys_intersect(starts, points, obstacle_set)
+        assert np.array_equal(occluded[i], np.any(np.isfinite(times), axis=1))
+
+    # chunking does not change the result
+    chunked = shadows.points_polys_occluded(
+        viewpoints, points, obstacle_set, chunk_size=1
+    )
+    assert np.array_equal(chunked, occluded)
+
+
+def test_visibility_polygon():
+    rects = [shadows.Obstacle(10, 10, 10, 10), shadows.Obstacle(30, 5, 5, 30)]
+    poly_set = shadows.ObstacleSet(rects)
+    screen_rect = shadows.AARect(0, 0, 50, 50)
+
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 50, size=(200, 2))
+    points = points[~poly_set.contains(points)]
+
+    # agrees with testing the segment to each point for intersection
+    for viewpoint in [[5, 5], [25, 25], [45, 10], [15, 40]]:
+        polygon = shadows.VisibilityPolygon(viewpoint, poly_set, screen_rect)
+        assert np.all(np.diff(polygon.angles) >= 0)
+
+        starts = np.tile(viewpoint, (len(points), 1))
+        times = shadows.segments_polys_intersect(starts, points, poly_set)
+        expected = ~np.any(np.isfinite(times), axis=1)
+        assert np.array_equal(polygon.can_see(points), expected)
+
+
+def test_free_space_sampler():
+    rects = [shadows.AARect(10, 10, 10, 10), shadows.AARect(30, 5, 5, 30)]
+    poly_set = shadows.PolygonSet(rects)
+    rng = np.random.default_rng(0)
+
+    # without a radius the free space is exact
+    sampler = poly_set.free_space((50, 50))
+    assert np.isclose(sampler.area, 2500 - 100 - 150)
+    points = sampler.sample(rng, 1000)
+    assert points.shape == (1000, 2)
+    assert not np.any(poly_set.contains(points))
+    assert sampler.sample(rng).shape == (2,)
+
+    # samplers are cached
+    assert poly_set.free_space((50, 50)) is sampler
+
+    # samples keep clear of the obstacles and the edges of the arena
+    sampler = poly_set.free_space((50, 50), radius=2)
+    points = sampler.sample(rng, 1000)
+    assert np.all(poly_set.distances(points) >= 2)
+    assert np.all((points >= 2) & (points <= 48))
+
+    # samples are uniform over the free space
+    sampler = poly_set.free_space((50, 50))
+    points = sampler.sample(rng, 20000)
+    left = np.mean(points[:, 0] < 25)
+    assert np.isclose(left, (1250 - 100) / sampler.area, atol=0.02)
@@ -0,0 +1,73 @@
+import numpy as np
+
+import shadows
+
+
+def test_projectile_pool():
+    pool = shadows.ProjectilePool(capacity=2)
+    obstacles = shadows.PolygonSet([shadows.AARect(20, 0, 5, 50)])
+    agent = shadows.Agent.player(position=[10, 20], radius=2)
+
+    # fired by the agent, so cannot hit it
+    pool.spawn([10, 20], [0, 100], agent.id)
+
+    # hits the agent
+    pool.spawn([10, 10], [0, 100], -1)
+
+    # hits the obstacle before the agent
+    pool.spawn([30, 20], [-250, 0], -1)
+
+    # off the screen
+    pool.spawn([60, 10], [100, 0], -1)
+
+    # does not hit anything
+    pool.spawn([40, 40], [10, 0], -1)
+
+    assert len(pool) == 5
+    assert pool.capacity == 8
+
+    hits = pool.collide(0.1, (50, 50), obstacles, [agent])
+    assert len(hits) == 1
+    assert hits[0][0] is agent
+    assert np.allclose(hits[0][1], [0, 100])
+    assert len(pool) == 2
+
+    pool.step(0.1)
+    assert np.allclose(pool.positions[pool.active], [[10, 30], [41, 40]])
+
+    # free slots are reused
+    pool.spawn([0, 0], [0, 0], -1)
+    assert pool.capacity == 8
+
+    pool.clear()
+    assert len(pool) == 0
+
+
+def test_projectile_pool_broadphase():
+    rng = np.random.default_rng(0)
+    rects = [shadows.AARect(x, y, 4, 4) for x in range(0, 100, 10) for y in (0, 50)]
+    obstacles = shadows.PolygonSet(rects)
+    agent = shadows.Agent.player(position=[50, 25], radius=2)
+
+    positions = rng.uniform(0, 100, size=(200, 2))
+    velocities = rng.uniform(-300, 300, size=(200, 2))
+
+    broadphases = [
+        None,
+        shadows.UniformGrid(obstacles, cell_size=10),
+        shadows.AABBTree(obstacles),
+    ]
+    results = []
+    for broadphase in broadphases:
+        pool = shadows.ProjectilePool()
+        for p, v in zip(positions, velocities):
+            pool.spawn(p, v, -1)
+        hits = pool.collide(0.1, (100, 100), obstacles, [agent], broadphase)
+        results.append((len(hits), pool.active.copy()))
+
+    # some projectiles hit obstacles, and the result is the same with and
+    # without the broadphase
+    assert np.sum(results[0][1]) < 200
+    for n_hits, active in results[1:]:
+        assert n_hits == results[0][0]
+        assert np.array_equal(active, results[0][1])
@@ -0,0 +1,91 @@
+import numpy as np
+
+import shadows
+
+
+def test_obstacle_set():
+    obstacles = [shadows.Obstacle(0, 0, 10, 10), shadows.Obstacle(20, 0, 5, 20)]
+    obstacle_set = shadows.ObstacleSet(obstacles)
+
+    assert len(obstacle_set) == 2
+    assert np.allclose(obstacle_set.aabbs, [[0, 0, 10, 10], [20, 0, 25, 20]])
+
+    # obstacles are views into the packed arrays
+    assert np.shares_memory(obstacles[0].vertices, obstacle_set.vertices)
+
+    points = [[5, 5], [15, 5], [22, 19], [30, 30]]
+    assert np.array_equal(obstacle_set.contains(points), [True, False, True, False])
+    assert np.allclose(obstacle_set.distances(points), [0, 5, 0, np.sqrt(125)])
+
+
+def test_contact_normals():
+    obstacle_set = shadows.ObstacleSet(
+        [shadows.Obstacle(0, 0, 10, 10), shadows.Obstacle(10, 12, 10, 10)]
+    )
+    for field in [False, True]:
+        if field:
+            obstacle_set.use_distance_field((30, 30), exact_within=3)
+
+        # between both obstacles
+        normals = obstacle_set.contact_normals([11, 11], radius=3)
+        assert np.allclose(normals, [[np.sqrt(0.5), np.sqrt(0.5)], [0, -1]])
+
+        assert obstacle_set.contact_normals([25, 5], radius=3).shape == (0, 2)
+
+
+def test_obstacle_layer():
+    import pygame
+
+    obstacles = [shadows.Obstacle(0, 0, 10, 10), shadows.Obstacle(20, 0, 5, 20)]
+    obstacle_set = shadows.ObstacleSet(obstacles)
+
+    # the layer is cached per size and scale
+    layer = obstacle_set.layer((50, 50))
+    assert obstacle_set.layer((50, 50)) is layer
+    assert obstacle_set.layer((50, 50), scale=2) is not layer
+
+    # blitting the layer is the same as drawing each obstacle
+    expected = pygame.Surface((50, 50))
+    actual = pygame.Surface((50, 50))
+    for surface in [expected, actual]:
+        surface.fill(shadows.Color.BACKGROUND)
+        pygame.draw.circle(surface, shadows.Color.PLAYER, (12, 12), 5)
+    for obstacle in obstacles:
+        obstacle.draw(expected)
+    obstacle_set.draw(actual)
+    assert np.array_equal(
+        pygame.surfarray.array3d(actual), pygame.surfarray.array3d(expected)
+    )
+
+
+def test_can_see():
+    obstacle_set = shadows.ObstacleSet([shadows.Obstacle(20, 20, 10, 10)])
+    screen_rect = shadows.AARect(0, 0, 50, 50)
+
+    assert obstacle_set.can_see([10, 25], [15, 40], screen_rect)
+    assert not obstacle_set.can_see([10, 25], [40, 25], screen_rect)
+    assert np.array_equal(
+        obstacle_set.can_see([10, 25], [[40, 25], [40, 5]], screen_rect),
+        [False, True],
+    )
+
+    # circles are visible if any part of them is, even with a hidden center;
+    # the shadow edge through the corner (20, 30) is at y = 40 for x = 40
+    assert np.array_equal(
+        obstacle_set.can_see_circles(
+            [10, 25], [[40, 25], [40, 36], [40, 36]], [1, 2, 5], screen_rect
+        ),
+        [False, False, True],
+    )
+
+    # the visibility polygon is reused for the same viewpoint, even after
+    # queries from other viewpoints
+    polygon = obstacle_set.visibility([10, 25], screen_rect)
+    other = obstacle_set.visibility([40, 25], screen_rect)
+    assert obstacle_set.visibility([10, 25], screen_rect) is polygon
+    assert obstacle_set.visibility([40, 25], screen_rect) is other
+
+    # only the most recently used viewpoints are kept
+    for x in range(obstacle_set.VISIBILITY_CACHE_SIZE):
+        obstacle_set.visibility([x, 5], screen_rect)
+    assert obstacle_set.visibility([10, 25], screen_rect) is not polygon
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+
+import shadows
+from shadows.raster import disc_stamp
+
+
+def test_disc_stamp():
+    # discs should be identical to those drawn by pygame
+    for radius in range(1, 16):
+        surface = pygame.Surface((4 * radius, 4 * radius))
+        center = (2 * radius, 2 * radius)
+        pygame.draw.circle(surface, (255, 255, 255), center, radius)
+        expected = pygame.surfarray.array2d(surface) != 0
+
+        actual = np.zeros_like(expected)
+        actual[radius : 3 * radius, radius : 3 * radius] = disc_stamp(radius)
+        assert np.array_equal(actual, expected)
+
+
+def test_rasterizer():
+    obstacles = shadows.ObstacleSet(
+        [shadows.Obstacle(20, 27, 10, 10), shadows.Obstacle(0, 37, 13, 13)]
+    )
+    rasterizer = shadows.Rasterizer((50, 50), obstacles)
+
+    surface = pygame.Surface((50, 50))
+    surface.fill(shadows.Color.BACKGROUND)
+    obstacles.draw(surface)
+    expected = pygame.surfarray.array2d(surface) == 0
+    assert np.array_equal(rasterizer.obstacle_mask, expected)
+
+    # discs are clipped to the image and drawn under the obstacles
+    image = rasterizer.draw([([1.5, 25.2], 3, 85), ([25, 25], 3, 170)])
+    assert image.shape == (50, 50, 1)
+    assert image[0, 25, 0] == 85
+    assert image[25, 23, 0] == 170
+    assert image[25, 27, 0] == 255
+    assert image[40, 10, 0] == 0
+
+    # the region behind an obstacle is occluded
+    image = rasterizer.draw([], viewpoint=[25, 10])
+    assert image[25, 45, 0] == 255
+    assert image[40, 45, 0] == 0
+
+    # batched shadows are the same as one viewpoint at a time
+    viewpoints = [[25, 10], [40, 40], [5, 20]]
+    masks = rasterizer.shadow_masks(viewpoints)
+    assert masks.shape == (3, 50, 50)
+    for viewpoint, mask in zip(viewpoints, masks):
+        assert np.array_equal(rasterizer.shadow_mask(viewpoint), mask)
@@ -0,0 +1,433 @@
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import gymnasium as gym
+import torch
+from stable_baselines3 import PPO
+from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.logger import Logger
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+import shadows
+from shadows.tag.policy import ImageObserver, FullStateObserver
+from shadows.tag.vec_env import TagVecEnv
+
+
+def test_vec_env_matches_env():
+    it_model = PPO("MlpPolicy", gym.make("TagIt-v0", flat_observations=True), seed=0)
+    it_model = _DeterministicModel(it_model)
+    cases = [
+        ("TagIt-v0", {}),
+        ("TagNotIt-v0", {}),
+        ("TagItFast-v0", {}),
+        ("TagNotItFast-v0", {}),
+        # the learned "it" enemy observes the game from its own side in both
+        ("TagNotIt-v0", dict(it_model=it_model)),
+        # contact is found the same way for each distance field option
+        ("TagNotIt-v0", dict(config=dict(use_distance_field=False))),
+        ("TagNotIt-v0", dict(config=dict(exact_contact=False))),
+    ]
+
+    n_done = 0
+    for env_id, kwargs in cases:
+        env = gym.make(env_id, **kwargs).unwrapped
+        vec_env = TagVecEnv(1, **gym.spec(env_id).kwargs, **kwargs)
+        vec_env.reset()
+
+        # start from the same state
+        env.reset(seed=0)
+        vec_env.positions[0] = [env.player.position, env.enemy.position]
+        vec_env.angles[0] = [env.player.angle, env.enemy.angle]
+        vec_env.treasures[0] = [t.center for t in env.treasures]
+
+        rng = np.random.default_rng(0)
+        for _ in range(100):
+            action = rng.uniform(-1, 1, size=1).astype(np.float32)
+            obs, reward, terminated, truncated, _ = env.step(action)
+            vec_obs, vec_reward, done, infos = vec_env.step(action[None])
+            assert done[0] == (terminated or truncated)
+            if done[0]:
+                # the final observation is in the info, since the env is reset
+                terminal_obs = infos[0]["terminal_observation"]
+                vec_obs = {k: v[None] for k, v in terminal_obs.items()}
+
+            for key in ["agent_position", "agent_angle", "enemy_position"]:
+                assert np.allclose(obs[key], vec_obs[key][0], atol=1e-3)
+            assert np.isclose(reward, vec_reward[0], atol=1e-4)
+            if done[0]:
+                n_done += 1
+                break
+
+            # treasures are respawned with a different random generator
+            vec_env.treasures[0] = [t.center for t in env.treasures]
+
+    # some episodes end, so the terminal observations are compared too
+    assert n_done > 0
+
+
+def test_vec_env_reset():
+    vec_env = TagVecEnv(8, player_it=False)
+    vec_env.seed(0)
+    obs = vec_env.reset()
+    assert obs["agent_position"].shape == (8, 2)
+    assert vec_env.observation_space.contains({k: v[0] for k, v in obs.items()})
+
+    # agents and treasures are not placed in obstacles
+    positions = vec_env.positions.reshape(-1, 2)
+    assert not np.any(vec_env.obstacles.contains(positions))
+    treasures = vec_env.treasures.reshape(-1, 2)
+    assert np.all(vec_env.obstacles.distances(treasures) >= 1)
+
+    for _ in range(50):
+        obs, rewards, dones, infos = vec_env.step(np.zeros((8, 1), dtype=np.float32))
+    assert rewards.shape == (8,)
+
+
+def test_vec_env_attrs():
+    vec_env = TagVecEnv(4, player_it=False)
+    assert vec_env.get_attr("max_steps", indices=1) == [vec_env.max_steps]
+
+    # attributes and methods are shared by the arenas, so they cannot be set
+    # or called for only some of them
+    vec_env.set_attr("max_steps", 10)
+    assert vec_env.max_steps == 10
+    with pytest.raises(ValueError):
+        vec_env.set_attr("max_steps", 20, indices=[0, 1])
+    assert vec_env.max_steps == 10
+
+    calls = []
+    vec_env.count = lambda: calls.append(None) or len(calls)
+    assert vec_env.env_method("count") == [1, 1, 1, 1]
+    with pytest.raises(ValueError):
+        vec_env.env_method("count", indices=0)
+    assert len(calls) == 1
+
+
+def test_env_config():
+    config = {"n_treasures": 3, "frame_skip": 2}
+    env = gym.make("TagNotIt-v0", config=config).unwrapped
+    assert env.config == shadows.TagEnvConfig(**config)
+    assert env.observation_space["treasure_positions"].shape == (6,)
+
+    vec_env = TagVecEnv(2, player_it=False, config=env.config)
+    vec_env.seed(0)
+    obs = vec_env.reset()
+    assert obs["treasure_positions"].shape == (2, 6)
+
+    # each step simulates two frames
+    vec_env.step(np.zeros((2, 1), dtype=np.float32))
+    assert np.array_equal(vec_env.steps, [2, 2])
+
+    # the variants are independent of each other in the same process
+    assert gym.make("TagNotIt-v0").unwrapped.config == shadows.TagEnvConfig()
+
+
+def test_image_observer_stack():
+    agent = shadows.Agent.player(position=[0, 0])
+    image = np.zeros((4, 3, 1), dtype=np.uint8)
+    observers = [
+        ImageObserver(None, agent, n_stack=3, rasterize=lambda: image, views=views)
+        for views in [False, True]
+    ]
+
+    # the stack starts filled with the first frame, and new frames are
+    # appended at the end
+    frames = [0, 0]
+    for i in range(1, 6):
+        agent.position = np.array([i, -i], dtype=float)
+        image[:] = i
+        frames.append(i)
+        for observer in observers:
+            obs = observer.get_observation()
+            assert obs["image"].shape == (4, 3, 3)
+            assert np.array_equal(obs["image"][0, 0], frames[-3:])
+            assert np.array_equal(obs["position"][::2], frames[-3:])
+            assert np.array_equal(obs["position"][1::2], -np.array(frames[-3:]))
+
+    # copies are not changed by later observations, but views are
+    copy = observers[0].get_observation()
+    view = observers[1].get_observation()
+    image[:] = 10
+    observers[0].get_observation()
+    observers[1].get_observation()
+    assert copy["image"][0, 0, -1] == 5
+    assert np.any(view["image"] == 10)
+
+
+def test_full_state_observer():
+    agent = shadows.Agent.player(position=[1, 2])
+    enemy = shadows.Agent.enemy(position=[3, 4])
+    treasures = [shadows.Circle([5, 6], 1), shadows.Circle([7, 8], 1)]
+    observer = FullStateObserver(agent, enemy, treasures=treasures, views=True)
+
+    obs = observer.get_observation()
+    assert np.array_equal(obs["agent_position"], [1, 2])
+    assert np.array_equal(obs["enemy_position"], [3, 4])
+    assert np.array_equal(obs["treasure_positions"], [5, 6, 7, 8])
+
+    # views of the same buffers are returned each time
+    treasures[0].center = np.array([9, 10])
+    assert observer.get_observation()["treasure_positions"] is obs["treasure_positions"]
+    assert np.array_equal(obs["treasure_positions"], [9, 10, 7, 8])
+
+
+def test_flat_observations():
+    shape = (50, 50)
+    agent = shadows.Agent.player(position=[10, 20], angle=-np.pi / 2)
+    enemy = shadows.Agent.enemy(position=[30, 40])
+    treasures = [shadows.Circle([5, 45], 1)]
+    observer = FullStateObserver(agent, enemy, treasures=treasures)
+    flat_observer = FullStateObserver(
+        agent, enemy, treasures=treasures, flat=True, shape=shape
+    )
+
+    obs = observer.get_observation()
+    flat = flat_observer.get_observation()
+    assert flat_observer.space(shape).contains(flat)
+    assert np.allclose(flat, [0.2, 0.4, -0.5, 0.6, 0.8, 0.1, 0.9])
+    assert np.allclose(flat, shadows.flatten_observation(obs, shape))
+
+    # the index map gives the location of each entry in the flat layout
+    index_map = shadows.flat_index_map(len(treasures))
+    assert index_map["treasure_positions"] == slice(5, 7)
+
+    # round trip, with a batch dimension
+    batch = np.stack([flat, flat])
+    unflat = shadows.unflatten_observation(batch, shape)
+    for key, value in obs.items():
+        assert np.allclose(unflat[key], value)
+    assert np.allclose(shadows.flatten_observation(unflat, shape), batch)
+
+
+def test_flat_vec_env():
+    kwargs = gym.spec("TagNotIt-v0").kwargs
+    vec_env = TagVecEnv(2, **kwargs)
+    flat_env = TagVecEnv(2, flat_observations=True, **kwargs)
+    vec_env.seed(0)
+    flat_env.seed(0)
+
+    obs = vec_env.reset()
+    flat = flat_env.reset()
+    assert flat.shape == (2,) + flat_env.observation_space.shape
+    assert np.allclose(flat, shadows.flatten_observation(obs, flat_env.shape))
+    for row in flat:
+        assert flat_env.observation_space.contains(row)
+
+    # terminal observations are flat as well
+    flat_env.steps[0] = flat_env.max_steps - 1
+    _, _, dones, infos = flat_env.step(np.zeros((2, 1), dtype=np.float32))
+    assert dones[0]
+    assert flat_env.observation_space.contains(infos[0]["terminal_observation"])
+
+    env = gym.make("TagNotIt-v0", flat_observations=True)
+    obs, _ = env.reset(seed=0)
+    assert env.observation_space == flat_env.observation_space
+    assert env.observation_space.contains(obs)
+
+
+def test_episode_stats():
+    env = gym.make("TagNotIt-v0", max_steps=20).unwrapped
+    env.reset(seed=0)
+    for _ in range(20):
+        _, _, terminated, truncated, info = env.step(np.zeros(1, dtype=np.float32))
+        if terminated or truncated:
+            break
+        assert "episode_stats" not in info
+    stats = info["episode_stats"]
+    assert stats["tagged"] == terminated
+    assert stats["steps"] == env._steps
+    assert 0 < stats["mean_speed"] <= shadows.entity.PLAYER_FORWARD_VEL + 1e-6
+
+    # the vectorized env reports the same statistics, and they are collected
+    # from the infos by the callback
+    vec_env = TagVecEnv(4, player_it=False, max_steps=20)
+    vec_env.seed(0)
+    vec_env.reset()
+    callback = shadows.EpisodeStatsCallback()
+    callback.model = SimpleNamespace(logger=Logger(folder=None, output_formats=[]))
+    for _ in range(40):
+        _, _, _, infos = vec_env.step(np.zeros((4, 1), dtype=np.float32))
+        callback.locals = {"infos": infos}
+        callback._on_step()
+    assert len(callback.stats) >= 4
+    for stats in callback.stats:
+        assert stats.keys() == info["episode_stats"].keys()
+        assert stats["steps"] <= 20
+
+    # the means are logged at the end of each rollout
+    callback.stats.clear()
+    infos = [
+        {"episode_stats": dict(stats, tagged=True, steps=10, time_in_contact=1.0)},
+        {"episode_stats": dict(stats, tagged=False, time_in_contact=0.0)},
+        {},
+    ]
+    callback.locals = {"infos": infos}
+    callback._on_step()
+    callback._on_rollout_end()
+    logged = callback.logger.name_to_value
+    assert logged["episode/tag_rate"] == 0.5
+    assert logged["episode/steps_to_tag"] == 10
+    assert logged["episode/time_in_contact"] == 0.5
+
+
+def test_state_env_without_pygame():
+    # run in a fresh interpreter, since pygame is imported by other tests
+    code = (
+        "import sys, numpy as np, gymnasium as gym, shadows\n"
+        "env = gym.make('TagNotIt-v0')\n"
+        "env.reset(seed=0)\n"
+        "env.step(np.zeros(1, dtype=np.float32))\n"
+        "assert env.unwrapped.screen is None\n"
+        "assert 'pygame' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+class _DeterministicModel:
+    """Model wrapper that always predicts deterministic actions."""
+
+    def __init__(self, model):
+        self.model = model
+        self.observation_space = model.observation_space
+        self.action_space = model.action_space
+
+    def predict(self, obs, deterministic=False):
+        return self.model.predict(obs, deterministic=True)
+
+
+def test_opponent_inference():
+    it_model = PPO("MlpPolicy", gym.make("TagIt-v0", flat_observations=True), seed=0)
+    it_model = _DeterministicModel(it_model)
+    n_envs = 3
+
+    # the opponent's action is held for the frame skip in both cases
+    for env_id, n_steps in [("TagNotIt-v0", 20), ("TagNotItFast-v0", 5)]:
+        # per-env inference
+        envs = [gym.make(env_id, it_model=it_model) for _ in range(n_envs)]
+        for i, env in enumerate(envs):
+            env.reset(seed=i)
+
+        # batched inference
+        vec_env = shadows.make_opponent_vec_env(env_id, n_envs, it_model)
+        for i, env in enumerate(vec_env.venv.envs):
+            env.reset(seed=i)
+
+        for _ in range(n_steps):
+            actions = np.zeros((n_envs, 1), dtype=np.float32)
+            _, _, dones, _ = vec_env.step(actions)
+            assert not np.any(dones)
+            for i, env in enumerate(envs):
+                env.step(actions[i])
+                enemy = vec_env.venv.envs[i].unwrapped.enemy
+                assert np.allclose(env.unwrapped.enemy.position, enemy.position)
+        vec_env.close()
+
+    # the envs can be in other processes
+    vec_env = shadows.make_opponent_vec_env(
+        "TagNotIt-v0", 2, it_model, seed=0, vec_env_cls=SubprocVecEnv
+    )
+    vec_env.reset()
+    for _ in range(5):
+        obs, _, _, _ = vec_env.step(np.zeros((2, 1), dtype=np.float32))
+    assert np.any(vec_env.inference.observations != 0)
+    vec_env.close()
+
+
+def test_onnx_policy(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+
+    class _Onnxable(torch.nn.Module):
+        def __init__(self, policy):
+            super().__init__()
+            self.policy = policy
+
+        def forward(self, observation):
+            return self.policy._predict(observation, deterministic=True)
+
+    env = gym.make("TagIt-v0", flat_observations=True)
+    model = PPO("MlpPolicy", env, seed=0)
+    obs, _ = env.reset(seed=0)
+    path = tmp_path / "policy.onnx"
+    torch.onnx.export(
+        _Onnxable(model.policy),
+        (torch.tensor(obs[None]),),
+        str(path),
+        input_names=["observation"],
+        dynamic_axes={"observation": {0: "batch"}},
+        dynamo=False,
+    )
+
+    policy = shadows.OnnxPolicy(path)
+    assert policy.batched
+    action, _ = policy.predict(obs)
+    expected, _ = model.predict(obs, deterministic=True)
+    assert action.shape == expected.shape
+    assert np.allclose(action, expected, atol=1e-5)
+
+    batch = np.stack([env.observation_space.sample() for _ in range(4)])
+    action, _ = policy.predict(batch)
+    expected, _ = model.predict(batch, deterministic=True)
+    assert np.allclose(action, expected, atol=1e-5)
+
+    # the exported model is run by the env without PyTorch
+    code = (
+        "import sys, numpy as np, gymnasium as gym, shadows\n"
+        f"env = gym.make('TagNotIt-v0', it_model={str(path)!r})\n"
+        "env.reset(seed=0)\n"
+        "for _ in range(10):\n"
+        "    env.step(np.zeros(1, dtype=np.float32))\n"
+        "assert 'torch' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_shm_vec_env():
+    for env_kwargs in [dict(max_steps=10), dict(max_steps=10, flat_observations=True)]:
+        envs = [
+            make_vec_env(
+                "TagNotIt-v0",
+                n_envs=2,
+                seed=0,
+                vec_env_cls=cls,
+                env_kwargs=env_kwargs,
+            )
+            for cls in [DummyVecEnv, shadows.ShmVecEnv]
+        ]
+        assert envs[1].get_attr("max_steps") == [10, 10]
+
+        for env in envs:
+            env.reset()
+        rng = np.random.default_rng(0)
+        for _ in range(25):
+            actions = rng.uniform(-1, 1, size=(2, 1)).astype(np.float32)
+            obs, rewards, dones, infos = envs[0].step(actions)
+            shm_obs, shm_rewards, shm_dones, shm_infos = envs[1].step(actions)
+            if isinstance(obs, dict):
+                for key in obs:
+                    assert np.array_equal(obs[key], shm_obs[key])
+            else:
+                assert np.array_equal(obs, shm_obs)
+            assert np.array_equal(rewards, shm_rewards)
+            assert np.array_equal(dones, shm_dones)
+            for info, shm_info in zip(infos, shm_infos):
+                assert info.keys() == shm_info.keys()
+        for env in envs:
+            env.close()
+
+    # the workers can be pinned to given cores
+    if hasattr(os, "sched_getaffinity"):
+        cpu = max(os.sched_getaffinity(0))
+        env = make_vec_env(
+            "TagNotIt-v0",
+            n_envs=2,
+            vec_env_cls=shadows.ShmVecEnv,
+            vec_env_kwargs=dict(cpus=[cpu]),
+        )
+        for process in env.processes:
+            assert os.sched_getaffinity(process.pid) == {cpu}
+        env.close()
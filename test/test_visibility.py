@@ -0,0 +1,60 @@
+import numpy as np
+
+import shadows
+from shadows.visibility import VisibilityTable
+
+
+def make_obstacles():
+    return shadows.ObstacleSet(
+        [shadows.Obstacle(10, 10, 10, 10), shadows.Obstacle(30, 5, 5, 30)]
+    )
+
+
+def test_visibility_table(tmp_path):
+    obstacles = make_obstacles()
+    shape = (50, 50)
+    table = VisibilityTable.build(obstacles, shape, cell_size=5, n_workers=1)
+    assert table.grid_shape == (10, 10)
+    assert table.bits.shape == (100, 13)
+
+    # agrees with testing the segment between the cell centers
+    rng = np.random.default_rng(0)
+    p = (np.floor(rng.uniform(0, 10, size=(200, 2))) + 0.5) * 5
+    q = (np.floor(rng.uniform(0, 10, size=(200, 2))) + 0.5) * 5
+    free = ~obstacles.contains(p) & ~obstacles.contains(q)
+    times = shadows.segments_polys_intersect(p, q, obstacles)
+    expected = free & ~np.any(np.isfinite(times), axis=1)
+    assert np.array_equal(table.can_see(p, q), expected)
+
+    assert table.can_see([2, 2], [48, 2])
+    assert not table.can_see([2, 15], [25, 15])
+
+    # the mask of visible cells is indexed like the grid
+    xs = (np.arange(10) + 0.5) * 5
+    centers = np.stack(np.meshgrid(xs, xs, indexing="ij"), axis=-1)
+    assert np.array_equal(table.visible([2, 2]), table.can_see([2, 2], centers))
+
+    # building in parallel gives the same table
+    parallel = VisibilityTable.build(obstacles, shape, cell_size=5, n_workers=2)
+    assert np.array_equal(parallel.bits, table.bits)
+
+    # the cached table is built once and then memory-mapped
+    cached = VisibilityTable.cached(obstacles, shape, cell_size=5, cache_dir=tmp_path)
+    assert np.array_equal(cached.bits, table.bits)
+    assert len(list(tmp_path.iterdir())) == 1
+    cached = VisibilityTable.cached(obstacles, shape, cell_size=5, cache_dir=tmp_path)
+    assert isinstance(cached.bits, np.memmap)
+
+    # a different layout has a different key
+    key = VisibilityTable.key(obstacles, shape, cell_size=5)
+    other = shadows.ObstacleSet([shadows.Obstacle(10, 10, 10, 10)])
+    assert VisibilityTable.key(other, shape, cell_size=5) != key
+
+
+def test_use_visibility_table(tmp_path):
+    obstacles = make_obstacles()
+    assert obstacles.visibility_table is None
+    table = obstacles.use_visibility_table((50, 50), cell_size=5, cache_dir=tmp_path)
+    assert obstacles.visibility_table is table
+    assert table.can_see([2, 2], [48, 2])
+    assert not table.can_see([2, 15], [25, 15])